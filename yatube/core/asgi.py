@@ -0,0 +1,217 @@
+"""ASGI-приложение поверх WSGI-обработчика Django.
+
+Django 2.2 не умеет асинхронные представления, поэтому представления
+остаются синхронными, а приложение разделяет работу так: цикл событий
+держит соединения, читает тело запроса и отдаёт ответ, а обработчик
+Django со всеми запросами к ORM выполняется в пуле из ASGI_THREADS
+потоков. Медленный клиент занимает только сокет в цикле событий,
+а не поток, и запросы сверх размера пула ждут в очереди.
+
+Потоковые ответы (server-sent events) читаются в отдельном пуле
+из ASGI_STREAM_THREADS потоков, чтобы долгие потоки не занимали
+место обычных запросов.
+"""
+import asyncio
+import sys
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.handlers.wsgi import WSGIHandler
+
+# Признак конца итератора ответа для next() в пуле потоков.
+_DONE = object()
+
+
+class RequestTooLarge(Exception):
+    """Тело запроса больше FILE_UPLOAD_MAX_SIZE."""
+
+
+def build_environ(scope, body):
+    """WSGI-окружение для HTTP-запроса ASGI."""
+    server = scope.get('server') or ('localhost', 80)
+    client = scope.get('client') or ('', 0)
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': scope.get('root_path', ''),
+        # WSGI передаёт путь байтами, раскрытыми как latin-1.
+        'PATH_INFO': scope['path'].encode().decode('latin-1'),
+        'QUERY_STRING': scope.get('query_string', b'').decode('latin-1'),
+        'SERVER_NAME': server[0],
+        'SERVER_PORT': str(server[1]),
+        'SERVER_PROTOCOL': f'HTTP/{scope.get("http_version", "1.1")}',
+        'REMOTE_ADDR': client[0],
+        'REMOTE_PORT': str(client[1]),
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': body,
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': False,
+        'wsgi.run_once': False,
+    }
+    for raw_name, raw_value in scope.get('headers', ()):
+        name = raw_name.decode('latin-1').upper().replace('-', '_')
+        value = raw_value.decode('latin-1')
+        if name in ('CONTENT_TYPE', 'CONTENT_LENGTH'):
+            environ[name] = value
+            continue
+        name = f'HTTP_{name}'
+        if name in environ:
+            # Повторные Cookie (HTTP/2 шлёт каждую отдельно)
+            # склеиваются через '; ', остальные заголовки — через ','.
+            separator = '; ' if name == 'HTTP_COOKIE' else ','
+            value = f'{environ[name]}{separator}{value}'
+        environ[name] = value
+    return environ
+
+
+def close_response(response):
+    # По PEP 3333 у результата приложения close() может не быть.
+    close = getattr(response, 'close', None)
+    if close is not None:
+        close()
+
+
+class ASGIHandler:
+    """Выполняет Django в пуле потоков для ASGI-сервера."""
+
+    def __init__(self, wsgi=None, threads=None, stream_threads=None):
+        self.wsgi = wsgi or WSGIHandler()
+        self.executor = ThreadPoolExecutor(
+            max_workers=threads or settings.ASGI_THREADS,
+            thread_name_prefix='asgi')
+        self.stream_executor = ThreadPoolExecutor(
+            max_workers=stream_threads or settings.ASGI_STREAM_THREADS,
+            thread_name_prefix='asgi-stream')
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await self.lifespan(receive, send)
+        elif scope['type'] == 'http':
+            await self.http(scope, receive, send)
+        else:
+            raise ValueError(f'Неподдерживаемый тип ASGI: {scope["type"]}')
+
+    async def lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                self.executor.shutdown(wait=False)
+                self.stream_executor.shutdown(wait=False)
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    async def read_body(self, scope, receive):
+        """Тело запроса; большое уходит из памяти во временный файл.
+
+        Тело больше FILE_UPLOAD_MAX_SIZE не дочитывается: RequestTooLarge
+        бросается по заголовку Content-Length или как только прочитанное
+        превысило предел.
+        """
+        limit = settings.FILE_UPLOAD_MAX_SIZE
+        for name, value in scope.get('headers', ()):
+            if name.lower() == b'content-length' and value.isdigit():
+                if int(value) > limit:
+                    raise RequestTooLarge
+        body = tempfile.SpooledTemporaryFile(
+            max_size=settings.FILE_UPLOAD_MAX_MEMORY_SIZE)
+        size = 0
+        while True:
+            message = await receive()
+            if message['type'] == 'http.disconnect':
+                body.close()
+                return None
+            chunk = message.get('body', b'')
+            size += len(chunk)
+            if size > limit:
+                body.close()
+                raise RequestTooLarge
+            body.write(chunk)
+            if not message.get('more_body'):
+                body.seek(0)
+                return body
+
+    async def http(self, scope, receive, send):
+        try:
+            body = await self.read_body(scope, receive)
+        except RequestTooLarge:
+            await send({
+                'type': 'http.response.start',
+                'status': 413,
+                'headers': [
+                    (b'content-type', b'text/plain; charset=utf-8'),
+                    (b'connection', b'close'),
+                ],
+            })
+            await send({
+                'type': 'http.response.body',
+                'body': 'Слишком большой запрос.'.encode(),
+            })
+            return
+        if body is None:
+            return
+        loop = asyncio.get_event_loop()
+        try:
+            status, headers, response = await loop.run_in_executor(
+                self.executor, self.run, build_environ(scope, body))
+        finally:
+            body.close()
+        await send({
+            'type': 'http.response.start',
+            'status': status,
+            'headers': headers,
+        })
+        if isinstance(response, bytes):
+            await send({'type': 'http.response.body', 'body': response})
+            return
+        await self.stream(response, receive, send)
+
+    def run(self, environ):
+        """Вызывает Django; обычный ответ собирается здесь же целиком."""
+        started = []
+
+        def start_response(status, headers, exc_info=None):
+            started[:] = [int(status.split(' ', 1)[0]), [
+                (name.lower().encode('latin-1'), value.encode('latin-1'))
+                for name, value in headers
+            ]]
+
+        response = self.wsgi(environ, start_response)
+        if getattr(response, 'streaming', False):
+            return started[0], started[1], response
+        try:
+            content = b''.join(response)
+        finally:
+            # Закрытие ответа шлёт request_finished, и соединения
+            # с базой закрываются в том потоке, где открывались.
+            close_response(response)
+        return started[0], started[1], content
+
+    async def stream(self, response, receive, send):
+        loop = asyncio.get_event_loop()
+        chunks = iter(response)
+        disconnected = asyncio.ensure_future(self.wait_disconnect(receive))
+        try:
+            while not disconnected.done():
+                chunk = await loop.run_in_executor(
+                    self.stream_executor, next, chunks, _DONE)
+                if chunk is _DONE:
+                    break
+                await send({
+                    'type': 'http.response.body',
+                    'body': chunk,
+                    'more_body': True,
+                })
+            if not disconnected.done():
+                await send({'type': 'http.response.body', 'body': b''})
+        finally:
+            disconnected.cancel()
+            await loop.run_in_executor(
+                self.stream_executor, close_response, response)
+
+    async def wait_disconnect(self, receive):
+        while (await receive())['type'] != 'http.disconnect':
+            pass
@@ -0,0 +1,154 @@
+"""Маршрутизация запросов между основной базой и репликами.
+
+Чтения уходят на случайную реплику из DATABASE_REPLICAS, а записи —
+в default. Небезопасные запросы (POST и т.п.) целиком читают из
+основной базы, а после записи пользователь ещё DATABASE_STICKY_SECONDS
+секунд читает из неё же, чтобы видеть собственные изменения, которые
+ещё не доехали до реплик.
+
+Здесь же собирается статистика соединений: сколько открыто, сколько
+переиспользовано благодаря CONN_MAX_AGE и сколько открыто сейчас.
+"""
+import logging
+import random
+import threading
+import time
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from weakref import WeakSet
+
+from django.conf import settings
+from django.core.signals import request_started
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+logger = logging.getLogger(__name__)
+
+STICKY_SESSION_KEY = '_db_primary_until'
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS', 'TRACE')
+# Сессии читаются сразу после записи при входе, реплика может отстать.
+PRIMARY_ONLY_APPS = ('sessions',)
+# Модуль исторических моделей, которые миграции берут из apps.get_model.
+MIGRATION_MODULE = '__fake__'
+
+
+class RoutingState:
+
+    def __init__(self, pinned=False):
+        self.pinned = pinned
+        self.wrote = False
+
+
+_state = ContextVar('db_routing_state', default=None)
+
+
+@contextmanager
+def use_primary():
+    """Все чтения внутри блока идут в основную базу."""
+    token = _state.set(RoutingState(pinned=True))
+    try:
+        yield _state.get()
+    finally:
+        _state.reset(token)
+
+
+class PrimaryReplicaRouter:
+
+    def db_for_read(self, model, **hints):
+        replicas = settings.DATABASE_REPLICAS
+        state = _state.get()
+        # Миграции читают из той же базы, которую переносят.
+        if (not replicas or model._meta.app_label in PRIMARY_ONLY_APPS
+                or model.__module__ == MIGRATION_MODULE
+                or (state is not None and state.pinned)):
+            return DEFAULT_DB_ALIAS
+        return random.choice(replicas)
+
+    def db_for_write(self, model, **hints):
+        state = _state.get()
+        if state is not None:
+            # Дальнейшие чтения этого запроса должны видеть запись.
+            state.wrote = state.pinned = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, **hints):
+        return db == DEFAULT_DB_ALIAS
+
+
+class ReplicaRoutingMiddleware:
+    """Отправляет в основную базу чтения после недавних записей."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not settings.DATABASE_REPLICAS:
+            return self.get_response(request)
+        pinned = (
+            request.method not in SAFE_METHODS
+            or request.session.get(STICKY_SESSION_KEY, 0) > time.time()
+        )
+        state = RoutingState(pinned)
+        token = _state.set(state)
+        try:
+            response = self.get_response(request)
+        finally:
+            _state.reset(token)
+        if state.wrote:
+            request.session[STICKY_SESSION_KEY] = (
+                time.time() + settings.DATABASE_STICKY_SECONDS)
+        return response
+
+
+_lock = threading.Lock()
+_stats = defaultdict(Counter)
+_wrappers = WeakSet()
+
+
+@receiver(connection_created)
+def count_new_connection(sender, connection, **kwargs):
+    with _lock:
+        _stats[connection.alias]['opened'] += 1
+        _wrappers.add(connection)
+    logger.debug(
+        'Открыто соединение с %s, открыто сейчас: %s',
+        connection.alias, open_connections()[connection.alias])
+
+
+@receiver(request_started)
+def count_reused_connections(sender, **kwargs):
+    # Срабатывает после close_old_connections: живые соединения
+    # переживут запрос благодаря CONN_MAX_AGE.
+    reused = [conn.alias for conn in connections.all()
+              if conn.connection is not None]
+    with _lock:
+        for alias in reused:
+            _stats[alias]['reused'] += 1
+
+
+def open_connections():
+    with _lock:
+        wrappers = list(_wrappers)
+    return Counter(
+        wrapper.alias for wrapper in wrappers
+        if wrapper.connection is not None)
+
+
+def pool_stats():
+    """Статистика соединений по псевдонимам баз."""
+    current = open_connections()
+    with _lock:
+        return {
+            alias: {
+                'opened': _stats[alias]['opened'],
+                'reused': _stats[alias]['reused'],
+                'open': current[alias],
+                'max_age': connections.databases[alias].get('CONN_MAX_AGE'),
+            }
+            for alias in connections.databases
+        }
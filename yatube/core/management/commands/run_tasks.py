@@ -0,0 +1,26 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from core.tasks import run_pending
+
+
+class Command(BaseCommand):
+    help = ('Выполняет задачи из очереди в базе данных '
+            '(TASKS_MODE = "database").')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--once', action='store_true',
+            help='Выполнить готовые задачи и выйти.')
+
+    def handle(self, *args, **options):
+        if options['once']:
+            done = run_pending()
+            self.stdout.write(f'Выполнено задач: {done}.')
+            return
+        self.stdout.write('Исполнитель задач запущен.')
+        while True:
+            if not run_pending():
+                time.sleep(settings.TASKS_POLL_INTERVAL)
@@ -0,0 +1,343 @@
+"""Метрики запросов по представлениям.
+
+Middleware считает для каждого запроса число SQL-запросов и их время
+(через connection.execute_wrapper), время рендера шаблонов (через
+бэкенд TimedDjangoTemplates), попадания и промахи кэша и общее время
+ответа. Итоги запроса уходят в заголовок Server-Timing, суммы по
+именам представлений (posts:index, posts:profile, ...) отдаются
+в текстовом формате Prometheus, а запросы, превысившие бюджет из
+REQUEST_BUDGETS, пишутся в лог.
+
+С TEMPLATE_PROFILING время рендера раскладывается по шаблонам,
+включая вложенные через include и extends, и по участкам кода,
+отмеченным profile_section. Каждому шаблону засчитывается только
+собственное время, без вложенных.
+"""
+import logging
+import threading
+import time
+from collections import defaultdict
+from contextlib import ExitStack, contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import connections
+from django.template import base
+from django.template.backends.django import DjangoTemplates, Template
+
+from .db import pool_stats
+
+logger = logging.getLogger(__name__)
+
+# Границы корзин гистограммы времени ответа, в секундах.
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5)
+UNRESOLVED = 'unresolved'
+# Столько самых долгих шаблонов попадает в Server-Timing и в лог.
+TOP_TEMPLATES = 3
+COUNTERS = (
+    ('requests', 'Число запросов.'),
+    ('queries', 'Число SQL-запросов.'),
+    ('sql_seconds', 'Время SQL-запросов.'),
+    ('template_seconds', 'Время рендера шаблонов.'),
+    ('cache_hits', 'Попадания в кэш.'),
+    ('cache_misses', 'Промахи кэша.'),
+    ('over_budget', 'Запросы, превысившие бюджет.'),
+)
+
+
+class RequestMetrics:
+
+    def __init__(self):
+        self.queries = 0
+        self.sql_seconds = 0.0
+        self.template_seconds = 0.0
+        self.template_depth = 0
+        self.cache_hits = 0
+        self.cache_misses = 0
+        # Шаблон -> [число рендеров, собственное время].
+        self.templates = defaultdict(lambda: [0, 0.0])
+        self.sections = []
+
+    def slowest_templates(self):
+        return sorted(
+            self.templates.items(), key=lambda item: -item[1][1]
+        )[:TOP_TEMPLATES]
+
+
+_current = ContextVar('request_metrics', default=None)
+
+
+@contextmanager
+def profile_section(name):
+    """Засчитывает время блока шаблону или участку кода name."""
+    metrics = _current.get()
+    if metrics is None or not settings.TEMPLATE_PROFILING:
+        yield
+        return
+    sections = metrics.sections
+    # Сюда вложенные участки добавят своё время.
+    sections.append(0.0)
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started
+        nested = sections.pop()
+        if sections:
+            sections[-1] += elapsed
+        entry = metrics.templates[name]
+        entry[0] += 1
+        entry[1] += elapsed - nested
+
+
+def install_template_profiling():
+    """Оборачивает рендер всех шаблонов Django в profile_section.
+
+    Загрузчики создают django.template.base.Template напрямую, поэтому
+    другого места, через которое проходят и include, и extends, нет.
+    Так же поступает и setup_test_environment.
+    """
+    render = base.Template._render
+    if getattr(render, 'profiled', False):
+        return
+
+    def profiled_render(self, context):
+        if not settings.TEMPLATE_PROFILING:
+            return render(self, context)
+        with profile_section(self.origin.template_name or self.name
+                             or '<string>'):
+            return render(self, context)
+
+    profiled_render.profiled = True
+    base.Template._render = profiled_render
+
+
+def record_cache(hit):
+    """Отмечает попадание или промах кэша в текущем запросе."""
+    metrics = _current.get()
+    if metrics is None:
+        return
+    if hit:
+        metrics.cache_hits += 1
+    else:
+        metrics.cache_misses += 1
+
+
+def count_queries(execute, sql, params, many, context):
+    metrics = _current.get()
+    if metrics is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        metrics.sql_seconds += time.perf_counter() - started
+        metrics.queries += 1
+
+
+class TimedTemplate(Template):
+
+    def render(self, context=None, request=None):
+        metrics = _current.get()
+        if metrics is None:
+            return super().render(context, request)
+        # Шаблон может рендерить другие шаблоны, например через
+        # render_to_string в теге, и их время уже входит во внешний.
+        metrics.template_depth += 1
+        started = time.perf_counter()
+        try:
+            return super().render(context, request)
+        finally:
+            metrics.template_depth -= 1
+            if not metrics.template_depth:
+                metrics.template_seconds += time.perf_counter() - started
+
+
+class TimedDjangoTemplates(DjangoTemplates):
+    """Шаблоны Django, время рендера которых попадает в метрики."""
+
+    def __init__(self, params):
+        super().__init__(params)
+        # Настройка проверяется при каждом рендере, чтобы её можно
+        # было переключить в тестах.
+        install_template_profiling()
+
+    def from_string(self, template_code):
+        return TimedTemplate(self.engine.from_string(template_code), self)
+
+    def get_template(self, template_name):
+        template = super().get_template(template_name)
+        return TimedTemplate(template.template, self)
+
+
+class Registry:
+    """Суммы метрик по представлениям."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.counters = defaultdict(lambda: defaultdict(float))
+            self.buckets = defaultdict(lambda: [0] * len(BUCKETS))
+            self.durations = defaultdict(float)
+            self.templates = defaultdict(lambda: [0, 0.0])
+
+    def observe(self, view, metrics, duration, over_budget):
+        with self.lock:
+            counters = self.counters[view]
+            counters['requests'] += 1
+            counters['queries'] += metrics.queries
+            counters['sql_seconds'] += metrics.sql_seconds
+            counters['template_seconds'] += metrics.template_seconds
+            counters['cache_hits'] += metrics.cache_hits
+            counters['cache_misses'] += metrics.cache_misses
+            counters['over_budget'] += over_budget
+            self.durations[view] += duration
+            buckets = self.buckets[view]
+            for index, bound in enumerate(BUCKETS):
+                if duration <= bound:
+                    buckets[index] += 1
+            for name, (renders, seconds) in metrics.templates.items():
+                entry = self.templates[name]
+                entry[0] += renders
+                entry[1] += seconds
+
+    def snapshot(self):
+        with self.lock:
+            return (
+                {view: dict(counters)
+                 for view, counters in self.counters.items()},
+                {view: list(buckets)
+                 for view, buckets in self.buckets.items()},
+                dict(self.durations),
+                {name: tuple(entry)
+                 for name, entry in self.templates.items()},
+            )
+
+
+registry = Registry()
+
+
+def get_budget(view):
+    budgets = settings.REQUEST_BUDGETS
+    return {**budgets.get('*', {}), **budgets.get(view, {})}
+
+
+def exceeded(budget, metrics, duration):
+    """Список превышенных пределов бюджета."""
+    actual = {
+        'queries': metrics.queries,
+        'sql_ms': metrics.sql_seconds * 1000,
+        'template_ms': metrics.template_seconds * 1000,
+        'total_ms': duration * 1000,
+    }
+    return [
+        f'{name}={actual[name]:.0f}>{limit}'
+        for name, limit in budget.items()
+        if actual[name] > limit
+    ]
+
+
+def server_timing(metrics, duration):
+    entries = [
+        f'db;dur={metrics.sql_seconds * 1000:.1f};'
+        f'desc="{metrics.queries} queries"',
+        f'tpl;dur={metrics.template_seconds * 1000:.1f}',
+    ]
+    entries += [
+        f'tpl-self;dur={seconds * 1000:.1f};'
+        f'desc="{escape(name)} x{renders}"'
+        for name, (renders, seconds) in metrics.slowest_templates()
+    ]
+    entries += [
+        f'cache;desc="hit={metrics.cache_hits} miss={metrics.cache_misses}"',
+        f'total;dur={duration * 1000:.1f}',
+    ]
+    return ', '.join(entries)
+
+
+class MetricsMiddleware:
+    """Собирает метрики запроса и добавляет заголовок Server-Timing."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        metrics = RequestMetrics()
+        token = _current.set(metrics)
+        started = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                for conn in connections.all():
+                    stack.enter_context(conn.execute_wrapper(count_queries))
+                response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        duration = time.perf_counter() - started
+
+        match = request.resolver_match
+        view = match.view_name if match else UNRESOLVED
+        problems = exceeded(get_budget(view), metrics, duration)
+        if problems:
+            logger.warning(
+                'Запрос %s %s (%s) превысил бюджет: %s%s',
+                request.method, request.path, view, ', '.join(problems),
+                ''.join(
+                    f'; {name} x{renders} {seconds * 1000:.1f} мс'
+                    for name, (renders, seconds)
+                    in metrics.slowest_templates()))
+        registry.observe(view, metrics, duration, bool(problems))
+        response['Server-Timing'] = server_timing(metrics, duration)
+        return response
+
+
+def escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"')
+
+
+def render_metrics():
+    """Метрики в текстовом формате Prometheus."""
+    counters, buckets, durations, templates = registry.snapshot()
+    lines = []
+    for name, help_text in COUNTERS:
+        metric = f'yatube_view_{name}_total'
+        lines += [f'# HELP {metric} {help_text}', f'# TYPE {metric} counter']
+        lines += [
+            f'{metric}{{view="{escape(view)}"}} {values.get(name, 0):g}'
+            for view, values in sorted(counters.items())
+        ]
+    metric = 'yatube_view_duration_seconds'
+    lines += [f'# HELP {metric} Время ответа.',
+              f'# TYPE {metric} histogram']
+    for view, counts in sorted(buckets.items()):
+        label = f'view="{escape(view)}"'
+        for bound, count in zip(BUCKETS, counts):
+            lines.append(f'{metric}_bucket{{{label},le="{bound}"}} {count}')
+        total = int(counters[view]['requests'])
+        lines += [
+            f'{metric}_bucket{{{label},le="+Inf"}} {total}',
+            f'{metric}_sum{{{label}}} {durations[view]:g}',
+            f'{metric}_count{{{label}}} {total}',
+        ]
+    for index, (metric, help_text) in enumerate((
+            ('yatube_template_renders_total', 'Число рендеров шаблона.'),
+            ('yatube_template_seconds_total',
+             'Собственное время рендера шаблона.'))):
+        lines += [f'# HELP {metric} {help_text}', f'# TYPE {metric} counter']
+        lines += [
+            f'{metric}{{template="{escape(name)}"}} {entry[index]:g}'
+            for name, entry in sorted(templates.items())
+        ]
+    for name, kind in (('opened', 'counter'), ('reused', 'counter'),
+                       ('open', 'gauge')):
+        metric = f'yatube_db_connections_{name}'
+        if kind == 'counter':
+            metric += '_total'
+        lines.append(f'# TYPE {metric} {kind}')
+        lines += [
+            f'{metric}{{alias="{alias}"}} {stats[name]}'
+            for alias, stats in sorted(pool_stats().items())
+        ]
+    return '\n'.join(lines) + '\n'
@@ -0,0 +1,41 @@
+# Generated by Django 2.2.19 on 2026-10-18 03:47
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Task',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(help_text='полный путь к функции задачи', max_length=200, verbose_name='функция')),
+                ('args', models.TextField(default='[]', help_text='JSON-список аргументов функции', verbose_name='аргументы')),
+                ('key', models.CharField(blank=True, max_length=200, verbose_name='ключ идемпотентности')),
+                ('status', models.CharField(choices=[('pending', 'ждёт выполнения'), ('running', 'выполняется'), ('failed', 'не выполнена')], default='pending', max_length=10, verbose_name='состояние')),
+                ('attempts', models.PositiveSmallIntegerField(default=0, verbose_name='число попыток')),
+                ('run_at', models.DateTimeField(default=django.utils.timezone.now, help_text='для выполняемой задачи — конец аренды исполнителем', verbose_name='время запуска')),
+                ('last_error', models.TextField(blank=True, verbose_name='последняя ошибка')),
+                ('created', models.DateTimeField(auto_now_add=True, verbose_name='дата постановки')),
+            ],
+            options={
+                'verbose_name': 'задача',
+                'verbose_name_plural': 'задачи',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='task',
+            index=models.Index(fields=['status', 'run_at'], name='task_status_run_at_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='task',
+            constraint=models.UniqueConstraint(condition=models.Q(('status__in', ('pending', 'running')), models.Q(_negated=True, key='')), fields=('key',), name='unique_pending_task_key'),
+        ),
+    ]
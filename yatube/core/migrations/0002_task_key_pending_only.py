@@ -0,0 +1,21 @@
+# Generated by Django 2.2.19 on 2026-10-18 04:28
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.RemoveConstraint(
+            model_name='task',
+            name='unique_pending_task_key',
+        ),
+        migrations.AddConstraint(
+            model_name='task',
+            constraint=models.UniqueConstraint(condition=models.Q(('status', 'pending'), models.Q(_negated=True, key='')), fields=('key',), name='unique_pending_task_key'),
+        ),
+    ]
@@ -0,0 +1,75 @@
+from django.db import models
+from django.db.models import Q
+from django.utils import timezone
+
+
+class Task(models.Model):
+    """Класс Task описывает фоновую задачу в очереди в базе данных"""
+
+    PENDING = 'pending'
+    RUNNING = 'running'
+    FAILED = 'failed'
+    STATUSES = (
+        (PENDING, 'ждёт выполнения'),
+        (RUNNING, 'выполняется'),
+        (FAILED, 'не выполнена'),
+    )
+
+    name = models.CharField(
+        verbose_name='функция',
+        max_length=200,
+        help_text='полный путь к функции задачи'
+    )
+    args = models.TextField(
+        verbose_name='аргументы',
+        help_text='JSON-список аргументов функции',
+        default='[]'
+    )
+    key = models.CharField(
+        verbose_name='ключ идемпотентности',
+        max_length=200,
+        blank=True
+    )
+    status = models.CharField(
+        verbose_name='состояние',
+        max_length=10,
+        choices=STATUSES,
+        default=PENDING
+    )
+    attempts = models.PositiveSmallIntegerField(
+        verbose_name='число попыток',
+        default=0
+    )
+    run_at = models.DateTimeField(
+        verbose_name='время запуска',
+        help_text='для выполняемой задачи — конец аренды исполнителем',
+        default=timezone.now
+    )
+    last_error = models.TextField(
+        verbose_name='последняя ошибка',
+        blank=True
+    )
+    created = models.DateTimeField(
+        verbose_name='дата постановки',
+        auto_now_add=True
+    )
+
+    class Meta:
+        verbose_name = 'задача'
+        verbose_name_plural = 'задачи'
+        indexes = (
+            models.Index(
+                fields=('status', 'run_at'), name='task_status_run_at_idx'),
+        )
+        constraints = (
+            # Ключ занят, пока задача ждёт выполнения. Выполняемая
+            # задача его не держит: изменение, пришедшее во время
+            # выполнения, ставит задачу заново.
+            models.UniqueConstraint(
+                fields=('key',),
+                condition=Q(status='pending') & ~Q(key=''),
+                name='unique_pending_task_key'),
+        )
+
+    def __str__(self):
+        return f'{self.name}{self.args}'
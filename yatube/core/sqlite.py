@@ -0,0 +1,83 @@
+"""Настройка SQLite для работы под нагрузкой.
+
+Каждое новое соединение получает PRAGMA из SQLITE_PRAGMAS: журнал WAL,
+в котором читатели не ждут писателя, synchronous=NORMAL, mmap и
+увеличенный кэш страниц, а также busy_timeout, чтобы писатели ждали
+блокировку, а не падали с «database is locked».
+
+В режиме очереди записи (SQLITE_WRITE_QUEUE) изменяющие запросы
+выполняются одним потоком с одним соединением, и писатели процесса
+не соревнуются за блокировку базы.
+"""
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextvars import copy_context
+from functools import partial, wraps
+
+from django.conf import settings
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS', 'TRACE')
+
+
+@receiver(connection_created)
+def apply_pragmas(sender, connection, **kwargs):
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        for name, value in settings.SQLITE_PRAGMAS.items():
+            cursor.execute(f'PRAGMA {name} = {value}')
+
+
+class WriteQueue:
+    """Выполняет функции по очереди в одном потоке с одним соединением."""
+
+    def __init__(self):
+        self.executor = ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix='sqlite-writer')
+        self.local = threading.local()
+
+    def run(self, func, *args, **kwargs):
+        # Из самого потока записи (задача sync внутри изменяющего
+        # запроса) функция вызывается сразу, иначе поток ждал бы себя.
+        if getattr(self.local, 'writer', False):
+            return func(*args, **kwargs)
+        # Контекст копируется, чтобы в потоке записи работали
+        # contextvars запроса, например маршрутизация баз.
+        context = copy_context()
+        return self.executor.submit(
+            context.run, self.call, func, *args, **kwargs).result()
+
+    def call(self, func, *args, **kwargs):
+        self.local.writer = True
+        return func(*args, **kwargs)
+
+
+write_queue = WriteQueue()
+
+
+def run_write(func, *args, **kwargs):
+    """Выполняет func в очереди записи, если она включена."""
+    if settings.SQLITE_WRITE_QUEUE:
+        return write_queue.run(func, *args, **kwargs)
+    return func(*args, **kwargs)
+
+
+def serialize_writes(view=None, *, all_methods=False):
+    """Пропускает изменяющие запросы через очередь записи.
+
+    С all_methods=True в очередь идут и GET-запросы: так нужно для
+    представлений, которые меняют данные по ссылке (подписка).
+    """
+    if view is None:
+        return partial(serialize_writes, all_methods=all_methods)
+    safe_methods = () if all_methods else SAFE_METHODS
+
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        if settings.SQLITE_WRITE_QUEUE and request.method not in safe_methods:
+            return write_queue.run(view, request, *args, **kwargs)
+        return view(request, *args, **kwargs)
+
+    return wrapper
@@ -0,0 +1,175 @@
+"""Очередь фоновых задач для побочных эффектов записи.
+
+Задача — функция уровня модуля с аргументами, которые сериализуются
+в JSON (обычно id объектов). Способ выполнения задаёт TASKS_MODE:
+
+- sync — сразу в вызывающем потоке, ошибки только пишутся в лог;
+- thread — после фиксации транзакции в пуле из TASKS_WORKERS потоков;
+- database — строкой Task в той же транзакции, что и данные, а
+  выполняет её команда run_tasks, поэтому задачи переживают
+  перезапуск процесса.
+
+В фоновых режимах упавшая задача повторяется до TASKS_MAX_ATTEMPTS
+раз с паузой TASKS_RETRY_DELAY, удваивающейся с каждой попыткой.
+Записи задача сама отправляет в очередь записи SQLite (run_write),
+а вычисления, например кодирование картинок, её не занимают.
+
+Задача с ключом key не ставится повторно, пока первая ждёт выполнения.
+Ключ освобождается перед запуском задачи, поэтому изменение, пришедшее
+во время выполнения, ставит задачу ещё раз, и она увидит новые данные.
+"""
+import json
+import logging
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import IntegrityError, connection, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .db import use_primary
+from .models import Task
+
+logger = logging.getLogger(__name__)
+
+KEY_LOCK = 'task:{}'
+
+_executor = None
+
+
+def get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=settings.TASKS_WORKERS, thread_name_prefix='tasks')
+    return _executor
+
+
+def task_name(func):
+    return f'{func.__module__}.{func.__qualname__}'
+
+
+def retry_delay(attempt):
+    return settings.TASKS_RETRY_DELAY * 2 ** (attempt - 1)
+
+
+def enqueue(func, *args, key=''):
+    """Ставит func(*args) в очередь."""
+    mode = settings.TASKS_MODE
+    if mode == 'sync':
+        try:
+            func(*args)
+        except Exception:
+            logger.exception('Задача %s%s упала', task_name(func), args)
+    elif mode == 'thread':
+        # Ключ занимается после фиксации: после отката транзакции
+        # он остался бы занят, и задача для того же id (SQLite
+        # выдаёт id откаченной строки снова) бы не поставилась.
+        transaction.on_commit(lambda: submit(func, args, key))
+    elif mode == 'database':
+        try:
+            with transaction.atomic():
+                Task.objects.create(
+                    name=task_name(func), args=json.dumps(args), key=key)
+        except IntegrityError:
+            # Такая задача уже ждёт выполнения.
+            pass
+    else:
+        raise ValueError(f'Неизвестный TASKS_MODE: {mode}')
+
+
+def submit(func, args, key):
+    """Отдаёт задачу пулу потоков, если такая ещё не ждёт выполнения."""
+    if key and not cache.add(
+            KEY_LOCK.format(key), 1, settings.TASKS_KEY_TIMEOUT):
+        return
+    get_executor().submit(run_in_thread, func, args, key)
+
+
+def run_in_thread(func, args, key):
+    if key:
+        cache.delete(KEY_LOCK.format(key))
+    try:
+        for attempt in range(1, settings.TASKS_MAX_ATTEMPTS + 1):
+            try:
+                # Данные только что записаны и могли не дойти до реплик.
+                with use_primary():
+                    func(*args)
+                return
+            except Exception:
+                logger.exception(
+                    'Задача %s%s упала, попытка %s',
+                    task_name(func), args, attempt)
+                if attempt < settings.TASKS_MAX_ATTEMPTS:
+                    time.sleep(retry_delay(attempt))
+    finally:
+        connection.close()
+
+
+def claim():
+    """Забирает ближайшую задачу из базы или возвращает None.
+
+    Выполняемая задача арендуется на TASKS_LEASE секунд: если
+    исполнитель за это время не отчитался, задачу заберёт другой.
+    """
+    now = timezone.now()
+    candidates = Task.objects.filter(
+        Q(status=Task.PENDING) | Q(status=Task.RUNNING),
+        run_at__lte=now,
+    ).order_by('run_at').values_list('pk', flat=True)
+    for pk in candidates[:10]:
+        # Условный UPDATE: из нескольких исполнителей задачу
+        # получит только один.
+        claimed = Task.objects.filter(
+            pk=pk, status__in=(Task.PENDING, Task.RUNNING), run_at__lte=now,
+        ).update(
+            status=Task.RUNNING,
+            attempts=F('attempts') + 1,
+            run_at=now + timedelta(seconds=settings.TASKS_LEASE),
+        )
+        if claimed:
+            return Task.objects.get(pk=pk)
+    return None
+
+
+def execute(task):
+    """Выполняет задачу из базы и записывает результат."""
+    try:
+        func = import_string(task.name)
+        with use_primary():
+            func(*json.loads(task.args))
+    except Exception:
+        logger.exception('Задача %s упала, попытка %s', task, task.attempts)
+        failed = task.attempts >= settings.TASKS_MAX_ATTEMPTS
+        try:
+            with transaction.atomic():
+                Task.objects.filter(pk=task.pk).update(
+                    status=Task.FAILED if failed else Task.PENDING,
+                    run_at=timezone.now() + timedelta(
+                        seconds=retry_delay(task.attempts)),
+                    last_error=traceback.format_exc(),
+                )
+        except IntegrityError:
+            # Пока задача выполнялась, с тем же ключом поставили
+            # новую: повтор сделает она.
+            Task.objects.filter(pk=task.pk).delete()
+        return False
+    Task.objects.filter(pk=task.pk).delete()
+    return True
+
+
+def run_pending(limit=None):
+    """Выполняет готовые задачи из базы и возвращает их число."""
+    done = 0
+    while limit is None or done < limit:
+        task = claim()
+        if task is None:
+            break
+        execute(task)
+        done += 1
+    return done
@@ -0,0 +1,156 @@
+import asyncio
+
+from django.http import StreamingHttpResponse
+from django.test import SimpleTestCase, override_settings
+from django.urls import reverse
+
+from core.asgi import ASGIHandler, build_environ
+
+
+def run_app(app, scope, body=b'', disconnect_after=None):
+    """Выполняет ASGI-приложение и возвращает отправленные сообщения.
+
+    С disconnect_after клиент отключается, получив столько сообщений.
+    """
+    messages = []
+
+    async def main():
+        requested = asyncio.Event()
+        disconnected = asyncio.Event()
+
+        async def receive():
+            if not requested.is_set():
+                requested.set()
+                return {'type': 'http.request', 'body': body}
+            await disconnected.wait()
+            return {'type': 'http.disconnect'}
+
+        async def send(message):
+            messages.append(message)
+            if len(messages) == disconnect_after:
+                disconnected.set()
+
+        await app(scope, receive, send)
+
+    loop = asyncio.new_event_loop()
+    try:
+        loop.run_until_complete(main())
+    finally:
+        loop.close()
+    return messages
+
+
+def http_scope(path, method='GET', query=b'', headers=()):
+    return {
+        'type': 'http',
+        'method': method,
+        'path': path,
+        'query_string': query,
+        'headers': list(headers),
+        'server': ('testserver', 80),
+        'client': ('127.0.0.1', 5000),
+    }
+
+
+class ASGIHandlerTests(SimpleTestCase):
+    """ASGI-приложение поверх WSGI-обработчика Django."""
+
+    def test_environ(self):
+        """Заголовки, путь и строка запроса переходят в WSGI-окружение."""
+        environ = build_environ(http_scope(
+            '/группа/', query=b'page=2', headers=[
+                (b'content-type', b'text/plain'),
+                (b'x-forwarded-for', b'1.1.1.1'),
+                (b'x-forwarded-for', b'2.2.2.2'),
+                (b'cookie', b'a=1'),
+                (b'cookie', b'b=2'),
+            ]), None)
+        self.assertEqual(
+            environ['PATH_INFO'].encode('latin-1').decode(), '/группа/')
+        self.assertEqual(environ['QUERY_STRING'], 'page=2')
+        self.assertEqual(environ['CONTENT_TYPE'], 'text/plain')
+        self.assertEqual(environ['HTTP_X_FORWARDED_FOR'], '1.1.1.1,2.2.2.2')
+        self.assertEqual(environ['HTTP_COOKIE'], 'a=1; b=2')
+        self.assertEqual(environ['REMOTE_ADDR'], '127.0.0.1')
+
+    def test_django_page(self):
+        """Страница Django отдаётся со статусом, заголовками и телом."""
+        app = ASGIHandler(threads=1, stream_threads=1)
+        start, body = run_app(app, http_scope(reverse('about:author')))
+        self.assertEqual(start['status'], 200)
+        self.assertIn(
+            (b'content-type', b'text/html; charset=utf-8'), start['headers'])
+        self.assertIn(b'<html', body['body'])
+
+    def test_request_body(self):
+        """Тело запроса доходит до приложения."""
+
+        def echo(environ, start_response):
+            length = int(environ['CONTENT_LENGTH'])
+            start_response('201 Created', [('Content-Type', 'text/plain')])
+            return [environ['wsgi.input'].read(length)]
+
+        app = ASGIHandler(wsgi=echo, threads=1, stream_threads=1)
+        start, body = run_app(
+            app, http_scope('/', 'POST', headers=[(b'content-length', b'5')]),
+            body=b'hello')
+        self.assertEqual(start['status'], 201)
+        self.assertEqual(body['body'], b'hello')
+
+    @override_settings(FILE_UPLOAD_MAX_SIZE=4)
+    def test_request_too_large(self):
+        """Слишком большое тело не доходит до приложения: ответ 413."""
+        calls = []
+
+        def app_called(environ, start_response):
+            calls.append(environ)
+            start_response('200 OK', [])
+            return [b'']
+
+        app = ASGIHandler(wsgi=app_called, threads=1, stream_threads=1)
+        for headers in ([(b'content-length', b'5')], []):
+            with self.subTest(headers=headers):
+                start, body = run_app(
+                    app, http_scope('/', 'POST', headers=headers),
+                    body=b'hello')
+                self.assertEqual(start['status'], 413)
+        self.assertEqual(calls, [])
+
+    def test_streaming_response(self):
+        """Потоковый ответ отправляется по частям и закрывается."""
+        closed = []
+
+        def chunks():
+            try:
+                yield b'one'
+                yield b'two'
+            finally:
+                closed.append(True)
+
+        def streaming(environ, start_response):
+            response = StreamingHttpResponse(chunks())
+            start_response('200 OK', list(response.items()))
+            return response
+
+        app = ASGIHandler(wsgi=streaming, threads=1, stream_threads=1)
+        messages = run_app(app, http_scope('/'))
+        self.assertEqual(
+            [message.get('body') for message in messages[1:]],
+            [b'one', b'two', b''])
+        self.assertTrue(closed)
+
+    def test_disconnect_stops_stream(self):
+        """Отключение клиента прерывает бесконечный поток."""
+
+        def endless():
+            while True:
+                yield b'tick'
+
+        def streaming(environ, start_response):
+            response = StreamingHttpResponse(endless())
+            start_response('200 OK', list(response.items()))
+            return response
+
+        app = ASGIHandler(wsgi=streaming, threads=1, stream_threads=1)
+        messages = run_app(app, http_scope('/'), disconnect_after=3)
+        self.assertLess(len(messages), 10)
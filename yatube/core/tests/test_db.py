@@ -0,0 +1,97 @@
+from unittest import mock
+
+from django.apps import apps as django_apps
+from django.contrib.sessions.backends.db import SessionStore
+from django.contrib.sessions.models import Session
+from django.db import DEFAULT_DB_ALIAS, connection
+from django.db.migrations.state import ProjectState
+from django.http import HttpResponse
+from django.test import RequestFactory, TestCase, override_settings
+
+from core.db import (STICKY_SESSION_KEY, PrimaryReplicaRouter,
+                     ReplicaRoutingMiddleware, pool_stats, use_primary)
+from posts.models import Post
+
+REPLICAS = ['replica1', 'replica2']
+
+
+@override_settings(DATABASE_REPLICAS=REPLICAS)
+class ReplicaRoutingTests(TestCase):
+    """Чтения идут на реплики, кроме запросов после записи."""
+
+    def setUp(self):
+        self.router = PrimaryReplicaRouter()
+        self.factory = RequestFactory()
+        self.session = SessionStore()
+
+    def run_request(self, method='get', write=False):
+        """Прогоняет запрос через middleware и возвращает базы чтений."""
+        reads = []
+
+        def view(request):
+            reads.append(self.router.db_for_read(Post))
+            if write:
+                self.router.db_for_write(Post)
+                reads.append(self.router.db_for_read(Post))
+            return HttpResponse()
+
+        request = getattr(self.factory, method)('/')
+        request.session = self.session
+        ReplicaRoutingMiddleware(view)(request)
+        return reads
+
+    def test_reads_go_to_replicas(self):
+        """Обычные чтения распределяются по репликам."""
+        self.assertIn(self.router.db_for_read(Post), REPLICAS)
+        self.assertEqual(self.router.db_for_write(Post), DEFAULT_DB_ALIAS)
+
+    @override_settings(DATABASE_REPLICAS=[])
+    def test_without_replicas(self):
+        """Без реплик всё идёт в основную базу."""
+        self.assertEqual(self.router.db_for_read(Post), DEFAULT_DB_ALIAS)
+
+    def test_sessions_are_read_from_primary(self):
+        """Сессии всегда читаются из основной базы."""
+        self.assertEqual(
+            self.router.db_for_read(Session), DEFAULT_DB_ALIAS)
+
+    def test_migrations_read_from_primary(self):
+        """Исторические модели миграций читаются из основной базы."""
+        apps = ProjectState.from_apps(django_apps).apps
+        self.assertEqual(
+            self.router.db_for_read(apps.get_model('posts', 'Post')),
+            DEFAULT_DB_ALIAS)
+
+    def test_unsafe_requests_use_primary(self):
+        """POST читает из основной базы."""
+        self.assertEqual(self.run_request('post'), [DEFAULT_DB_ALIAS])
+
+    def test_read_after_write_in_request(self):
+        """После записи в запросе чтения идут в основную базу."""
+        first, after_write = self.run_request(write=True)
+        self.assertIn(first, REPLICAS)
+        self.assertEqual(after_write, DEFAULT_DB_ALIAS)
+
+    def test_session_sticks_to_primary_after_write(self):
+        """После записи пользователь какое-то время читает из основной базы."""
+        self.run_request('post', write=True)
+        self.assertIn(STICKY_SESSION_KEY, self.session)
+        self.assertEqual(self.run_request(), [DEFAULT_DB_ALIAS])
+        with mock.patch('core.db.time.time', return_value=10 ** 10):
+            self.assertIn(self.run_request()[0], REPLICAS)
+
+    def test_use_primary(self):
+        """Внутри use_primary чтения идут в основную базу."""
+        with use_primary():
+            self.assertEqual(self.router.db_for_read(Post), DEFAULT_DB_ALIAS)
+        self.assertIn(self.router.db_for_read(Post), REPLICAS)
+
+
+class PoolStatsTests(TestCase):
+
+    def test_open_connections_are_counted(self):
+        """Статистика видит открытое соединение с основной базой."""
+        connection.ensure_connection()
+        stats = pool_stats()[DEFAULT_DB_ALIAS]
+        self.assertGreaterEqual(stats['open'], 1)
+        self.assertGreaterEqual(stats['opened'], 1)
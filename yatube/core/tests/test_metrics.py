@@ -0,0 +1,98 @@
+import re
+
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from core.metrics import (RequestMetrics, _current, profile_section,
+                          registry)
+from posts.models import Post, User
+
+
+class MetricsTests(TestCase):
+    """Метрики запросов попадают в Server-Timing и на /metrics/."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='author')
+        Post.objects.create(author=cls.user, text='Тестовый пост')
+
+    def setUp(self):
+        cache.clear()
+        registry.reset()
+
+    def timing(self, response):
+        return dict(
+            re.findall(r'(\w+);(?:dur=[\d.]+;)?desc="([^"]*)"',
+                       response['Server-Timing']))
+
+    def test_server_timing(self):
+        """Ответ сообщает число запросов к базе и обращения к кэшу."""
+        first = self.client.get(reverse('posts:index'))
+        second = self.client.get(reverse('posts:index'))
+        self.assertNotEqual(self.timing(first)['db'], '0 queries')
+        self.assertIn('tpl;dur=', first['Server-Timing'])
+        self.assertIn('hit=0', self.timing(first)['cache'])
+        self.assertEqual(self.timing(second)['cache'], 'hit=1 miss=0')
+
+    @override_settings(REQUEST_BUDGETS={'*': {'queries': 0}})
+    def test_over_budget_is_logged(self):
+        """Запрос сверх бюджета пишется в лог."""
+        with self.assertLogs('core.metrics', 'WARNING') as logs:
+            self.client.get(reverse('posts:index'))
+        self.assertIn('posts:index', logs.output[0])
+        self.assertIn('queries=', logs.output[0])
+
+    def test_prometheus_endpoint(self):
+        """Суммы по представлениям отдаются в формате Prometheus."""
+        self.client.get(reverse('posts:index'))
+        self.client.get(reverse('posts:index'))
+        response = self.client.get(reverse('metrics'))
+        self.assertEqual(response.status_code, 200)
+        text = response.content.decode()
+        self.assertIn(
+            'yatube_view_requests_total{view="posts:index"} 2', text)
+        self.assertIn(
+            'yatube_view_duration_seconds_count{view="posts:index"} 2', text)
+        self.assertIn('yatube_db_connections_open{alias="default"}', text)
+
+    @override_settings(TEMPLATE_PROFILING=True)
+    def test_template_profile(self):
+        """Время рендера раскладывается по шаблонам и тегу карточки."""
+        response = self.client.get(reverse('posts:index'))
+        self.assertIn('tpl-self;dur=', response['Server-Timing'])
+        text = self.client.get(reverse('metrics')).content.decode()
+        for name in ('posts/index.html', 'base.html', 'tag:post_card'):
+            self.assertIn(
+                f'yatube_template_renders_total{{template="{name}"}} 1', text)
+        self.assertIn(
+            'yatube_template_seconds_total{template="base.html"}', text)
+
+    @override_settings(TEMPLATE_PROFILING=False)
+    def test_template_profile_disabled(self):
+        """Без TEMPLATE_PROFILING шаблоны по отдельности не замеряются."""
+        self.client.get(reverse('posts:index'))
+        text = self.client.get(reverse('metrics')).content.decode()
+        self.assertNotIn('yatube_template_renders_total{', text)
+
+    @override_settings(TEMPLATE_PROFILING=True)
+    def test_profile_section_counts_own_time(self):
+        """Время вложенного участка не засчитывается внешнему."""
+        metrics = RequestMetrics()
+        token = _current.set(metrics)
+        try:
+            with profile_section('outer'):
+                with profile_section('inner'):
+                    sum(range(100_000))
+        finally:
+            _current.reset(token)
+        (outer_renders, outer), (inner_renders, inner) = (
+            metrics.templates['outer'], metrics.templates['inner'])
+        self.assertEqual((outer_renders, inner_renders), (1, 1))
+        self.assertLess(outer, inner)
+
+    def test_endpoint_is_not_public(self):
+        """Страница метрик недоступна с посторонних адресов."""
+        response = self.client.get(
+            reverse('metrics'), REMOTE_ADDR='10.0.0.1')
+        self.assertEqual(response.status_code, 404)
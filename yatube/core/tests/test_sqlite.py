@@ -0,0 +1,56 @@
+import threading
+
+from django.db import connection
+from django.http import HttpResponse
+from django.test import (RequestFactory, SimpleTestCase, TestCase,
+                         override_settings)
+
+from core.sqlite import apply_pragmas, serialize_writes, write_queue
+
+
+class PragmaTests(TestCase):
+
+    @override_settings(SQLITE_PRAGMAS={'busy_timeout': 1234})
+    def test_pragmas_are_applied(self):
+        """Новое соединение получает PRAGMA из настроек."""
+        apply_pragmas(sender=None, connection=connection)
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA busy_timeout')
+            self.assertEqual(cursor.fetchone()[0], 1234)
+
+
+class WriteQueueTests(SimpleTestCase):
+
+    def thread_view(self, request):
+        return HttpResponse(threading.get_ident())
+
+    def test_writes_run_in_one_thread(self):
+        """Изменяющие запросы выполняются в одном потоке записи."""
+        view = serialize_writes(self.thread_view)
+        factory = RequestFactory()
+        with self.settings(SQLITE_WRITE_QUEUE=True):
+            writers = {view(factory.post('/')).content for _ in range(3)}
+            reader = view(factory.get('/')).content
+        self.assertEqual(len(writers), 1)
+        self.assertNotIn(reader, writers)
+        self.assertEqual(
+            reader, str(threading.get_ident()).encode())
+
+    def test_errors_are_propagated(self):
+        """Исключение из очереди записи доходит до вызывающего."""
+        with self.assertRaises(ZeroDivisionError):
+            write_queue.run(lambda: 1 / 0)
+
+    def test_nested_run(self):
+        """Вызов из потока записи выполняется сразу, без ожидания себя."""
+        self.assertEqual(
+            write_queue.run(lambda: write_queue.run(threading.get_ident)),
+            write_queue.run(threading.get_ident))
+
+    def test_all_methods(self):
+        """Представление, меняющее данные по GET, идёт в очередь целиком."""
+        view = serialize_writes(all_methods=True)(self.thread_view)
+        with self.settings(SQLITE_WRITE_QUEUE=True):
+            reader = view(RequestFactory().get('/')).content
+        self.assertEqual(reader, write_queue.run(
+            lambda: str(threading.get_ident()).encode()))
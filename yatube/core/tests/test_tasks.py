@@ -0,0 +1,137 @@
+from datetime import timedelta
+
+from django.core.cache import cache
+from django.db import transaction
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from core import tasks
+from core.models import Task
+
+CALLS = []
+
+
+def record(value):
+    CALLS.append(value)
+
+
+def fail(value):
+    raise RuntimeError(value)
+
+
+@override_settings(TASKS_MODE='database', TASKS_MAX_ATTEMPTS=2)
+class DatabaseQueueTests(TestCase):
+    """Очередь задач в базе данных."""
+
+    def setUp(self):
+        CALLS.clear()
+
+    def test_tasks_run_and_are_removed(self):
+        """Исполнитель выполняет задачу с её аргументами и удаляет её."""
+        tasks.enqueue(record, 1)
+        tasks.enqueue(record, 2)
+        self.assertEqual(CALLS, [])
+        self.assertEqual(tasks.run_pending(), 2)
+        self.assertEqual(sorted(CALLS), [1, 2])
+        self.assertFalse(Task.objects.exists())
+
+    def test_idempotency_key(self):
+        """Задача с ключом не ставится второй раз, пока ждёт выполнения."""
+        tasks.enqueue(record, 1, key='same')
+        tasks.enqueue(record, 2, key='same')
+        tasks.run_pending()
+        self.assertEqual(CALLS, [1])
+        tasks.enqueue(record, 3, key='same')
+        tasks.run_pending()
+        self.assertEqual(CALLS, [1, 3])
+
+    def test_key_is_free_while_running(self):
+        """Задача, поставленная во время выполнения, не теряется."""
+        tasks.enqueue(record, 1, key='same')
+        task = tasks.claim()
+        tasks.enqueue(record, 2, key='same')
+        tasks.execute(task)
+        tasks.run_pending()
+        self.assertEqual(CALLS, [1, 2])
+
+    def test_failed_run_yields_to_new_task(self):
+        """Повтор упавшей задачи уступает новой задаче с тем же ключом."""
+        tasks.enqueue(fail, 'boom', key='same')
+        task = tasks.claim()
+        tasks.enqueue(record, 1, key='same')
+        with self.assertLogs('core.tasks', 'ERROR'):
+            tasks.execute(task)
+        self.assertEqual(
+            list(Task.objects.values_list('name', flat=True)),
+            [tasks.task_name(record)])
+
+    def test_retries(self):
+        """Упавшая задача повторяется позже, а после всех попыток — нет."""
+        with self.assertLogs('core.tasks', 'ERROR'):
+            tasks.enqueue(fail, 'boom')
+            tasks.run_pending()
+        task = Task.objects.get()
+        self.assertEqual(task.status, Task.PENDING)
+        self.assertEqual(task.attempts, 1)
+        self.assertGreater(task.run_at, timezone.now())
+        self.assertIn('boom', task.last_error)
+        self.assertEqual(tasks.run_pending(), 0)
+
+        Task.objects.update(run_at=timezone.now())
+        with self.assertLogs('core.tasks', 'ERROR'):
+            tasks.run_pending()
+        task.refresh_from_db()
+        self.assertEqual(task.status, Task.FAILED)
+        self.assertEqual(task.attempts, 2)
+
+    def test_lost_task_is_reclaimed(self):
+        """Задачу, исполнитель которой пропал, забирает другой."""
+        tasks.enqueue(record, 1)
+        task = tasks.claim()
+        self.assertIsNone(tasks.claim())
+        Task.objects.filter(pk=task.pk).update(
+            run_at=timezone.now() - timedelta(seconds=1))
+        self.assertEqual(tasks.claim().pk, task.pk)
+
+
+class InlineModesTests(TestCase):
+
+    def setUp(self):
+        CALLS.clear()
+        cache.clear()
+
+    @override_settings(TASKS_MODE='sync')
+    def test_sync_mode(self):
+        """В режиме sync задача выполняется сразу, ошибка не всплывает."""
+        tasks.enqueue(record, 1)
+        self.assertEqual(CALLS, [1])
+        with self.assertLogs('core.tasks', 'ERROR'):
+            tasks.enqueue(fail, 'boom')
+
+    def test_thread_releases_key_before_run(self):
+        """Ключ свободен, пока задача выполняется в потоке."""
+        cache.add(tasks.KEY_LOCK.format('same'), 1)
+
+        def check():
+            CALLS.append(cache.get(tasks.KEY_LOCK.format('same')))
+
+        tasks.run_in_thread(check, (), 'same')
+        self.assertEqual(CALLS, [None])
+
+    @override_settings(TASKS_MODE='thread')
+    def test_rollback_does_not_lock_key(self):
+        """Задача из откаченной транзакции не занимает ключ."""
+        try:
+            with transaction.atomic():
+                tasks.enqueue(record, 1, key='same')
+                raise RuntimeError
+        except RuntimeError:
+            pass
+        self.assertIsNone(cache.get(tasks.KEY_LOCK.format('same')))
+
+    @override_settings(TASKS_MAX_ATTEMPTS=3, TASKS_RETRY_DELAY=0)
+    def test_thread_retries(self):
+        """В потоке упавшая задача повторяется TASKS_MAX_ATTEMPTS раз."""
+        with self.assertLogs('core.tasks', 'ERROR') as logs:
+            tasks.run_in_thread(fail, ('boom',), '')
+        self.assertEqual(len(logs.output), 3)
@@ -0,0 +1,455 @@
+"""JSON API постов, сообществ, комментариев и подписок.
+
+Адреса повторяют posts/urls.py под префиксом api/v1/. Списки читаются
+через values_list() и собираются в словари без создания моделей,
+листаются курсором по ключу сортировки, а параметр fields оставляет
+в ответе (и в запросе к базе) только перечисленные поля. На GET
+отвечают с ETag и Last-Modified, как и HTML-страницы.
+
+Пишущие запросы авторизуются сессией и проверяют CSRF-токен, данные
+принимаются в JSON или как форма (картинка поста — только формой).
+"""
+import json
+from datetime import datetime
+from functools import wraps
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.db.models import Q
+from django.http import Http404, HttpResponse, JsonResponse, QueryDict
+from django.shortcuts import get_object_or_404
+
+from core.sqlite import serialize_writes
+
+from .caching import (ALL_GROUPS, ALL_POSTS, author_scope, group_scope,
+                      post_scope)
+from .conditional import conditional_page
+from .feeds import MergedFeedPaginator, follow_feed
+from .forms import CommentForm, PostForm
+from .models import Comment, Follow, Group, Post, User
+from .search import get_backend, valid_after
+from .uploads import streaming_image_uploads
+from .utils import decode_cursor, encode_cursor
+
+SAFE_METHODS = ('GET', 'HEAD')
+
+POST_FIELDS = {
+    'id': 'id',
+    'text': 'text',
+    'pub_date': 'pub_date',
+    'author': 'author__username',
+    'group': 'group__slug',
+    'image': 'image',
+    'comments_count': 'comments_count',
+}
+# Списки кешируются по областям лент, а комментарии сбрасывают только
+# область поста, поэтому число комментариев есть лишь у одного поста.
+LIST_POST_FIELDS = {
+    name: field for name, field in POST_FIELDS.items()
+    if name != 'comments_count'
+}
+COMMENT_FIELDS = {
+    'id': 'id',
+    'post': 'post_id',
+    'author': 'author__username',
+    'text': 'text',
+    'created': 'created',
+}
+GROUP_FIELDS = {
+    'id': 'id',
+    'title': 'title',
+    'slug': 'slug',
+    'description': 'description',
+}
+PROFILE_FIELDS = {
+    'id': 'id',
+    'username': 'username',
+    'first_name': 'first_name',
+    'last_name': 'last_name',
+    'posts_count': 'profile__posts_count',
+    'followers_count': 'profile__followers_count',
+    'following_count': 'profile__following_count',
+}
+CONVERTERS = {
+    'image': lambda name: default_storage.url(name) if name else None,
+}
+
+
+class ApiError(Exception):
+
+    def __init__(self, status, detail):
+        super().__init__(detail)
+        self.status = status
+        self.detail = detail
+
+
+def api_view(*methods):
+    """Проверяет метод и авторизацию, ошибки отдаёт в JSON."""
+
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            allowed = methods + ('HEAD',) if 'GET' in methods else methods
+            if request.method not in allowed:
+                response = JsonResponse(
+                    {'detail': 'Метод не поддерживается.'}, status=405)
+                response['Allow'] = ', '.join(allowed)
+                return response
+            try:
+                if (request.method not in SAFE_METHODS
+                        and not request.user.is_authenticated):
+                    raise ApiError(401, 'Нужна авторизация.')
+                return view(request, *args, **kwargs)
+            except Http404:
+                return JsonResponse({'detail': 'Не найдено.'}, status=404)
+            except ApiError as error:
+                key = 'errors' if isinstance(error.detail, dict) else 'detail'
+                return JsonResponse({key: error.detail}, status=error.status)
+
+        return wrapper
+
+    return decorator
+
+
+def requested_fields(request, available):
+    """Поля из параметра fields или все доступные."""
+    raw = request.GET.get('fields')
+    if not raw:
+        return list(available)
+    names = [name for name in raw.split(',') if name]
+    unknown = [name for name in names if name not in available]
+    if unknown:
+        raise ApiError(400, f'Неизвестные поля: {", ".join(unknown)}.')
+    return names
+
+
+def requested_limit(request):
+    try:
+        limit = int(request.GET.get('limit', settings.POSTS_PER_PAGE))
+    except ValueError:
+        raise ApiError(400, 'limit должен быть числом.')
+    return min(max(limit, 1), settings.API_MAX_LIMIT)
+
+
+def to_dict(names, row):
+    return {
+        name: CONVERTERS[name](value) if name in CONVERTERS else value
+        for name, value in zip(names, row)
+    }
+
+
+def after_filter(keys, values, descending):
+    """Условие «строго после values» для сортировки по keys."""
+    lookup = 'lt' if descending else 'gt'
+    # Нестрогий диапазон по первому ключу позволяет базе начать
+    # обход индекса сразу с нужного места.
+    condition = Q(**{f'{keys[0]}__{lookup}e': values[0]})
+    after = Q()
+    for index, key in enumerate(keys):
+        equal = dict(zip(keys[:index], values[:index]))
+        after |= Q(**equal, **{f'{key}__{lookup}': values[index]})
+    return condition & after
+
+
+def next_url(request, cursor):
+    query = request.GET.copy()
+    query['cursor'] = cursor
+    return request.build_absolute_uri(f'{request.path}?{query.urlencode()}')
+
+
+def list_response(request, queryset, fields, keys=('pub_date', 'id'),
+                  descending=True, prefix=''):
+    """Страница записей queryset со ссылкой на следующую.
+
+    keys — поля сортировки, последнее из них уникально; prefix
+    добавляется к путям полей, если queryset строится по другой
+    модели (например, по записям ленты).
+    """
+    names = requested_fields(request, fields)
+    limit = requested_limit(request)
+    queryset = queryset.order_by(
+        *(f'-{key}' if descending else key for key in keys))
+    values = None
+    cursor = request.GET.get('cursor')
+    if cursor:
+        values = decode_cursor(cursor)
+        if not isinstance(values, list) or len(values) != len(keys):
+            raise ApiError(400, 'Неверный курсор.')
+    columns = [prefix + fields[name] for name in names] + list(keys)
+    # Значения курсора приводятся к типам полей уже в filter().
+    try:
+        if values is not None:
+            queryset = queryset.filter(
+                after_filter(keys, values, descending))
+        rows = list(queryset.values_list(*columns)[:limit + 1])
+    except (ValidationError, ValueError, TypeError):
+        raise ApiError(400, 'Неверный курсор.')
+    return rows_response(request, names, rows, limit)
+
+
+def merged_list_response(request, feed, fields):
+    """Страница MergedFeed в том же виде, что и у list_response."""
+    names = requested_fields(request, fields)
+    limit = requested_limit(request)
+    after = None
+    cursor = request.GET.get('cursor')
+    if cursor:
+        after = decode_cursor(cursor)
+        if not isinstance(after, list) or len(after) != 2:
+            raise ApiError(400, 'Неверный курсор.')
+    try:
+        rows = feed.values(
+            [fields[name] for name in names], limit + 1, after)
+    except (ValidationError, ValueError, TypeError):
+        raise ApiError(400, 'Неверный курсор.')
+    return rows_response(request, names, rows, limit)
+
+
+def rows_response(request, names, rows, limit):
+    """Ответ со строками страницы; последние столбцы строк — ключ."""
+    next_page = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = [
+            value.isoformat() if isinstance(value, datetime) else value
+            for value in rows[-1][len(names):]
+        ]
+        next_page = next_url(request, encode_cursor(last))
+    return JsonResponse({
+        'results': [to_dict(names, row) for row in rows],
+        'next': next_page,
+    })
+
+
+def object_response(request, queryset, fields, status=200):
+    names = requested_fields(request, fields)
+    row = queryset.values_list(*(fields[name] for name in names)).first()
+    if row is None:
+        raise Http404
+    return JsonResponse(to_dict(names, row), status=status)
+
+
+def request_data(request):
+    """Данные запроса из JSON-тела или формы."""
+    if request.content_type != 'application/json':
+        if request.method == 'POST':
+            return request.POST.dict()
+        # Для остальных методов Django не разбирает тело формы.
+        if request.content_type == 'application/x-www-form-urlencoded':
+            return QueryDict(request.body, encoding=request.encoding).dict()
+        if request.body:
+            raise ApiError(
+                415, 'Ожидается JSON или application/x-www-form-urlencoded.')
+        return {}
+    try:
+        data = json.loads(request.body or b'{}')
+    except ValueError:
+        raise ApiError(400, 'Тело запроса — не JSON.')
+    if not isinstance(data, dict):
+        raise ApiError(400, 'Ожидается JSON-объект.')
+    return data
+
+
+def post_form_data(request, post=None):
+    """Данные для PostForm: сообщество в API задаётся слагом."""
+    data = request_data(request)
+    slug = data.get('group')
+    if post is not None:
+        data = {'text': post.text, 'group': post.group_id, **data}
+    if slug:
+        group_id = Group.objects.filter(
+            slug=slug).values_list('pk', flat=True).first()
+        if group_id is None:
+            raise ApiError(400, {'group': [f'Нет сообщества {slug}.']})
+        data['group'] = group_id
+    return data
+
+
+def load_group(slug):
+    return get_object_or_404(Group.objects.only('pk'), slug=slug)
+
+
+def load_author(username):
+    return get_object_or_404(User.objects.only('pk'), username=username)
+
+
+def load_post(post_id):
+    return get_object_or_404(
+        Post.objects.only('pk', 'author_id'), pk=post_id)
+
+
+def post_scopes(post):
+    return (post_scope(post.pk), author_scope(post.author_id))
+
+
+@api_view('GET', 'POST')
+@streaming_image_uploads
+@serialize_writes
+@conditional_page(lambda: (ALL_POSTS,))
+def posts(request):
+    if request.method == 'POST':
+        return create_post(request)
+    return list_response(request, Post.objects.all(), LIST_POST_FIELDS)
+
+
+@transaction.atomic
+def create_post(request):
+    form = PostForm(
+        post_form_data(request),
+        files=request.FILES or None,
+        upload_errors=getattr(request, 'upload_errors', None),
+    )
+    if not form.is_valid():
+        raise ApiError(400, form.errors)
+    post = form.save(commit=False)
+    post.author = request.user
+    post.save()
+    return object_response(
+        request, Post.objects.filter(pk=post.pk), POST_FIELDS, status=201)
+
+
+@api_view('GET', 'PATCH')
+@serialize_writes
+@conditional_page(post_scopes, load_post)
+def post_detail(request, post):
+    if request.method == 'PATCH':
+        return edit_post(request, post.pk)
+    return object_response(
+        request, Post.objects.filter(pk=post.pk), POST_FIELDS)
+
+
+@transaction.atomic
+def edit_post(request, post_id):
+    post = get_object_or_404(Post.objects.select_for_update(), pk=post_id)
+    if post.author_id != request.user.pk:
+        raise ApiError(403, 'Редактировать пост может только автор.')
+    form = PostForm(post_form_data(request, post), instance=post)
+    if not form.is_valid():
+        raise ApiError(400, form.errors)
+    form.save()
+    return object_response(
+        request, Post.objects.filter(pk=post_id), POST_FIELDS)
+
+
+@api_view('GET', 'POST')
+@serialize_writes
+@conditional_page(lambda post: (post_scope(post.pk),), load_post)
+def comments(request, post):
+    if request.method == 'POST':
+        return add_comment(request, post)
+    return list_response(
+        request, post.comments.all(), COMMENT_FIELDS,
+        keys=('created', 'id'), descending=False)
+
+
+@transaction.atomic
+def add_comment(request, post):
+    form = CommentForm(request_data(request))
+    if not form.is_valid():
+        raise ApiError(400, form.errors)
+    comment = form.save(commit=False)
+    comment.author = request.user
+    comment.post = post
+    comment.save()
+    return object_response(
+        request, Comment.objects.filter(pk=comment.pk), COMMENT_FIELDS,
+        status=201)
+
+
+@api_view('GET')
+@conditional_page(lambda: (ALL_GROUPS,))
+def groups(request):
+    # Создание, правка и удаление сообщества меняют версию ALL_GROUPS.
+    return list_response(
+        request, Group.objects.all(), GROUP_FIELDS,
+        keys=('id',), descending=False)
+
+
+@api_view('GET')
+@conditional_page(lambda group: (group_scope(group.pk),), load_group)
+def group_detail(request, group):
+    return object_response(
+        request, Group.objects.filter(pk=group.pk), GROUP_FIELDS)
+
+
+@api_view('GET')
+@conditional_page(lambda group: (group_scope(group.pk),), load_group)
+def group_posts(request, group):
+    return list_response(request, group.posts.all(), LIST_POST_FIELDS)
+
+
+@api_view('GET')
+@conditional_page(lambda author: (author_scope(author.pk),), load_author)
+def profile(request, author):
+    names = requested_fields(request, PROFILE_FIELDS)
+    row = User.objects.filter(pk=author.pk).values_list(
+        *(PROFILE_FIELDS[name] for name in names)).get()
+    data = to_dict(names, row)
+    if request.user.is_authenticated:
+        data['following'] = author.following.filter(
+            user=request.user).exists()
+    return JsonResponse(data)
+
+
+@api_view('GET')
+@conditional_page(lambda author: (author_scope(author.pk),), load_author)
+def profile_posts(request, author):
+    return list_response(request, author.posts.all(), LIST_POST_FIELDS)
+
+
+@api_view('POST', 'DELETE')
+@serialize_writes
+@transaction.atomic
+def profile_follow(request, username):
+    author = get_object_or_404(User, username=username)
+    if request.method == 'DELETE':
+        deleted = Follow.objects.filter(
+            user=request.user, author=author).first()
+        if deleted is None:
+            raise Http404
+        deleted.delete()
+        return HttpResponse(status=204)
+    if author == request.user:
+        raise ApiError(400, 'Нельзя подписаться на самого себя.')
+    _, created = Follow.objects.get_or_create(
+        user=request.user, author=author)
+    return JsonResponse(
+        {'author': author.username}, status=201 if created else 200)
+
+
+@api_view('GET')
+def follow_posts(request):
+    if not request.user.is_authenticated:
+        raise ApiError(401, 'Нужна авторизация.')
+    queryset, paginator_class = follow_feed(request.user)
+    if paginator_class is MergedFeedPaginator:
+        return merged_list_response(request, queryset, LIST_POST_FIELDS)
+    return list_response(
+        request, queryset, LIST_POST_FIELDS, keys=paginator_class.keys,
+        prefix='post__')
+
+
+@api_view('GET')
+def search(request):
+    names = requested_fields(request, LIST_POST_FIELDS)
+    limit = requested_limit(request)
+    hits = get_backend().search(
+        request.GET.get('q', ''), valid_after(request.GET.get('cursor')),
+        limit + 1)
+    next_page = None
+    if len(hits) > limit:
+        hits = hits[:limit]
+        last_id, last_score = hits[-1]
+        next_page = next_url(request, encode_cursor([last_score, last_id]))
+    ids = [pk for pk, score in hits]
+    rows = {
+        row[-1]: row[:-1] for row in Post.objects.filter(
+            pk__in=ids).values_list(
+                *(LIST_POST_FIELDS[name] for name in names), 'pk')
+    }
+    return JsonResponse({
+        'results': [to_dict(names, rows[pk]) for pk in ids if pk in rows],
+        'next': next_page,
+    })
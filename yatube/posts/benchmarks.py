@@ -0,0 +1,344 @@
+"""Вспомогательные функции для замеров производительности."""
+import asyncio
+import math
+import random
+import socketserver
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import timedelta
+from http import HTTPStatus
+from itertools import accumulate
+from urllib.parse import unquote
+from wsgiref.simple_server import WSGIRequestHandler, WSGIServer
+
+from django.db import connection
+from django.utils import timezone
+
+from . import feeds
+from .counters import reconcile
+from .models import Comment, Follow, Group, Post, User
+from .utils import bulk_insert
+
+
+@contextmanager
+def temporary_database(verbosity=0, name=None):
+    """Создаёт чистую базу, как при запуске тестов, и удаляет её после.
+
+    name задаёт файл базы: SQLite по умолчанию создаёт тестовую базу
+    в памяти, а замерам конкурентного доступа нужен файл.
+    """
+    old_name = connection.settings_dict['NAME']
+    if name is not None:
+        connection.settings_dict['TEST']['NAME'] = name
+    connection.creation.create_test_db(
+        verbosity=verbosity, autoclobber=True, serialize=False)
+    try:
+        yield
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=verbosity)
+
+
+def text_pool(size=500, seed=0):
+    """Набор правдоподобных текстов постов для генерации данных."""
+    from faker import Faker
+
+    fake = Faker('ru_RU')
+    fake.seed_instance(seed)
+    return [fake.paragraph(nb_sentences=3) for _ in range(size)]
+
+
+def seed_posts(count, authors=100, groups=10, batch_size=5000, seed=0):
+    """Заполняет базу постами с равномерно растущим pub_date."""
+    rng = random.Random(seed)
+    User.objects.bulk_create(
+        User(username=f'bench_{i}') for i in range(authors))
+    Group.objects.bulk_create(
+        Group(title=f'bench_{i}', slug=f'bench-{i}', description='bench')
+        for i in range(groups))
+    author_ids = list(User.objects.filter(
+        username__startswith='bench_').values_list('id', flat=True))
+    group_ids = list(Group.objects.filter(
+        slug__startswith='bench-').values_list('id', flat=True))
+    texts = text_pool(seed=seed)
+    start = timezone.now() - timedelta(seconds=count)
+
+    for offset in range(0, count, batch_size):
+        bulk_insert(Post, (
+            Post(
+                text=rng.choice(texts),
+                author_id=rng.choice(author_ids),
+                group_id=rng.choice(group_ids + [None]),
+                pub_date=start + timedelta(seconds=number),
+            )
+            for number in range(offset, min(offset + batch_size, count))
+        ))
+
+
+def seed_follows(per_user, seed=0):
+    """Подписки с распределением Ципфа: у немногих авторов почти все.
+
+    Посты уже созданы в обход сигналов, поэтому ленты заполняются
+    через feeds.fan_out_bulk.
+    """
+    rng = random.Random(seed)
+    user_ids = list(User.objects.values_list('pk', flat=True))
+    weights = list(accumulate(
+        1 / rank for rank in range(1, len(user_ids) + 1)))
+    follows = set()
+    for user_id in user_ids:
+        count = min(per_user, len(user_ids) - 1)
+        authors = set()
+        while len(authors) < count:
+            authors.update(rng.choices(user_ids, cum_weights=weights, k=count))
+            authors.discard(user_id)
+        follows.update((user_id, author_id)
+                       for author_id in list(authors)[:count])
+    Follow.objects.bulk_create(
+        Follow(user_id=user_id, author_id=author_id)
+        for user_id, author_id in follows)
+    feeds.fan_out_bulk()
+
+
+def seed_comments(count, batch_size=5000, seed=0):
+    """Комментарии к случайным постам от случайных пользователей."""
+    rng = random.Random(seed)
+    post_ids = list(Post.objects.values_list('pk', flat=True))
+    user_ids = list(User.objects.values_list('pk', flat=True))
+    texts = text_pool(size=100, seed=seed)
+    for offset in range(0, count, batch_size):
+        Comment.objects.bulk_create(
+            Comment(
+                post_id=rng.choice(post_ids),
+                author_id=rng.choice(user_ids),
+                text=rng.choice(texts),
+            )
+            for _ in range(offset, min(offset + batch_size, count))
+        )
+
+
+def seed_site(posts, users, groups, follows, comments, seed=0):
+    """Заполняет базу как у живого сайта и выравнивает счётчики."""
+    seed_posts(posts, authors=users, groups=groups, seed=seed)
+    seed_follows(follows, seed=seed)
+    seed_comments(comments, seed=seed)
+    reconcile()
+
+
+def percentile(timings, fraction):
+    ordered = sorted(timings)
+    return ordered[max(math.ceil(fraction * len(ordered)) - 1, 0)]
+
+
+def summarize(timings):
+    """Перцентили и среднее списка времён в миллисекундах."""
+    return {
+        'p50': percentile(timings, 0.50),
+        'p95': percentile(timings, 0.95),
+        'p99': percentile(timings, 0.99),
+        'mean': sum(timings) / len(timings),
+    }
+
+
+def measure(func, repeat=20):
+    """Выполняет func repeat раз и возвращает перцентили в миллисекундах."""
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        timings.append((time.perf_counter() - started) * 1000)
+    return summarize(timings)
+
+
+class SMTPHandler(socketserver.StreamRequestHandler):
+
+    def reply(self, line):
+        time.sleep(self.server.latency)
+        self.wfile.write(line.encode() + b'\r\n')
+
+    def handle(self):
+        self.server.count('connections')
+        self.reply('220 localhost SMTP')
+        for line in self.rfile:
+            command = line[:4].upper()
+            if command == b'DATA':
+                self.reply('354 End data with <CR><LF>.<CR><LF>')
+                for data in self.rfile:
+                    if data == b'.\r\n':
+                        break
+                self.server.count('messages')
+                self.reply('250 OK')
+            elif command == b'QUIT':
+                self.reply('221 Bye')
+                return
+            else:
+                self.reply('250 OK')
+
+
+class SMTPStandIn(socketserver.ThreadingTCPServer):
+    """Локальный SMTP-сервер, который принимает и выбрасывает письма.
+
+    latency — задержка перед каждым ответом, как у удалённого сервера.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, latency=0.0):
+        super().__init__(('127.0.0.1', 0), SMTPHandler)
+        self.latency = latency
+        self.lock = threading.Lock()
+        self.counters = {'connections': 0, 'messages': 0}
+
+    def count(self, name):
+        with self.lock:
+            self.counters[name] += 1
+
+    def __enter__(self):
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *args):
+        self.shutdown()
+        self.server_close()
+
+
+class QuietWSGIRequestHandler(WSGIRequestHandler):
+    # Как у sync-воркеров gunicorn: молчащий клиент отключается.
+    timeout = 30
+
+    def log_message(self, *args):
+        pass
+
+
+class PooledWSGIServer(WSGIServer):
+    """WSGI-сервер с пулом из threads потоков, как у sync-воркеров.
+
+    Поток занят соединением с момента accept, включая чтение запроса,
+    поэтому медленные клиенты отнимают потоки у остальных.
+    """
+
+    # Очередь accept как у настоящих серверов, а не 5 по умолчанию.
+    request_queue_size = 1024
+
+    def __init__(self, app, threads):
+        super().__init__(('127.0.0.1', 0), QuietWSGIRequestHandler)
+        self.set_app(app)
+        self.pool = ThreadPoolExecutor(
+            max_workers=threads, thread_name_prefix='wsgi')
+
+    def process_request(self, request, client_address):
+        self.pool.submit(self.process_in_pool, request, client_address)
+
+    def process_in_pool(self, request, client_address):
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+
+    def handle_error(self, request, client_address):
+        pass
+
+    def __enter__(self):
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *args):
+        self.shutdown()
+        self.server_close()
+        self.pool.shutdown(wait=False)
+
+
+class ASGIStandIn:
+    """Простейший HTTP-сервер на asyncio для ASGI-приложения.
+
+    Один запрос на соединение, ответ пишется до закрытия соединения.
+    Для замеров этого хватает, а сервера ASGI в зависимостях нет.
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self.loop = asyncio.new_event_loop()
+
+    def __enter__(self):
+        self.server = self.loop.run_until_complete(
+            asyncio.start_server(
+                self.handle, '127.0.0.1', 0, backlog=1024))
+        self.server_address = self.server.sockets[0].getsockname()[:2]
+        self.thread = threading.Thread(
+            target=self.loop.run_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def __exit__(self, *args):
+        async def stop():
+            self.server.close()
+            await self.server.wait_closed()
+
+        asyncio.run_coroutine_threadsafe(stop(), self.loop).result()
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join()
+
+    async def handle(self, reader, writer):
+        try:
+            head = await reader.readuntil(b'\r\n\r\n')
+        except (asyncio.IncompleteReadError, asyncio.LimitOverrunError):
+            writer.close()
+            return
+        request_line, *lines = head.decode('latin-1').split('\r\n')
+        method, target, version = request_line.split(' ', 2)
+        headers = [
+            (name.strip().lower().encode('latin-1'),
+             value.strip().encode('latin-1'))
+            for name, value in (
+                line.split(':', 1) for line in lines if ':' in line)
+        ]
+        length = int(dict(headers).get(b'content-length', 0))
+        body = await reader.readexactly(length) if length else b''
+        path, _, query = target.partition('?')
+        scope = {
+            'type': 'http',
+            'asgi': {'version': '3.0'},
+            'http_version': version.split('/', 1)[1],
+            'method': method,
+            'scheme': 'http',
+            'path': unquote(path),
+            'raw_path': path.encode('latin-1'),
+            'query_string': query.encode('latin-1'),
+            'root_path': '',
+            'headers': headers,
+            'server': self.server_address,
+            'client': writer.get_extra_info('peername')[:2],
+        }
+        received = False
+
+        async def receive():
+            nonlocal received
+            if not received:
+                received = True
+                return {'type': 'http.request', 'body': body}
+            # Больше клиент ничего не пришлёт, ждём закрытия.
+            await reader.read()
+            return {'type': 'http.disconnect'}
+
+        async def send(message):
+            if message['type'] == 'http.response.start':
+                status = message['status']
+                writer.write(
+                    f'HTTP/1.1 {status} {HTTPStatus(status).phrase}\r\n'
+                    .encode())
+                for name, value in message['headers']:
+                    writer.write(name + b': ' + value + b'\r\n')
+                writer.write(b'Connection: close\r\n\r\n')
+            else:
+                writer.write(message.get('body', b''))
+            await writer.drain()
+
+        try:
+            await self.app(scope, receive, send)
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
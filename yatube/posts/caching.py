@@ -0,0 +1,156 @@
+"""Версионированный кэш фрагментов лент.
+
+Каждая область (вся лента, сообщество, автор, пост) хранит в кэше
+номер версии. Ключ фрагмента собирается из версий областей, от которых
+зависит страница, поэтому изменение данных сразу делает старые
+фрагменты недостижимыми, и ждать истечения TTL не нужно.
+
+Значения пересчитываются через get_or_compute: при промахе пересчитывает
+один процесс, а остальные ждут его результата, а незадолго до
+истечения TTL значение с некоторой вероятностью обновляется заранее.
+"""
+import hashlib
+import math
+import random
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+from core.metrics import record_cache
+
+VERSION_KEY = 'feed:version:{}'
+LOCK_KEY = '{}:lock'
+
+ALL_POSTS = 'posts'
+ALL_GROUPS = 'groups'
+
+
+def group_scope(group_id):
+    return f'group:{group_id}'
+
+
+def author_scope(author_id):
+    return f'author:{author_id}'
+
+
+def post_scope(post_id):
+    return f'post:{post_id}'
+
+
+def now_ms():
+    return int(time.time() * 1000)
+
+
+def get_version(scope):
+    key = VERSION_KEY.format(scope)
+    version = cache.get(key)
+    if version is None:
+        # Версия-отметка времени не повторяет старые значения,
+        # даже если ключ версии был вытеснен из кэша.
+        cache.add(key, now_ms(), None)
+        version = cache.get(key)
+    return version
+
+
+def bump(*scopes):
+    """Делает недействительными фрагменты перечисленных областей."""
+    for scope in scopes:
+        key = VERSION_KEY.format(scope)
+        cache.set(key, max(now_ms(), (cache.get(key) or 0) + 1), None)
+
+
+def bump_post(post, *old_group_ids):
+    """Сбрасывает все ленты, в которых показывается пост."""
+    scopes = {ALL_POSTS, author_scope(post.author_id), post_scope(post.pk)}
+    for group_id in (post.group_id,) + old_group_ids:
+        if group_id:
+            scopes.add(group_scope(group_id))
+    bump(*scopes)
+
+
+def feed_cache_context(request, *scopes):
+    """Ключ и время жизни фрагмента ленты для тега {% cache %}."""
+    # Версии разных областей могут совпасть, поэтому в ключ
+    # входят и имена областей.
+    versions = '.'.join(
+        f'{scope}@{get_version(scope)}' for scope in (ALL_GROUPS,) + scopes)
+    return {
+        'feed_cache_key': f'{versions}:{page_position(request)}',
+        'feed_cache_timeout': settings.FEED_CACHE_TIMEOUT,
+    }
+
+
+def page_position(request):
+    """Позиция страницы ленты для ключа кэша.
+
+    Номер страницы приводится к тому, что из него поймёт пагинатор,
+    а курсор входит в ключ хешем, поэтому строки из запроса не делают
+    ключ длинным и не плодят копий одной и той же страницы.
+    """
+    page = request.GET.get('page') or '1'
+    try:
+        number = int(page)
+    except ValueError:
+        position = 'last' if page == 'last' else '1'
+    else:
+        # Номер вне диапазона пагинатор заменяет последней страницей.
+        if 1 <= number <= settings.POSTS_PAGINATOR_MAX_PAGES:
+            position = str(number)
+        else:
+            position = 'last'
+    cursor = request.GET.get('cursor')
+    if cursor:
+        # Битый курсор пагинатор пропускает и берёт страницу по номеру.
+        position += ':' + hashlib.md5(cursor.encode()).hexdigest()
+    return position
+
+
+def get_or_compute(key, compute, timeout):
+    """Значение из кэша; пересчитывает его один процесс, а не все сразу.
+
+    Вместе со значением хранится время его расчёта и момент истечения
+    (алгоритм XFetch): чем дороже расчёт и ближе истечение, тем вероятнее,
+    что очередной запрос пересчитает значение, пока старое ещё в кэше.
+    """
+    lock_key = LOCK_KEY.format(key)
+    entry = cache.get(key)
+    if entry is not None:
+        value, delta, expires = entry
+        early = delta * settings.CACHE_EARLY_RECOMPUTE_BETA * math.log(
+            1 - random.random())
+        if time.time() - early < expires:
+            record_cache(hit=True)
+            return value
+        if not cache.add(lock_key, 1, settings.CACHE_LOCK_TIMEOUT):
+            # Значение уже пересчитывает другой процесс.
+            record_cache(hit=True)
+            return value
+    elif not cache.add(lock_key, 1, settings.CACHE_LOCK_TIMEOUT):
+        entry = wait_for(key)
+        if entry is not None:
+            record_cache(hit=True)
+            return entry[0]
+    record_cache(hit=False)
+    try:
+        started = time.monotonic()
+        value = compute()
+        delta = time.monotonic() - started
+        cache.set(key, (value, delta, time.time() + timeout), timeout)
+    finally:
+        cache.delete(lock_key)
+    return value
+
+
+def wait_for(key):
+    """Ждёт, пока значение посчитает процесс, взявший блокировку."""
+    deadline = time.monotonic() + settings.CACHE_LOCK_TIMEOUT
+    while time.monotonic() < deadline:
+        time.sleep(settings.CACHE_LOCK_POLL_INTERVAL)
+        entry = cache.get(key)
+        if entry is not None:
+            return entry
+        if cache.get(LOCK_KEY.format(key)) is None:
+            # Блокировка снята, а значения нет: расчёт упал.
+            return None
+    return None
@@ -0,0 +1,95 @@
+"""Условные GET-запросы и кэш целых страниц для анонимов.
+
+Версии областей кэша — это метки времени последних изменений
+(см. caching.bump), поэтому из них сразу получаются ETag и
+Last-Modified. Если страница не менялась, ответ 304 отдаётся без
+запросов за постами и без рендера шаблонов.
+
+Last-Modified точен до секунды, а версии — до миллисекунды, поэтому
+он выдаётся, только когда секунда последнего изменения уже прошла:
+иначе изменение в ту же секунду осталось бы незамеченным для
+If-Modified-Since. ETag выдаётся всегда.
+"""
+import hashlib
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.cache import (get_conditional_response, patch_cache_control,
+                                patch_vary_headers)
+from django.utils.http import http_date, quote_etag
+
+from core.metrics import record_cache
+
+from .caching import ALL_GROUPS, get_version
+
+PAGE_KEY = 'full_page:{}'
+
+
+def page_validators(request, scopes):
+    """ETag и время последнего изменения страницы."""
+    versions = [get_version(scope) for scope in (ALL_GROUPS,) + scopes]
+    # Страница зависит от того, кто её смотрит: шапка, кнопки
+    # подписки и редактирования, форма комментария.
+    viewer = request.user.pk or 0
+    raw = f'{viewer}|' + '|'.join(
+        f'{scope}@{version}'
+        for scope, version in zip((ALL_GROUPS,) + scopes, versions))
+    etag = quote_etag(hashlib.md5(raw.encode()).hexdigest())
+    return etag, max(versions) // 1000
+
+
+def add_validators(response, etag, last_modified, anonymous):
+    response['ETag'] = etag
+    if last_modified < int(time.time()):
+        response['Last-Modified'] = http_date(last_modified)
+    visibility = 'public' if anonymous else 'private'
+    patch_cache_control(response, no_cache=True, **{visibility: True})
+    patch_vary_headers(response, ('Cookie',))
+
+
+def conditional_page(get_scopes, load=None):
+    """Отвечает 304 на неизменённые страницы и кэширует их для анонимов.
+
+    load(**kwargs) получает аргументы из URL и возвращает объект
+    страницы (или бросает Http404), а view вызывается уже с этим
+    объектом, чтобы не искать его второй раз. get_scopes(obj)
+    возвращает области кэша, от которых зависит страница.
+    """
+
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if load is not None:
+                args, kwargs = (load(**kwargs),), {}
+            if request.method not in ('GET', 'HEAD'):
+                return view(request, *args, **kwargs)
+            etag, last_modified = page_validators(
+                request, tuple(get_scopes(*args)))
+            response = get_conditional_response(
+                request, etag=etag, last_modified=last_modified)
+            if response is not None:
+                return response
+
+            anonymous = not request.user.is_authenticated
+            page_key = PAGE_KEY.format(hashlib.md5(
+                f'{etag}|{request.get_full_path()}'.encode()).hexdigest())
+            response = cache.get(page_key) if anonymous else None
+            if anonymous:
+                record_cache(hit=response is not None)
+            if response is None:
+                response = view(request, *args, **kwargs)
+                # Ответ с cookie (например, CSRF) нельзя отдавать
+                # другим посетителям.
+                if (anonymous and response.status_code == 200
+                        and not response.cookies):
+                    cache.set(
+                        page_key, response, settings.FEED_CACHE_TIMEOUT)
+            if response.status_code == 200:
+                add_validators(response, etag, last_modified, anonymous)
+            return response
+
+        return wrapper
+
+    return decorator
@@ -0,0 +1,57 @@
+"""Денормализованные счётчики постов, комментариев и подписок.
+
+Счётчики меняются F()-выражениями из сигналов, поэтому страницам
+не нужно считать COUNT(*). Записи, созданные в обход сигналов
+(bulk_create, правка базы вручную), выравнивает команда
+reconcile_counters.
+"""
+from django.db.models import Count, F, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from .models import Comment, Follow, Post, Profile, User
+
+
+def add(model, pk, field, delta):
+    """Атомарно меняет счётчик, не опуская его ниже нуля."""
+    queryset = model.objects.filter(pk=pk)
+    if delta < 0:
+        queryset = queryset.filter(**{f'{field}__gte': -delta})
+    queryset.update(**{field: F(field) + delta})
+
+
+def count_of(queryset, key):
+    """Коррелированный подзапрос с числом строк queryset на ключ key."""
+    return Coalesce(
+        Subquery(
+            queryset.order_by().values(key)
+            .annotate(total=Count('pk')).values('total'),
+            output_field=IntegerField(),
+        ),
+        0,
+    )
+
+
+def reconcile():
+    """Создаёт недостающие профили и пересчитывает все счётчики."""
+    # Размер пачки выбирает бэкенд: SQLite не принимает больше
+    # 500 строк в одном INSERT.
+    Profile.objects.bulk_create(
+        [
+            Profile(user_id=user_id)
+            for user_id in User.objects.filter(
+                profile__isnull=True).values_list('pk', flat=True)
+        ],
+    )
+    profiles = Profile.objects.update(
+        posts_count=count_of(
+            Post.objects.filter(author=OuterRef('user')), 'author'),
+        followers_count=count_of(
+            Follow.objects.filter(author=OuterRef('user')), 'author'),
+        following_count=count_of(
+            Follow.objects.filter(user=OuterRef('user')), 'user'),
+    )
+    posts = Post.objects.update(
+        comments_count=count_of(
+            Comment.objects.filter(post=OuterRef('pk')), 'post'),
+    )
+    return profiles, posts
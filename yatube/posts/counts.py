@@ -0,0 +1,192 @@
+"""Оценка числа записей ленты для пагинатора.
+
+Пагинатору не нужно точное число записей большой ленты: страниц
+всё равно не больше POSTS_PAGINATOR_MAX_PAGES, и для такой ленты
+достаточно знать, что записей больше этого предела. Это знание дают
+поставщики из POSTS_COUNT_PROVIDERS без COUNT(*): денормализованные
+счётчики, статистика планировщика базы или запомненный в кеше ответ.
+
+Оценке верят, только если она не меньше POSTS_COUNT_EXACT_THRESHOLD
+(по умолчанию — предел пагинатора). Меньшую оценку перепроверяет
+точный подсчёт: небольшая лента считается быстро, а устаревшая
+статистика или сбитый счётчик не отнимают у неё страниц.
+"""
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections
+from django.db.models.lookups import Exact
+from django.utils.module_loading import import_string
+
+from .models import Comment, Follow, Post, Profile
+
+COUNT_KEY = 'count:{}'
+STATS_KEY = 'count:stats:{}:{}'
+# Статистики нет: запоминается, чтобы не спрашивать базу снова.
+NO_STATS = -1
+
+
+def is_plain(queryset):
+    """Запрос без DISTINCT и срезов, число строк которого можно оценить."""
+    query = queryset.query
+    return not (
+        query.distinct or query.low_mark or query.high_mark is not None)
+
+
+def equality_filter(queryset):
+    """(attname, значение) единственного условия «поле = значение»."""
+    where = queryset.query.where
+    if not is_plain(queryset) or where.negated or len(where.children) != 1:
+        return None
+    lookup = where.children[0]
+    if not isinstance(lookup, Exact):
+        return None
+    target = getattr(lookup.lhs, 'target', None)
+    if target is None:
+        return None
+    if target.model is not queryset.model:
+        return None
+    return target.attname, lookup.rhs
+
+
+class BaseCountProvider:
+    """Интерфейс поставщика оценок."""
+
+    def estimate(self, queryset):
+        """Оценка числа записей queryset или None, если её нет."""
+        return None
+
+    def remember(self, queryset, count):
+        """Сообщает, что в queryset не меньше count записей."""
+
+
+class CounterCount(BaseCountProvider):
+    """Денормализованные счётчики из posts.counters.
+
+    Подходят для лент с единственным условием на автора, пост или
+    подписчика: посты автора, комментарии поста, подписки.
+    """
+
+    counters = {
+        (Post, 'author_id'): (Profile, 'user_id', 'posts_count'),
+        (Comment, 'post_id'): (Post, 'pk', 'comments_count'),
+        (Follow, 'author_id'): (Profile, 'user_id', 'followers_count'),
+        (Follow, 'user_id'): (Profile, 'user_id', 'following_count'),
+    }
+
+    def estimate(self, queryset):
+        condition = equality_filter(queryset)
+        if condition is None:
+            return None
+        attname, value = condition
+        counter = self.counters.get((queryset.model, attname))
+        if counter is None:
+            return None
+        model, key, field = counter
+        return (
+            model.objects.filter(**{key: value})
+            .values_list(field, flat=True).first()
+        )
+
+
+class TableStatsCount(BaseCountProvider):
+    """Число строк таблицы из статистики планировщика.
+
+    SQLite хранит его в sqlite_stat1, PostgreSQL — в pg_class.reltuples;
+    обе обновляются командой ANALYZE (и автоочисткой в PostgreSQL).
+    Подходит только для запросов без условий. Статистика читается,
+    лишь когда таблица оказалась больше предела пагинатора, и хранится
+    в кеше POSTS_COUNT_STATS_TIMEOUT секунд, так что у небольших таблиц
+    лишних запросов нет.
+    """
+
+    def key(self, queryset):
+        return STATS_KEY.format(queryset.db, queryset.model._meta.db_table)
+
+    def estimate(self, queryset):
+        if queryset.query.where.children or not is_plain(queryset):
+            return None
+        rows = cache.get(self.key(queryset))
+        return None if rows is None or rows == NO_STATS else rows
+
+    def remember(self, queryset, count):
+        if queryset.query.where.children or not is_plain(queryset):
+            return
+        rows = self.table_rows(
+            connections[queryset.db], queryset.model._meta.db_table)
+        cache.set(
+            self.key(queryset), NO_STATS if rows is None else rows,
+            settings.POSTS_COUNT_STATS_TIMEOUT)
+
+    def table_rows(self, connection, table):
+        with connection.cursor() as cursor:
+            if connection.vendor == 'sqlite':
+                cursor.execute(
+                    "SELECT 1 FROM sqlite_master "
+                    "WHERE type = 'table' AND name = 'sqlite_stat1'")
+                if cursor.fetchone() is None:
+                    return None
+                cursor.execute(
+                    'SELECT stat FROM sqlite_stat1 WHERE tbl = %s', [table])
+                # Первое число статистики — строк в таблице или индексе.
+                rows = [int(stat.split()[0]) for stat, in cursor.fetchall()]
+                return max(rows) if rows else None
+            if connection.vendor == 'postgresql':
+                cursor.execute(
+                    'SELECT reltuples FROM pg_class '
+                    'WHERE oid = %s::regclass', [table])
+                row = cursor.fetchone()
+                # До первого ANALYZE reltuples равно -1 (или 0).
+                if row is None or row[0] <= 0:
+                    return None
+                return int(row[0])
+        return None
+
+
+class CachedCount(BaseCountProvider):
+    """Помнит POSTS_COUNT_CACHE_TIMEOUT секунд, что лента большая.
+
+    Запоминаются только ленты длиннее предела пагинатора, так что
+    небольшие ленты по-прежнему считаются точно при каждом запросе.
+    """
+
+    def key(self, queryset):
+        query = str(queryset.query).encode()
+        return COUNT_KEY.format(hashlib.md5(query).hexdigest())
+
+    def estimate(self, queryset):
+        return cache.get(self.key(queryset))
+
+    def remember(self, queryset, count):
+        cache.set(
+            self.key(queryset), count, settings.POSTS_COUNT_CACHE_TIMEOUT)
+
+
+def get_providers():
+    return [import_string(path)() for path in settings.POSTS_COUNT_PROVIDERS]
+
+
+def count(queryset, limit, estimate=None):
+    """Число записей queryset, не больше limit, и признак точности.
+
+    Если записей больше limit, возвращается (limit, False). Оценку,
+    которая уже есть у вызывающего (счётчик в загруженном профиле),
+    можно передать в estimate вместо опроса поставщиков.
+    """
+    threshold = settings.POSTS_COUNT_EXACT_THRESHOLD or limit + 1
+    providers = get_providers()
+    if estimate is None:
+        estimates = (provider.estimate(queryset) for provider in providers)
+    else:
+        estimates = (estimate,)
+    for value in estimates:
+        if value is not None and value >= threshold:
+            return min(value, limit), False
+    bounded = queryset.order_by().values('pk')[:limit + 1]
+    total = bounded.count()
+    if total <= limit:
+        return total, True
+    for provider in providers:
+        provider.remember(queryset, total)
+    return limit, False
@@ -0,0 +1,98 @@
+"""Письма о новых постах авторов, на которых подписан пользователь.
+
+Событием служит сам пост: при публикации ничего не отправляется
+и не записывается, поэтому post_create не зависит от числа подписчиков.
+Команда send_digests по расписанию берёт посты, вышедшие после прошлой
+рассылки, собирает их по получателям и отправляет каждому одно письмо,
+пачками по EMAIL_DIGEST_BATCH_SIZE через одно соединение с сервером.
+
+После каждой пачки рассылка запоминает последнего получателя, поэтому
+прерванная рассылка продолжается с места остановки.
+"""
+from itertools import groupby
+from operator import itemgetter
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db.models import F, Max
+from django.template.loader import get_template
+from django.utils import timezone
+
+from .models import Digest, Follow, Post
+
+SUBJECT = 'Новые посты авторов, на которых вы подписаны'
+
+
+def start_digest():
+    """Незавершённая рассылка или новая — с постами после прошлой."""
+    digest = Digest.objects.filter(finished__isnull=True).first()
+    if digest is not None:
+        return digest
+    last_post_id = Post.objects.aggregate(last=Max('pk'))['last'] or 0
+    previous = Digest.objects.first()
+    # Первая рассылка только отмечает, с какого поста начинать,
+    # а не присылает всем всю историю.
+    since = last_post_id if previous is None else previous.until_post_id
+    return Digest.objects.create(
+        since_post_id=since, until_post_id=last_post_id)
+
+
+def digest_rows(digest):
+    """Пары (получатель, пост), упорядоченные по получателю."""
+    return Follow.objects.filter(
+        author__posts__pk__gt=digest.since_post_id,
+        author__posts__pk__lte=digest.until_post_id,
+        user_id__gt=digest.last_user_id,
+    ).exclude(user__email='').order_by(
+        'user_id', '-author__posts__pub_date', '-author__posts__pk',
+    ).values_list(
+        'user_id', 'user__email', 'user__username', 'author__username',
+        'author__posts__pk', 'author__posts__text',
+    ).iterator()
+
+
+def build_messages(digest):
+    """Письма получателям рассылки: (id получателя, письмо)."""
+    limit = settings.EMAIL_DIGEST_MAX_POSTS
+    template = get_template('posts/email/digest.txt')
+    for user_id, rows in groupby(digest_rows(digest), key=itemgetter(0)):
+        rows = list(rows)
+        _, email, username = rows[0][:3]
+        body = template.render({
+            'username': username,
+            'posts': [
+                {'author': author, 'id': post_id, 'text': text}
+                for *_, author, post_id, text in rows[:limit]
+            ],
+            'more': max(len(rows) - limit, 0),
+            'site_url': settings.SITE_URL,
+        })
+        yield user_id, EmailMessage(SUBJECT, body, to=[email])
+
+
+def send_batch(connection, digest, batch, last_user_id):
+    connection.send_messages(batch)
+    Digest.objects.filter(pk=digest.pk).update(
+        last_user_id=last_user_id, sent=F('sent') + len(batch))
+    digest.last_user_id = last_user_id
+    digest.sent += len(batch)
+
+
+def send_digests(connection=None):
+    """Отправляет очередную рассылку и возвращает её."""
+    digest = start_digest()
+    batch_size = settings.EMAIL_DIGEST_BATCH_SIZE
+    batch = []
+    if connection is None:
+        connection = get_connection()
+    with connection:
+        for user_id, message in build_messages(digest):
+            batch.append(message)
+            if len(batch) >= batch_size:
+                send_batch(connection, digest, batch, user_id)
+                batch = []
+        if batch:
+            send_batch(connection, digest, batch, user_id)
+    digest.finished = timezone.now()
+    digest.save(update_fields=('finished',))
+    return digest
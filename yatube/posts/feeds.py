@@ -0,0 +1,257 @@
+"""Лента подписок с раскладкой постов по лентам читателей при записи.
+
+Новый пост сразу записывается в FeedEntry каждого подписчика автора,
+поэтому лента читается одним диапазонным запросом по индексу.
+У авторов с большим числом подписчиков раскладка слишком дорогая:
+их посты подмешиваются в ленту при чтении.
+"""
+import heapq
+from itertools import islice
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+from django.db.models import Count
+from django.utils.functional import cached_property
+
+from core import tasks
+from core.sqlite import run_write
+
+from .models import FeedEntry, Follow, Post
+from .utils import NEXT, KeysetPaginator, keyset_filter
+
+CELEBRITIES_CACHE_KEY = 'feeds:celebrities'
+BATCH_SIZE = 1000
+
+
+class FeedPaginator(KeysetPaginator):
+    """Листает записи FeedEntry, а на страницу отдаёт сами посты."""
+
+    keys = ('pub_date', 'post_id')
+
+    def with_cursors(self, page, has_next, has_previous):
+        page.object_list = [entry.post for entry in page.object_list]
+        return super().with_cursors(page, has_next, has_previous)
+
+
+def followers_count(author_id):
+    """Число подписчиков, посчитанное не дальше порога раскладки."""
+    limit = settings.FEED_FANOUT_LIMIT
+    return Follow.objects.filter(
+        author_id=author_id).values('pk')[:limit].count()
+
+
+def celebrity_ids():
+    """Авторы, чьи посты не раскладываются по лентам подписчиков."""
+    ids = cache.get(CELEBRITIES_CACHE_KEY)
+    if ids is None:
+        ids = set(
+            Follow.objects.values('author')
+            .annotate(followers=Count('id'))
+            .filter(followers__gte=settings.FEED_FANOUT_LIMIT)
+            .values_list('author', flat=True)
+        )
+        cache.set(CELEBRITIES_CACHE_KEY, ids,
+                  settings.FEED_CELEBRITIES_CACHE_TIMEOUT)
+    return ids
+
+
+def create_entries(entries):
+    while True:
+        batch = list(islice(entries, BATCH_SIZE))
+        if not batch:
+            return
+        FeedEntry.objects.bulk_create(batch, ignore_conflicts=True)
+
+
+def fan_out_post(post_id):
+    """Кладёт новый пост в ленты подписчиков автора."""
+    post = Post.objects.filter(pk=post_id).values(
+        'author_id', 'pub_date').first()
+    if post is None or followers_count(
+            post['author_id']) >= settings.FEED_FANOUT_LIMIT:
+        return
+    followers = Follow.objects.filter(
+        author_id=post['author_id']).values_list('user_id', flat=True)
+    run_write(create_entries, (
+        FeedEntry(user_id=user_id, post_id=post_id,
+                  pub_date=post['pub_date'])
+        for user_id in followers.iterator()
+    ))
+
+
+def fan_out_bulk(after_id=0, last_id=None):
+    """Раскладывает по лентам посты, созданные в обход сигналов.
+
+    Обрабатываются посты с id больше after_id и, если задан last_id,
+    не больше него; записи создаются одним INSERT ... SELECT, посты
+    «знаменитостей» пропускаются. Записи, которые уже создала раскладка
+    постов, опубликованных тем временем на сайте, не повторяются.
+    """
+    follows = Follow._meta.db_table
+    ops = connection.ops
+    sql = (
+        f'{ops.insert_statement(ignore_conflicts=True)} '
+        f'{FeedEntry._meta.db_table} (user_id, post_id, pub_date) '
+        f'SELECT f.user_id, p.id, p.pub_date FROM {follows} f '
+        f'JOIN {Post._meta.db_table} p ON p.author_id = f.author_id '
+        f'WHERE p.id > %s'
+    )
+    params = [after_id]
+    if last_id is not None:
+        sql += ' AND p.id <= %s'
+        params.append(last_id)
+    sql += (
+        f' AND f.author_id IN ('
+        f'SELECT author_id FROM {follows} '
+        f'GROUP BY author_id HAVING COUNT(*) < %s) '
+        f'{ops.ignore_conflicts_suffix_sql(ignore_conflicts=True)}'
+    )
+    params.append(settings.FEED_FANOUT_LIMIT)
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+
+
+def backfill(user_id, author_id):
+    """Добавляет в ленту читателя все посты автора."""
+    posts = Post.objects.filter(
+        author_id=author_id).values_list('pk', 'pub_date')
+    create_entries(
+        FeedEntry(user_id=user_id, post_id=post_id, pub_date=pub_date)
+        for post_id, pub_date in posts.iterator()
+    )
+
+
+def follow_added(follow):
+    followers = followers_count(follow.author_id)
+    if followers == settings.FEED_FANOUT_LIMIT:
+        cache.delete(CELEBRITIES_CACHE_KEY)
+    if followers < settings.FEED_FANOUT_LIMIT:
+        backfill(follow.user_id, follow.author_id)
+
+
+def backfill_followers(author_id):
+    """Раскладывает посты автора по лентам всех его подписчиков."""
+    if followers_count(author_id) >= settings.FEED_FANOUT_LIMIT:
+        # Пока задача ждала, автор снова стал «знаменитостью».
+        return
+    followers = Follow.objects.filter(
+        author_id=author_id).values_list('user_id', flat=True)
+    for user_id in followers:
+        run_write(backfill, user_id, author_id)
+
+
+def follow_removed(follow):
+    FeedEntry.objects.filter(
+        user_id=follow.user_id, post__author_id=follow.author_id).delete()
+    if followers_count(follow.author_id) != settings.FEED_FANOUT_LIMIT - 1:
+        return
+    # Автор перестал быть «знаменитостью»: его посты больше не
+    # подмешиваются при чтении, поэтому раскладываем их по лентам.
+    cache.delete(CELEBRITIES_CACHE_KEY)
+    tasks.enqueue(
+        backfill_followers, follow.author_id,
+        key=f'backfill:{follow.author_id}')
+
+
+class MergedFeed:
+    """Лента из нескольких частей, упорядоченных по (pub_date, id).
+
+    Части — записи FeedEntry читателя и посты каждой «знаменитости»
+    из его подписок. Каждая читается диапазонным запросом по своему
+    индексу с LIMIT, а строки сливаются в Python, поэтому ни один
+    запрос не обходит весь индекс дат постов. Пост, попавший в ленту
+    до того, как автор стал «знаменитостью», выводится один раз.
+    """
+
+    def __init__(self, parts):
+        # Части — пары (queryset, related): related — имя поля поста
+        # у записей FeedEntry или пустая строка у самих постов.
+        self.parts = parts
+
+    @staticmethod
+    def keys(related):
+        return ('pub_date', f'{related}_id') if related else ('pub_date', 'id')
+
+    def merge(self, lists, limit, direction, key):
+        merged = heapq.merge(*lists, key=key, reverse=direction == NEXT)
+        rows, seen = [], set()
+        for row in merged:
+            pk = key(row)[1]
+            if pk in seen:
+                continue
+            seen.add(pk)
+            rows.append(row)
+            if len(rows) == limit:
+                break
+        return rows
+
+    def posts(self, limit, direction=NEXT, after=None):
+        """До limit постов после ключа after в порядке обхода."""
+        lists = []
+        for queryset, related in self.parts:
+            rows = keyset_filter(
+                queryset, self.keys(related), direction, after)[:limit]
+            lists.append(
+                [getattr(row, related) for row in rows] if related
+                else list(rows))
+        return self.merge(
+            lists, limit, direction, lambda post: (post.pub_date, post.pk))
+
+    def values(self, columns, limit, after=None):
+        """Строки values_list: столбцы columns постов и ключ ленты."""
+        lists = []
+        for queryset, related in self.parts:
+            prefix = f'{related}__' if related else ''
+            keys = self.keys(related)
+            lists.append(list(
+                keyset_filter(queryset, keys, NEXT, after).values_list(
+                    *(prefix + column for column in columns), *keys
+                )[:limit]))
+        return self.merge(lists, limit, NEXT, lambda row: row[-2:])
+
+    def __getitem__(self, index):
+        # Пагинатор берёт страницы срезом [bottom:top].
+        return self.posts(index.stop)[index]
+
+    def __len__(self):
+        return len(self.values((), None))
+
+
+class MergedFeedPaginator(KeysetPaginator):
+    """Листает MergedFeed по номеру страницы и по курсору."""
+
+    def order(self, object_list):
+        return object_list
+
+    @cached_property
+    def counted(self):
+        limit = self.max_pages * self.per_page
+        total = len(self.object_list.values((), limit + 1))
+        return min(total, limit), total <= limit
+
+    def rows_after(self, direction, after, limit):
+        return self.object_list.posts(limit, direction, after)
+
+
+def follow_feed(user):
+    """Возвращает ленту подписок и класс пагинатора для неё."""
+    entries = FeedEntry.objects.filter(user=user)
+    celebrities = celebrity_ids()
+    if celebrities:
+        celebrities = celebrities & set(Follow.objects.filter(
+            user=user).values_list('author_id', flat=True))
+    if not celebrities:
+        return (
+            entries.select_related('post__author', 'post__group'),
+            FeedPaginator,
+        )
+    posts = Post.objects.select_related('author', 'group')
+    return (
+        MergedFeed([
+            (entries.select_related('post__author', 'post__group'), 'post'),
+            *((posts.filter(author_id=author_id), '')
+              for author_id in sorted(celebrities)),
+        ]),
+        MergedFeedPaginator,
+    )
@@ -1,5 +1,6 @@
 from django import forms
 
+from .images import ImageTooLarge, check_pixels
 from .models import Comment, Post
 
 
@@ -9,8 +10,10 @@ class PostForm(forms.ModelForm):
         model = Post
         fields = ('text', 'group', 'image')
 
-    def __init__(self, *args, **kwargs):
+    def __init__(self, *args, upload_errors=None, **kwargs):
         super().__init__(*args, **kwargs)
+        # Ошибки, найденные ImageUploadHandler ещё во время загрузки.
+        self.upload_errors = upload_errors or {}
         self.fields['text'].widget.attrs['placeholder'] = (
             'Здесь вы можете написать текст своего поста ;)'
         )
@@ -18,6 +21,34 @@ class PostForm(forms.ModelForm):
             'А здесь можно выбрать группу :)'
         )
 
+    def clean_image(self):
+        if 'image' in self.upload_errors:
+            raise forms.ValidationError(self.upload_errors['image'])
+        image = self.cleaned_data.get('image')
+        # ImageField уже прочитал заголовок и сохранил объект Pillow.
+        opened = getattr(image, 'image', None)
+        if opened is not None:
+            try:
+                check_pixels(opened)
+            except ImageTooLarge:
+                raise forms.ValidationError(
+                    'Слишком большое разрешение картинки.')
+        if hasattr(image, 'sha256'):
+            self.instance.image_hash = image.sha256
+        return image
+
+    def save(self, commit=True):
+        if not commit or self.instance._state.adding:
+            return super().save(commit)
+        # Правка записывает только свои поля: счётчик комментариев
+        # и копии картинки параллельно меняют F()-выражения и задача.
+        post = super().save(commit=False)
+        fields = ['text', 'group']
+        if 'image' in self.changed_data:
+            fields += ['image', 'image_hash', 'thumbnails']
+        post.save(update_fields=fields)
+        return post
+
 
 class CommentForm(forms.ModelForm):
 
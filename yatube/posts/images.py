@@ -0,0 +1,183 @@
+"""Картинки постов в нескольких ширинах и форматах.
+
+После сохранения поста с новой картинкой фоновая задача один раз
+декодирует оригинал и сохраняет кадрированные копии всех ширин из
+POST_IMAGE_WIDTHS в AVIF (если Pillow его поддерживает), WebP и JPEG.
+Описание копий записывается в Post.thumbnails, и шаблоны выводят его
+как <picture> со srcset, не вызывая Pillow во время ответа.
+
+EXIF в копиях не сохраняется, картинки больше POST_IMAGE_MAX_PIXELS не
+декодируются, а одинаковые загрузки находятся по SHA-256 содержимого и
+используют общие файлы.
+"""
+import hashlib
+import json
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import transaction
+from PIL import Image, ImageOps
+
+from core import tasks
+from core.sqlite import run_write
+
+from . import caching
+from .models import Post
+
+FORMATS = (
+    ('AVIF', 'avif', 'image/avif'),
+    ('WEBP', 'webp', 'image/webp'),
+    ('JPEG', 'jpg', 'image/jpeg'),
+)
+SAVE_OPTIONS = {
+    'AVIF': {'quality': 60},
+    'WEBP': {'quality': 80, 'method': 4},
+    'JPEG': {'quality': 85, 'optimize': True, 'progressive': True},
+}
+RENDITIONS_DIR = 'posts/renditions/{}/'
+MANIFEST = 'manifest.json'
+
+
+class ImageTooLarge(ValueError):
+    pass
+
+
+def supported_formats():
+    Image.init()
+    return [fmt for fmt in FORMATS if fmt[0] in Image.SAVE]
+
+
+def content_hash(file):
+    digest = hashlib.sha256()
+    file.seek(0)
+    for chunk in file.chunks():
+        digest.update(chunk)
+    file.seek(0)
+    return digest.hexdigest()
+
+
+def check_pixels(image):
+    """Отказывается декодировать картинки больше лимита пикселей."""
+    width, height = image.size
+    if width * height > settings.POST_IMAGE_MAX_PIXELS:
+        raise ImageTooLarge(
+            f'{width}x{height} больше {settings.POST_IMAGE_MAX_PIXELS} '
+            f'пикселей')
+
+
+def target_size(width):
+    ratio_width, ratio_height = settings.POST_IMAGE_RATIO
+    return width, round(width * ratio_height / ratio_width)
+
+
+def render(file):
+    """Кадрирует картинку под все ширины: {ширина: Image}."""
+    file.seek(0)
+    with Image.open(file) as image:
+        check_pixels(image)
+        widths = sorted(settings.POST_IMAGE_WIDTHS, reverse=True)
+        # Копии не бывают шире оригинала, но самая узкая есть всегда.
+        fitting = [width for width in widths if width <= image.width]
+        widths = fitting or widths[-1:]
+        # JPEG можно декодировать сразу в уменьшенном масштабе.
+        image.draft('RGB', target_size(widths[0]))
+        image = ImageOps.exif_transpose(image)
+        if image.mode not in ('RGB', 'L'):
+            image = image.convert('RGBA')
+            background = Image.new('RGB', image.size, 'white')
+            background.paste(image, mask=image.getchannel('A'))
+            image = background
+        largest = ImageOps.fit(
+            image.convert('RGB'), target_size(widths[0]), Image.LANCZOS)
+    renditions = {widths[0]: largest}
+    for width in widths[1:]:
+        renditions[width] = largest.resize(target_size(width), Image.LANCZOS)
+    return renditions
+
+
+def build_renditions(file, directory):
+    """Сохраняет копии в directory и возвращает их описание."""
+    renditions = render(file)
+    sources = []
+    for fmt, extension, mime in supported_formats():
+        srcset = []
+        for width, image in renditions.items():
+            buffer = BytesIO()
+            # Без параметра exif Pillow не переносит метаданные в копию.
+            image.save(buffer, fmt, **SAVE_OPTIONS[fmt])
+            name = default_storage.save(
+                f'{directory}{width}.{extension}',
+                ContentFile(buffer.getvalue()))
+            srcset.append((width, default_storage.url(name)))
+        srcset.sort()
+        sources.append({
+            'type': mime,
+            'srcset': ', '.join(f'{url} {width}w' for width, url in srcset),
+            'src': srcset[-1][1],
+        })
+    width, height = next(iter(renditions.values())).size
+    return {
+        'src': sources[-1]['src'],
+        'width': width,
+        'height': height,
+        'sources': sources[:-1],
+        'srcset': sources[-1]['srcset'],
+    }
+
+
+def load_or_build(file, image_hash):
+    directory = RENDITIONS_DIR.format(image_hash)
+    manifest = directory + MANIFEST
+    if default_storage.exists(manifest):
+        with default_storage.open(manifest) as stored:
+            return json.loads(stored.read().decode())
+    rendition = build_renditions(file, directory)
+    default_storage.save(
+        manifest, ContentFile(json.dumps(rendition).encode()))
+    return rendition
+
+
+def generate_thumbnails(post_id):
+    """Создаёт копии картинки поста и сохраняет их описание."""
+    post = Post.objects.filter(pk=post_id).first()
+    if post is None or not post.image:
+        return None
+    image_name = post.image.name
+    with post.image.open('rb') as file:
+        # Хеш считается заново: картинку могли заменить в обход формы.
+        image_hash = content_hash(file)
+        # Файл берётся только у поста, копии которого уже созданы:
+        # хеш ставит и форма, а файл ещё не обработанного поста может
+        # сам оказаться копией. Из нескольких берётся самый старый.
+        duplicate = Post.objects.filter(image_hash=image_hash).exclude(
+            image=image_name).exclude(thumbnails__in=('', '{}')).order_by(
+            'pk').values_list('image', flat=True).first()
+        rendition = load_or_build(file, image_hash)
+    values = {'thumbnails': json.dumps(rendition), 'image_hash': image_hash}
+    if duplicate and default_storage.exists(duplicate):
+        # Такой файл уже загружали: пост ссылается на него,
+        # а копия удаляется.
+        values['image'] = duplicate
+    # Картинку могли заменить, пока создавались копии:
+    # тогда их создаст задача, поставленная для новой картинки.
+    # В очередь записи уходит только этот UPDATE, а не кодирование.
+    updated = run_write(
+        Post.objects.filter(pk=post_id, image=image_name).update, **values)
+    if updated:
+        # Файл могут использовать и другие посты.
+        if 'image' in values and not Post.objects.filter(
+                image=image_name).exists():
+            default_storage.delete(image_name)
+        caching.bump_post(post)
+    return rendition
+
+
+def schedule_thumbnails(post):
+    """Ставит обработку картинки в очередь после фиксации транзакции."""
+    post_id = post.pk
+    # Даже в режиме sync картинка декодируется уже после коммита,
+    # не удерживая транзакцию запроса.
+    transaction.on_commit(lambda: tasks.enqueue(
+        generate_thumbnails, post_id, key=f'thumbnails:{post_id}'))
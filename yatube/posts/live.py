@@ -0,0 +1,201 @@
+"""Новые посты в лентах в реальном времени через server-sent events.
+
+Пост после фиксации транзакции публикуется в шину один раз: его
+краткое описание кодируется в кадр SSE, и этот же кадр раскладывается
+по очередям подписчиков каналов ленты сайта, сообщества и автора.
+Поток ответа ждёт свою очередь и ничего не опрашивает, а пока
+подписчиков нет, публикация не делает даже запроса к базе.
+
+Django 2.2 не умеет асинхронные представления, поэтому каждый поток
+занимает поток сервера. Обновления включены (LIVE_UPDATES) только под
+yatube/asgi.py, где это поток отдельного пула, а не воркер сервера;
+число потоков ограничено LIVE_MAX_SUBSCRIBERS,
+а длительность — LIVE_MAX_DURATION, после чего браузер сам
+переподключается и по Last-Event-ID получает пропущенные посты.
+Шина живёт в памяти процесса и доставляет посты, созданные в том же
+процессе; посты других воркеров подписчик увидит при переподключении.
+"""
+import json
+import queue
+import threading
+import time
+from collections import defaultdict
+
+from django.conf import settings
+from django.db.models import Q
+from django.shortcuts import get_object_or_404
+from django.urls import reverse
+from django.utils.text import Truncator
+
+from .models import Follow, Group, Post
+
+ALL = 'all'
+SUMMARY_FIELDS = (
+    'id', 'text', 'pub_date', 'author_id', 'author__username',
+    'group_id', 'group__slug',
+)
+
+
+def group_channel(group_id):
+    return f'group:{group_id}'
+
+
+def author_channel(author_id):
+    return f'author:{author_id}'
+
+
+class Subscription:
+    """Очередь кадров одного потока."""
+
+    def __init__(self, bus, channels, size):
+        self.bus = bus
+        self.channels = channels
+        self.queue = queue.Queue(size)
+        self.closed = False
+
+    def put(self, event):
+        try:
+            self.queue.put_nowait(event)
+        except queue.Full:
+            # Медленный клиент не задерживает остальных: его поток
+            # закроется, а браузер переподключится с Last-Event-ID.
+            self.closed = True
+            self.bus.unsubscribe(self)
+
+    def get(self, timeout):
+        """Следующее событие или None, если за timeout его не было."""
+        try:
+            return self.queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+
+class Bus:
+    """Подписки процесса по каналам."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.channels = defaultdict(set)
+        self.subscriptions = set()
+
+    def __len__(self):
+        return len(self.subscriptions)
+
+    def subscribe(self, channels):
+        subscription = Subscription(
+            self, tuple(channels), settings.LIVE_QUEUE_SIZE)
+        with self.lock:
+            self.subscriptions.add(subscription)
+            for channel in subscription.channels:
+                self.channels[channel].add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self.lock:
+            self.subscriptions.discard(subscription)
+            for channel in subscription.channels:
+                subscribers = self.channels.get(channel)
+                if subscribers is None:
+                    continue
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self.channels[channel]
+
+    def publish(self, channels, event):
+        """Отдаёт событие подписчикам каналов, каждому по разу."""
+        with self.lock:
+            targets = set().union(
+                *(self.channels.get(channel, ()) for channel in channels))
+        for subscription in targets:
+            subscription.put(event)
+        return len(targets)
+
+
+bus = Bus()
+
+
+def encode(row):
+    """Событие поста: его id и готовый кадр SSE."""
+    post_id, text, pub_date, _, author, _, group = row
+    data = {
+        'id': post_id,
+        'text': Truncator(text).chars(settings.LIVE_TEXT_LENGTH),
+        'pub_date': pub_date.isoformat(),
+        'author': author,
+        'group': group,
+        'url': reverse('posts:post_detail', args=(post_id,)),
+    }
+    frame = (f'id: {post_id}\nevent: post\n'
+             f'data: {json.dumps(data, ensure_ascii=False)}\n\n')
+    return post_id, frame.encode()
+
+
+def publish_post(post_id):
+    """Рассылает новый пост подписчикам его лент."""
+    if not len(bus):
+        return 0
+    row = Post.objects.filter(
+        pk=post_id).values_list(*SUMMARY_FIELDS).first()
+    if row is None:
+        return 0
+    author_id, group_id = row[3], row[5]
+    channels = [ALL, author_channel(author_id)]
+    if group_id is not None:
+        channels.append(group_channel(group_id))
+    return bus.publish(channels, encode(row))
+
+
+def feed_channels(request):
+    """Каналы ленты из параметров запроса и условие на её посты."""
+    slug = request.GET.get('group')
+    if slug:
+        group = get_object_or_404(Group.objects.only('pk'), slug=slug)
+        return [group_channel(group.pk)], Q(group_id=group.pk)
+    if request.GET.get('follow') and request.user.is_authenticated:
+        # Подписки, оформленные во время потока, появятся
+        # при следующем переподключении.
+        authors = list(Follow.objects.filter(
+            user=request.user).values_list('author_id', flat=True))
+        return ([author_channel(author) for author in authors],
+                Q(author_id__in=authors))
+    return [ALL], Q()
+
+
+def missed_posts(condition, last_id):
+    """Посты ленты, опубликованные после last_id, от старых к новым."""
+    try:
+        last_id = int(last_id)
+    except (TypeError, ValueError):
+        return []
+    rows = Post.objects.filter(condition, pk__gt=last_id).order_by(
+        '-pk').values_list(*SUMMARY_FIELDS)[:settings.LIVE_BACKLOG]
+    return [encode(row) for row in reversed(rows)]
+
+
+def stream(channels, condition, last_id):
+    """Кадры потока: пропущенные посты, затем новые по мере появления."""
+    # Подписка оформляется при запуске генератора: ответ, закрытый
+    # до первого кадра, не оставит её в шине. Пропущенные посты
+    # читаются уже после подписки, чтобы пост между двумя шагами
+    # не потерялся.
+    subscription = bus.subscribe(channels)
+    try:
+        backlog = missed_posts(condition, last_id)
+        yield f'retry: {settings.LIVE_RETRY_MS}\n\n'.encode()
+        sent = set()
+        for post_id, frame in backlog:
+            sent.add(post_id)
+            yield frame
+        deadline = time.monotonic() + settings.LIVE_MAX_DURATION
+        while not subscription.closed and time.monotonic() < deadline:
+            event = subscription.get(settings.LIVE_KEEPALIVE)
+            if event is None:
+                # Комментарий не даёт прокси закрыть тихое соединение.
+                yield b': keepalive\n\n'
+                continue
+            post_id, frame = event
+            # Пост мог попасть и в пропущенные, и в очередь.
+            if post_id not in sent:
+                yield frame
+    finally:
+        bus.unsubscribe(subscription)
@@ -0,0 +1,101 @@
+import random
+import time
+
+from django.core.mail import get_connection, send_mail
+from django.core.management.base import BaseCommand
+from django.test import override_settings
+
+from posts.benchmarks import SMTPStandIn, temporary_database
+from posts.digests import send_digests
+from posts.models import Follow, Post, User
+
+
+class Command(BaseCommand):
+    help = ('Сравнивает отправку письма на каждый пост каждому подписчику '
+            'с рассылкой дайджестов через локальный SMTP-сервер.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--authors', type=int, default=50)
+        parser.add_argument('--recipients', type=int, default=2000)
+        parser.add_argument(
+            '--follows', type=int, default=5,
+            help='Подписок на получателя.')
+        parser.add_argument(
+            '--posts', type=int, default=200,
+            help='Новых постов между рассылками.')
+        parser.add_argument(
+            '--latency', type=float, default=1,
+            help='Задержка ответа SMTP-сервера, мс.')
+        parser.add_argument(
+            '--naive-limit', type=int, default=1000,
+            help='Сколько писем отправить без дайджеста для замера.')
+
+    def handle(self, *args, **options):
+        with temporary_database(), SMTPStandIn(
+                options['latency'] / 1000) as server:
+            host, port = server.server_address
+            smtp = {
+                'EMAIL_BACKEND':
+                    'django.core.mail.backends.smtp.EmailBackend',
+                'EMAIL_HOST': host,
+                'EMAIL_PORT': port,
+            }
+            with override_settings(**smtp):
+                events = self.seed(options)
+                server.counters.update(connections=0, messages=0)
+                self.stdout.write(
+                    f'Событий «новый пост подписки»: {events}.')
+                self.stdout.write(
+                    f'{"способ":>12} {"писем":>8} {"соединений":>11} '
+                    f'{"секунд":>8} {"писем/с":>9} {"событий/с":>10}')
+                self.run_naive(server, options['naive_limit'], events)
+                self.run_digest(server, events)
+
+    def seed(self, options):
+        rng = random.Random(0)
+        User.objects.bulk_create(
+            User(username=f'author_{i}') for i in range(options['authors']))
+        User.objects.bulk_create(
+            User(username=f'reader_{i}', email=f'reader_{i}@example.com')
+            for i in range(options['recipients']))
+        authors = list(User.objects.filter(
+            username__startswith='author_').values_list('pk', flat=True))
+        readers = User.objects.filter(
+            username__startswith='reader_').values_list('pk', flat=True)
+        Follow.objects.bulk_create(
+            Follow(user_id=reader, author_id=author)
+            for reader in readers
+            for author in rng.sample(authors, options['follows']))
+        send_digests()
+        Post.objects.bulk_create(
+            Post(text=f'Пост {i}', author_id=rng.choice(authors))
+            for i in range(options['posts']))
+        return Follow.objects.filter(author__posts__isnull=False).count()
+
+    def report(self, name, server, seconds, events):
+        messages = server.counters['messages']
+        self.stdout.write(
+            f'{name:>12} {messages:>8} '
+            f'{server.counters["connections"]:>11} {seconds:>8.2f} '
+            f'{messages / seconds:>9.0f} {events / seconds:>10.0f}')
+        server.counters.update(connections=0, messages=0)
+
+    def run_naive(self, server, limit, events):
+        """Письмо на каждую пару (подписчик, пост), как из post_create."""
+        pairs = Follow.objects.filter(
+            author__posts__isnull=False).values_list('user__email', flat=True)
+        started = time.perf_counter()
+        for email in pairs[:limit].iterator():
+            send_mail('Новый пост', 'Текст', None, [email],
+                      connection=get_connection())
+        seconds = time.perf_counter() - started
+        sent = server.counters['messages']
+        self.report('по письму', server, seconds, sent)
+        self.stdout.write(
+            f'{"":>12} на все события ушло бы '
+            f'{seconds * events / sent:.1f} с')
+
+    def run_digest(self, server, events):
+        started = time.perf_counter()
+        send_digests()
+        self.report('дайджест', server, time.perf_counter() - started, events)
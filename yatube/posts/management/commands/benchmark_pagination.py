@@ -0,0 +1,67 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.core.paginator import Paginator
+
+from posts.benchmarks import measure, seed_posts, temporary_database
+from posts.models import Post
+from posts.utils import NEXT, KeysetPaginator
+
+
+class Command(BaseCommand):
+    help = 'Сравнивает OFFSET-пагинацию с пагинацией по курсору.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--posts', type=int, default=1_000_000)
+        parser.add_argument('--repeat', type=int, default=20)
+        parser.add_argument(
+            '--pages', default='1,10,100,1000,10000',
+            help='Номера страниц через запятую.')
+
+    def handle(self, *args, **options):
+        per_page = settings.POSTS_PER_PAGE
+        pages = [int(page) for page in options['pages'].split(',')]
+
+        with temporary_database():
+            self.stdout.write(f'Генерация {options["posts"]} постов...')
+            seed_posts(options['posts'])
+            queryset = Post.objects.select_related('author', 'group')
+
+            self.stdout.write(
+                f'{"страница":>10} {"offset p50":>12} {"offset p95":>12} '
+                f'{"cursor p50":>12} {"cursor p95":>12}')
+            for number in pages:
+                if (number - 1) * per_page >= options['posts']:
+                    continue
+                offset = measure(
+                    lambda: list(Paginator(
+                        queryset.order_by('-pub_date', '-id'),
+                        per_page).page(number)),
+                    options['repeat'])
+                cursor = self.cursor_for(queryset, per_page, number)
+                keyset = measure(
+                    lambda: self.keyset_page(queryset, per_page, cursor),
+                    options['repeat'])
+                self.stdout.write(
+                    f'{number:>10} {offset["p50"]:>12.2f} '
+                    f'{offset["p95"]:>12.2f} {keyset["p50"]:>12.2f} '
+                    f'{keyset["p95"]:>12.2f}')
+
+    @staticmethod
+    def cursor_for(queryset, per_page, number):
+        paginator = KeysetPaginator(queryset, per_page)
+        if number == 1:
+            return None
+        last = paginator.object_list[(number - 1) * per_page - 1]
+        return paginator.make_cursor(last, NEXT, number)
+
+    @staticmethod
+    def keyset_page(queryset, per_page, cursor):
+        paginator = KeysetPaginator(
+            queryset, per_page,
+            max_pages=settings.POSTS_PAGINATOR_MAX_PAGES)
+        if cursor is None:
+            page = paginator.page(1)
+        else:
+            page = paginator.get_cursor_page(cursor)
+        list(page)
+        return paginator.count
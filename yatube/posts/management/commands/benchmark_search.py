@@ -0,0 +1,56 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from posts.benchmarks import measure, seed_posts, temporary_database
+from posts.models import Post
+from posts.search import get_backend, search_posts, words
+
+
+class Command(BaseCommand):
+    help = 'Сравнивает полнотекстовый поиск с поиском LIKE из админки.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--posts', type=int, default=100_000)
+        parser.add_argument('--repeat', type=int, default=20)
+        parser.add_argument(
+            '--queries', default='',
+            help='Запросы через запятую, по умолчанию слова из постов.')
+
+    def handle(self, *args, **options):
+        per_page = settings.POSTS_PER_PAGE
+
+        with temporary_database():
+            self.stdout.write(f'Генерация {options["posts"]} постов...')
+            seed_posts(options['posts'])
+            get_backend().rebuild()
+            queries = [
+                query for query in options['queries'].split(',') if query
+            ] or self.sample_queries()
+
+            self.stdout.write(
+                f'{"запрос":>20} {"like p50":>10} {"like p95":>10} '
+                f'{"fts p50":>10} {"fts p95":>10}')
+            for query in queries:
+                like = measure(
+                    lambda: self.like_page(query, per_page),
+                    options['repeat'])
+                fts = measure(
+                    lambda: search_posts(query, per_page=per_page),
+                    options['repeat'])
+                self.stdout.write(
+                    f'{query:>20} {like["p50"]:>10.2f} {like["p95"]:>10.2f} '
+                    f'{fts["p50"]:>10.2f} {fts["p95"]:>10.2f}')
+
+    @staticmethod
+    def sample_queries():
+        text = Post.objects.values_list('text', flat=True).first()
+        return [word for word in words(text) if len(word) > 3][:5]
+
+    @staticmethod
+    def like_page(query, per_page):
+        # Так ищет changelist админки: LIKE по search_fields,
+        # подсчёт результатов и первая страница.
+        queryset = Post.objects.select_related('author', 'group').filter(
+            text__icontains=query)
+        queryset.count()
+        return list(queryset[:per_page])
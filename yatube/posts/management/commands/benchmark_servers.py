@@ -0,0 +1,142 @@
+import http.client
+import os
+import random
+import socket
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.management.base import BaseCommand
+from django.urls import reverse
+
+from core.asgi import ASGIHandler
+from posts.benchmarks import (ASGIStandIn, PooledWSGIServer, seed_site,
+                              summarize, temporary_database)
+from posts.models import Group, Post, User
+
+CLIENT_THREADS = 'bench-client'
+COLUMNS = ('ok', 'failed', 'p50', 'p95', 'rps', 'threads')
+
+
+class Command(BaseCommand):
+    help = ('Сравнивает, сколько одновременных соединений выдерживают '
+            'WSGI-сервер с пулом потоков и ASGI-приложение с тем же '
+            'числом потоков, в том числе при медленных клиентах.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--posts', type=int, default=20_000)
+        parser.add_argument('--users', type=int, default=1_000)
+        parser.add_argument('--groups', type=int, default=50)
+        parser.add_argument('--follows', type=int, default=10)
+        parser.add_argument('--comments', type=int, default=5_000)
+        parser.add_argument(
+            '--threads', type=int, default=8,
+            help='Потоков у WSGI-сервера и в пуле ASGI-приложения.')
+        parser.add_argument(
+            '--slow-clients', type=int, nargs='+', default=[0, 64],
+            help='Сколько соединений держат недописанный запрос.')
+        parser.add_argument('--requests', type=int, default=400)
+        parser.add_argument('--concurrency', type=int, default=32)
+        parser.add_argument(
+            '--timeout', type=float, default=5,
+            help='Сколько секунд клиент ждёт ответа.')
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        path = os.path.join(tempfile.mkdtemp(), 'bench.sqlite3')
+        with temporary_database(name=path):
+            self.stdout.write('Генерация данных...')
+            seed_site(
+                options['posts'], options['users'], options['groups'],
+                options['follows'], options['comments'],
+                seed=options['seed'])
+            self.urls = self.sample_urls(options['seed'])
+            self.stdout.write(
+                f'{"сервер":>6} {"медленных":>9} '
+                + ' '.join(f'{c:>8}' for c in COLUMNS))
+            for slow in options['slow_clients']:
+                with PooledWSGIServer(
+                        WSGIHandler(), options['threads']) as server:
+                    self.report('wsgi', slow, self.run_load(
+                        server.server_address, slow, options))
+                asgi = ASGIHandler(threads=options['threads'])
+                with ASGIStandIn(asgi) as server:
+                    self.report('asgi', slow, self.run_load(
+                        server.server_address, slow, options))
+                asgi.executor.shutdown()
+                asgi.stream_executor.shutdown()
+
+    def sample_urls(self, seed):
+        """Адреса страниц чтения вперемешку."""
+        rng = random.Random(seed)
+        post_ids = list(Post.objects.values_list('pk', flat=True)[:1000])
+        usernames = list(User.objects.values_list('username', flat=True))
+        slugs = list(Group.objects.values_list('slug', flat=True))
+        return [
+            reverse('posts:index'),
+            *(reverse('posts:group_list', args=[rng.choice(slugs)])
+              for _ in range(20)),
+            *(reverse('posts:profile', args=[rng.choice(usernames)])
+              for _ in range(20)),
+            *(reverse('posts:post_detail', args=[rng.choice(post_ids)])
+              for _ in range(20)),
+        ]
+
+    def run_load(self, address, slow, options):
+        host, port = address
+        # Медленные клиенты прислали начало запроса и замолчали.
+        sockets = []
+        for _ in range(slow):
+            sock = socket.create_connection((host, port))
+            sock.sendall(b'GET / HTTP/1.1\r\nHost: 127.0.0.1\r\n')
+            sockets.append(sock)
+        rng = random.Random(options['seed'])
+        urls = [rng.choice(self.urls) for _ in range(options['requests'])]
+        threads = [0]
+
+        def fetch(url):
+            threads.append(sum(
+                not thread.name.startswith(CLIENT_THREADS)
+                for thread in threading.enumerate()))
+            started = time.perf_counter()
+            try:
+                connection = http.client.HTTPConnection(
+                    host, port, timeout=options['timeout'])
+                connection.request('GET', url)
+                response = connection.getresponse()
+                response.read()
+                connection.close()
+            except OSError:
+                return None
+            if response.status != 200:
+                return None
+            return (time.perf_counter() - started) * 1000
+
+        try:
+            started = time.perf_counter()
+            with ThreadPoolExecutor(
+                    options['concurrency'],
+                    thread_name_prefix=CLIENT_THREADS) as pool:
+                timings = list(pool.map(fetch, urls))
+            elapsed = time.perf_counter() - started
+        finally:
+            for sock in sockets:
+                sock.close()
+        done = [timing for timing in timings if timing is not None]
+        result = summarize(done) if done else {'p50': 0, 'p95': 0}
+        return {
+            'ok': len(done),
+            'failed': len(timings) - len(done),
+            'p50': result['p50'],
+            'p95': result['p95'],
+            'rps': len(done) / elapsed,
+            # Потоки процесса без клиентов замера.
+            'threads': max(threads),
+        }
+
+    def report(self, server, slow, result):
+        self.stdout.write(
+            f'{server:>6} {slow:>9} '
+            + ' '.join(f'{result[column]:>8.0f}' for column in COLUMNS))
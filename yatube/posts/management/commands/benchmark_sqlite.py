@@ -0,0 +1,118 @@
+import os
+import random
+import tempfile
+import threading
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import OperationalError, connection, transaction
+from django.test import override_settings
+
+from core.sqlite import write_queue
+from posts.benchmarks import percentile, seed_posts, temporary_database
+from posts.models import Comment, Post, User
+
+MODES = {
+    # Настройки SQLite по умолчанию: журнал отката и таймаут Python.
+    'default': ({'journal_mode': 'DELETE'}, False),
+    'tuned': (None, False),
+    'tuned+queue': (None, True),
+}
+
+
+class Command(BaseCommand):
+    help = 'Замеряет смешанную нагрузку чтения и записи на SQLite.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--posts', type=int, default=10_000)
+        parser.add_argument('--readers', type=int, default=8)
+        parser.add_argument('--writers', type=int, default=4)
+        parser.add_argument('--seconds', type=float, default=5)
+
+    def handle(self, *args, **options):
+        path = os.path.join(tempfile.mkdtemp(), 'bench.sqlite3')
+        with temporary_database(name=path):
+            seed_posts(options['posts'])
+            self.post_ids = list(Post.objects.values_list('pk', flat=True))
+            self.user_ids = list(User.objects.values_list('pk', flat=True))
+            self.stdout.write(
+                f'{"режим":>12} {"чтений/с":>10} {"записей/с":>10} '
+                f'{"ошибок":>8} {"чтение p95":>11} {"запись p95":>11}')
+            for mode, (pragmas, queued) in MODES.items():
+                with override_settings(**self.mode_settings(pragmas)):
+                    connection.close()
+                    result = self.run_load(options, queued)
+                    write_queue.run(lambda: connection.close())
+                    connection.close()
+                self.stdout.write(
+                    f'{mode:>12} {result["reads"]:>10.0f} '
+                    f'{result["writes"]:>10.0f} {result["errors"]:>8} '
+                    f'{result["read_p95"]:>11.1f} '
+                    f'{result["write_p95"]:>11.1f}')
+
+    @staticmethod
+    def mode_settings(pragmas):
+        return {} if pragmas is None else {'SQLITE_PRAGMAS': pragmas}
+
+    def read(self, rng):
+        list(Post.objects.select_related('author', 'group')[:10])
+        post = Post.objects.get(pk=rng.choice(self.post_ids))
+        list(post.comments.select_related('author'))
+
+    def write(self, rng):
+        # Как add_comment: чтение и запись в одной транзакции.
+        with transaction.atomic():
+            post = Post.objects.get(pk=rng.choice(self.post_ids))
+            Comment.objects.create(
+                post=post,
+                author_id=rng.choice(self.user_ids),
+                text='bench',
+            )
+
+    def run_load(self, options, queued):
+        deadline = time.monotonic() + options['seconds']
+        timings = {'read': [], 'write': []}
+        errors = []
+        lock = threading.Lock()
+
+        def worker(kind, seed):
+            rng = random.Random(seed)
+            operation = getattr(self, kind)
+            local_timings, local_errors = [], 0
+            try:
+                while time.monotonic() < deadline:
+                    started = time.perf_counter()
+                    try:
+                        if kind == 'write' and queued:
+                            write_queue.run(operation, rng)
+                        else:
+                            operation(rng)
+                    except OperationalError:
+                        local_errors += 1
+                        continue
+                    local_timings.append(
+                        (time.perf_counter() - started) * 1000)
+            finally:
+                connection.close()
+            with lock:
+                timings[kind].extend(local_timings)
+                errors.append(local_errors)
+
+        threads = [
+            threading.Thread(target=worker, args=('read', number))
+            for number in range(options['readers'])
+        ] + [
+            threading.Thread(target=worker, args=('write', -number - 1))
+            for number in range(options['writers'])
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return {
+            'reads': len(timings['read']) / options['seconds'],
+            'writes': len(timings['write']) / options['seconds'],
+            'errors': sum(errors),
+            'read_p95': percentile(timings['read'] or [0], 0.95),
+            'write_p95': percentile(timings['write'] or [0], 0.95),
+        }
@@ -0,0 +1,208 @@
+import json
+import os
+import random
+import tempfile
+import time
+
+import django
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client
+from django.test.utils import (CaptureQueriesContext,
+                               setup_test_environment,
+                               teardown_test_environment)
+from django.urls import reverse
+
+from posts.benchmarks import seed_site, summarize, temporary_database
+from posts.models import Follow, Group, Post, User
+
+COLUMNS = ('p50', 'p95', 'p99', 'queries', 'rps')
+
+
+class Command(BaseCommand):
+    help = ('Нагружает страницы и формы сайта на сгенерированной базе '
+            'и сравнивает результат с сохранённым замером.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--posts', type=int, default=1_000_000)
+        parser.add_argument('--users', type=int, default=10_000)
+        parser.add_argument('--groups', type=int, default=1_000)
+        parser.add_argument(
+            '--follows', type=int, default=20,
+            help='Подписок на пользователя.')
+        parser.add_argument('--comments', type=int, default=200_000)
+        parser.add_argument('--requests', type=int, default=200)
+        parser.add_argument('--warmup', type=int, default=10)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument(
+            '--scenarios', help='Сценарии через запятую, по умолчанию все.')
+        parser.add_argument(
+            '--output', help='Файл, куда записать замер в JSON.')
+        parser.add_argument(
+            '--compare', help='JSON прошлого замера для поиска регрессий.')
+        parser.add_argument(
+            '--tolerance', type=float, default=0.2,
+            help='Допустимый рост p95, доля от прошлого замера.')
+
+    def handle(self, *args, **options):
+        scenarios = self.scenarios()
+        if options['scenarios']:
+            names = options['scenarios'].split(',')
+            unknown = set(names) - set(scenarios)
+            if unknown:
+                raise CommandError(
+                    f'Неизвестные сценарии: {", ".join(sorted(unknown))}')
+            scenarios = {name: scenarios[name] for name in names}
+        baseline = None
+        if options['compare']:
+            with open(options['compare']) as file:
+                baseline = json.load(file)
+
+        setup_test_environment()
+        # База в файле доступна и потокам фоновых задач.
+        path = os.path.join(tempfile.mkdtemp(), 'bench.sqlite3')
+        try:
+            with temporary_database(name=path):
+                self.stdout.write('Генерация данных...')
+                started = time.perf_counter()
+                seed_site(
+                    options['posts'], options['users'], options['groups'],
+                    options['follows'], options['comments'],
+                    seed=options['seed'])
+                self.stdout.write(
+                    f'Готово за {time.perf_counter() - started:.0f} с.')
+                results = self.run_scenarios(scenarios, options)
+        finally:
+            teardown_test_environment()
+
+        report = {
+            'environment': {
+                'django': django.get_version(),
+                'database': connection.vendor,
+            },
+            'dataset': {
+                name: options[name] for name in (
+                    'posts', 'users', 'groups', 'follows', 'comments',
+                    'seed')
+            },
+            'requests': options['requests'],
+            'scenarios': results,
+        }
+        if options['output']:
+            with open(options['output'], 'w') as file:
+                json.dump(report, file, indent=2, ensure_ascii=False)
+        if baseline is not None:
+            self.check_regressions(baseline, report, options['tolerance'])
+
+    def scenarios(self):
+        """Сценарии: (метод, авторизован ли клиент, функция запроса).
+
+        Функция получает генератор случайных чисел и возвращает
+        адрес и данные формы.
+        """
+        return {
+            'index': ('get', False, lambda rng: (reverse('posts:index'),)),
+            'index_auth': (
+                'get', True, lambda rng: (reverse('posts:index'),)),
+            'group_posts': ('get', True, lambda rng: (reverse(
+                'posts:group_list',
+                args=[rng.choice(self.group_slugs)]),)),
+            'profile': ('get', True, lambda rng: (reverse(
+                'posts:profile', args=[rng.choice(self.usernames)]),)),
+            'post_detail': ('get', True, lambda rng: (reverse(
+                'posts:post_detail', args=[rng.choice(self.post_ids)]),)),
+            'follow_index': (
+                'get', True, lambda rng: (reverse('posts:follow_index'),)),
+            'post_create': ('post', True, lambda rng: (
+                reverse('posts:post_create'),
+                {'text': 'Пост из замера',
+                 'group': rng.choice(self.group_ids)})),
+            'add_comment': ('post', True, lambda rng: (
+                reverse('posts:add_comment',
+                        args=[rng.choice(self.post_ids)]),
+                {'text': 'Комментарий из замера'})),
+            'profile_follow': ('get', True, lambda rng: (reverse(
+                'posts:profile_follow', args=[self.next_author(rng)]),)),
+        }
+
+    def next_author(self, rng):
+        """Автор, на которого читатель ещё не подписан."""
+        while True:
+            username = rng.choice(self.usernames)
+            if username != self.reader.username and not Follow.objects.filter(
+                    user=self.reader, author__username=username).exists():
+                return username
+
+    def run_scenarios(self, scenarios, options):
+        rng = random.Random(options['seed'])
+        self.post_ids = list(Post.objects.values_list('pk', flat=True))
+        self.usernames = list(User.objects.values_list('username', flat=True))
+        groups = Group.objects.values_list('pk', 'slug')
+        self.group_ids = [pk for pk, _ in groups]
+        self.group_slugs = [slug for _, slug in groups]
+        # Читатель с типичным для сгенерированной базы числом подписок.
+        self.reader = User.objects.order_by('-pk').first()
+        anonymous, authorized = Client(), Client()
+        authorized.force_login(self.reader)
+
+        self.stdout.write(
+            f'{"сценарий":>14} ' + ' '.join(f'{c:>8}' for c in COLUMNS))
+        results = {}
+        for name, (method, auth, make_request) in scenarios.items():
+            client = authorized if auth else anonymous
+            cache.clear()
+            for _ in range(options['warmup']):
+                self.request(client, method, make_request(rng))
+            timings, queries = [], []
+            started = time.perf_counter()
+            for _ in range(options['requests']):
+                elapsed, count = self.request(
+                    client, method, make_request(rng))
+                timings.append(elapsed)
+                queries.append(count)
+            total = time.perf_counter() - started
+            results[name] = {
+                **summarize(timings),
+                'queries': sum(queries) / len(queries),
+                'max_queries': max(queries),
+                'rps': len(timings) / total,
+            }
+            self.stdout.write(f'{name:>14} ' + ' '.join(
+                f'{results[name][column]:>8.1f}' for column in COLUMNS))
+        return results
+
+    @staticmethod
+    def request(client, method, args):
+        with CaptureQueriesContext(connection) as queries:
+            started = time.perf_counter()
+            response = getattr(client, method)(*args)
+            elapsed = (time.perf_counter() - started) * 1000
+        if response.status_code >= 400:
+            raise CommandError(
+                f'{method.upper()} {args[0]}: ответ {response.status_code}')
+        return elapsed, len(queries)
+
+    def check_regressions(self, baseline, report, tolerance):
+        """Сравнивает p95 и число запросов с прошлым замером."""
+        if baseline.get('dataset') != report['dataset']:
+            self.stderr.write(
+                'Данные прошлого замера сгенерированы с другими '
+                'параметрами, сравнение может быть неточным.')
+        regressions = []
+        for name, result in report['scenarios'].items():
+            old = baseline['scenarios'].get(name)
+            if old is None:
+                continue
+            if result['p95'] > old['p95'] * (1 + tolerance):
+                regressions.append(
+                    f'{name}: p95 {old["p95"]:.1f} → {result["p95"]:.1f} мс')
+            if result['max_queries'] > old['max_queries']:
+                regressions.append(
+                    f'{name}: запросов {old["max_queries"]} → '
+                    f'{result["max_queries"]}')
+        if regressions:
+            raise CommandError(
+                'Регрессии относительно прошлого замера:\n'
+                + '\n'.join(regressions))
+        self.stdout.write('Регрессий нет.')
@@ -0,0 +1,27 @@
+import sys
+
+from django.core.management.base import BaseCommand
+
+from posts.transfer import FORMATS, export_rows, guess_format, write_rows
+
+
+class Command(BaseCommand):
+    help = 'Выгружает посты в NDJSON или CSV.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'path', nargs='?', default='-',
+            help='Файл выгрузки, по умолчанию стандартный вывод.')
+        parser.add_argument(
+            '--format', choices=FORMATS,
+            help='Формат, по умолчанию по расширению файла.')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        fmt = options['format'] or guess_format(path)
+        if path == '-':
+            count = write_rows(export_rows(), sys.stdout, fmt)
+        else:
+            with open(path, 'w', newline='', encoding='utf-8') as stream:
+                count = write_rows(export_rows(), stream, fmt)
+        self.stderr.write(f'Выгружено постов: {count}.')
@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+
+from posts.images import generate_thumbnails
+from posts.models import Post
+
+
+class Command(BaseCommand):
+    help = 'Создаёт миниатюры для постов, у которых их ещё нет.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--all', action='store_true',
+            help='Пересоздать миниатюры всех постов с картинками.')
+
+    def handle(self, *args, **options):
+        posts = Post.objects.exclude(image='')
+        if not options['all']:
+            posts = posts.filter(thumbnails='{}')
+        done = 0
+        for post_id in posts.values_list('pk', flat=True).iterator():
+            if generate_thumbnails(post_id) is not None:
+                done += 1
+        self.stdout.write(f'Миниатюры созданы для {done} постов.')
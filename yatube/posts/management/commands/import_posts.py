@@ -0,0 +1,48 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from posts.transfer import (FORMATS, BadRecord, PostImporter, guess_format,
+                            read_rows)
+
+
+class Command(BaseCommand):
+    help = ('Загружает посты из NDJSON или CSV пачками, сохраняя '
+            'дату публикации.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'path', nargs='?', default='-',
+            help='Файл с постами, по умолчанию стандартный ввод.')
+        parser.add_argument(
+            '--format', choices=FORMATS,
+            help='Формат, по умолчанию по расширению файла.')
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument(
+            '--create-missing', action='store_true',
+            help='Создавать неизвестных авторов и сообщества.')
+        parser.add_argument(
+            '--images-dir',
+            help='Каталог, относительно которого заданы пути картинок.')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        fmt = options['format'] or guess_format(path)
+        importer = PostImporter(
+            batch_size=options['batch_size'],
+            create_missing=options['create_missing'],
+            images_dir=options['images_dir'],
+        )
+        try:
+            if path == '-':
+                importer.run(read_rows(sys.stdin, fmt))
+            else:
+                with open(path, newline='', encoding='utf-8') as stream:
+                    importer.run(read_rows(stream, fmt))
+        except BadRecord as error:
+            raise CommandError(
+                f'{error} Загружено постов до ошибки: {importer.created}.')
+        self.stdout.write(f'Загружено постов: {importer.created}.')
+        if importer.missing_images:
+            self.stderr.write(
+                f'Не найдено картинок: {importer.missing_images}.')
@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+
+from posts.counters import reconcile
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает денормализованные счётчики постов и подписок.'
+
+    def handle(self, *args, **options):
+        profiles, posts = reconcile()
+        self.stdout.write(
+            f'Пересчитано профилей: {profiles}, постов: {posts}.')
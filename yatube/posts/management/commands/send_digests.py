@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from posts.digests import send_digests
+
+
+class Command(BaseCommand):
+    help = ('Рассылает письма о новых постах авторов, на которых подписаны '
+            'пользователи. Запускается по расписанию, например из cron.')
+
+    def handle(self, *args, **options):
+        digest = send_digests()
+        self.stdout.write(
+            f'Посты {digest}: отправлено писем {digest.sent}.')
@@ -0,0 +1,73 @@
+# Generated by Django 2.2.19 on 2026-10-18 03:14
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+from django.db.models import Count, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def count_of(queryset, key):
+    return Coalesce(
+        Subquery(
+            queryset.order_by().values(key)
+            .annotate(total=Count('pk')).values('total'),
+            output_field=IntegerField(),
+        ),
+        0,
+    )
+
+
+def fill_counters(apps, schema_editor):
+    User = apps.get_model(*settings.AUTH_USER_MODEL.split('.'))
+    Profile = apps.get_model('posts', 'Profile')
+    Post = apps.get_model('posts', 'Post')
+    Follow = apps.get_model('posts', 'Follow')
+    Comment = apps.get_model('posts', 'Comment')
+    db_alias = schema_editor.connection.alias
+    Profile.objects.using(db_alias).bulk_create(
+        [Profile(user_id=pk) for pk in User.objects.using(db_alias).values_list('pk', flat=True)],
+        batch_size=1000,
+    )
+    Profile.objects.using(db_alias).update(
+        posts_count=count_of(
+            Post.objects.filter(author=OuterRef('user')), 'author'),
+        followers_count=count_of(
+            Follow.objects.filter(author=OuterRef('user')), 'author'),
+        following_count=count_of(
+            Follow.objects.filter(user=OuterRef('user')), 'user'),
+    )
+    Post.objects.using(db_alias).update(
+        comments_count=count_of(
+            Comment.objects.filter(post=OuterRef('pk')), 'post'),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('posts', '0012_feed_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Profile',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='profile', serialize=False, to=settings.AUTH_USER_MODEL, verbose_name='пользователь')),
+                ('posts_count', models.PositiveIntegerField(default=0, verbose_name='число публикаций')),
+                ('followers_count', models.PositiveIntegerField(default=0, verbose_name='число подписчиков')),
+                ('following_count', models.PositiveIntegerField(default=0, verbose_name='число подписок')),
+            ],
+            options={
+                'verbose_name': 'профиль',
+                'verbose_name_plural': 'профили',
+            },
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='comments_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='число комментариев'),
+        ),
+        migrations.RunPython(fill_counters, migrations.RunPython.noop),
+    ]
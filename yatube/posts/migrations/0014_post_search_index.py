@@ -0,0 +1,43 @@
+from django.db import migrations
+
+FTS_TABLE = 'posts_post_fts'
+GIN_INDEX = 'post_text_search_idx'
+
+
+def create_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        schema_editor.execute(
+            f'CREATE VIRTUAL TABLE {FTS_TABLE} USING fts5('
+            f"text, tokenize = 'unicode61 remove_diacritics 2')"
+        )
+        schema_editor.execute(
+            f'INSERT INTO {FTS_TABLE} (rowid, text) '
+            f'SELECT id, text FROM posts_post'
+        )
+    elif vendor == 'postgresql':
+        # Выражение совпадает с тем, что строит SearchVector('text'),
+        # иначе планировщик не воспользуется индексом.
+        schema_editor.execute(
+            f'CREATE INDEX {GIN_INDEX} ON posts_post USING GIN '
+            f"(to_tsvector('russian'::regconfig, COALESCE(text, '')))"
+        )
+
+
+def drop_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        schema_editor.execute(f'DROP TABLE IF EXISTS {FTS_TABLE}')
+    elif vendor == 'postgresql':
+        schema_editor.execute(f'DROP INDEX IF EXISTS {GIN_INDEX}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0013_profile_counters'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_index, drop_index),
+    ]
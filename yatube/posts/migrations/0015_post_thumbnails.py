@@ -0,0 +1,18 @@
+# Generated by Django 2.2.19 on 2026-10-18 03:18
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0014_post_search_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='thumbnails',
+            field=models.TextField(default='{}', editable=False, help_text='JSON: размер из POST_THUMBNAILS -> адрес миниатюры', verbose_name='адреса миниатюр'),
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 2.2.19 on 2026-10-18 03:20
+
+from django.db import migrations, models
+
+
+def reset_thumbnails(apps, schema_editor):
+    # Миниатюры прежнего формата пересоздаются командой
+    # generate_thumbnails.
+    Post = apps.get_model('posts', 'Post')
+    Post.objects.using(schema_editor.connection.alias).update(
+        thumbnails='{}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0015_post_thumbnails'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='image_hash',
+            field=models.CharField(blank=True, db_index=True, editable=False, max_length=64, verbose_name='SHA-256 картинки'),
+        ),
+        migrations.AlterField(
+            model_name='post',
+            name='thumbnails',
+            field=models.TextField(default='{}', editable=False, help_text='JSON с адресами копий картинки для srcset', verbose_name='копии картинки'),
+        ),
+        migrations.RunPython(reset_thumbnails, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 2.2.19 on 2026-10-18 03:59
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0016_post_image_renditions'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Digest',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('since_post_id', models.PositiveIntegerField(verbose_name='посты после id')),
+                ('until_post_id', models.PositiveIntegerField(verbose_name='посты до id включительно')),
+                ('last_user_id', models.PositiveIntegerField(default=0, help_text='письма получателям с меньшим id уже отправлены', verbose_name='последний получатель')),
+                ('sent', models.PositiveIntegerField(default=0, verbose_name='отправлено писем')),
+                ('created', models.DateTimeField(auto_now_add=True, verbose_name='дата начала')),
+                ('finished', models.DateTimeField(blank=True, null=True, verbose_name='дата окончания')),
+            ],
+            options={
+                'verbose_name': 'рассылка',
+                'verbose_name_plural': 'рассылки',
+                'ordering': ('-pk',),
+            },
+        ),
+    ]
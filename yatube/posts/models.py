@@ -1,3 +1,5 @@
+import json
+
 from django.contrib.auth import get_user_model
 from django.db import models
 
@@ -57,15 +59,48 @@ class Post(models.Model):
         upload_to='posts/',
         blank=True
     )
+    comments_count = models.PositiveIntegerField(
+        verbose_name='число комментариев',
+        default=0,
+        editable=False
+    )
+    thumbnails = models.TextField(
+        verbose_name='копии картинки',
+        help_text='JSON с адресами копий картинки для srcset',
+        default='{}',
+        editable=False
+    )
+    image_hash = models.CharField(
+        verbose_name='SHA-256 картинки',
+        max_length=64,
+        blank=True,
+        db_index=True,
+        editable=False
+    )
 
     class Meta:
         verbose_name = 'публикация'
         verbose_name_plural = 'публикации'
-        ordering = ('-pub_date',)
+        ordering = ('-pub_date', '-id')
+        indexes = (
+            models.Index(
+                fields=('-pub_date', '-id'), name='post_pub_date_id_idx'),
+            models.Index(
+                fields=('author', '-pub_date', '-id'),
+                name='post_author_pub_date_idx'),
+            models.Index(
+                fields=('group', '-pub_date', '-id'),
+                name='post_group_pub_date_idx'),
+        )
 
     def __str__(self):
         return f'{self.text[:15]}'
 
+    @property
+    def rendition(self):
+        """Копии картинки; пустой словарь, пока они не созданы."""
+        return json.loads(self.thumbnails or '{}')
+
 
 class Comment(models.Model):
     """Класс Comment описывает модель для хранения информации о комментариях"""
@@ -88,6 +123,14 @@ class Comment(models.Model):
         auto_now_add=True
     )
 
+    class Meta:
+        ordering = ('created', 'id')
+        indexes = (
+            models.Index(
+                fields=('post', 'created', 'id'),
+                name='comment_post_created_idx'),
+        )
+
     def __str__(self):
         return self.text
 
@@ -112,3 +155,91 @@ class Follow(models.Model):
         verbose_name = 'подписка'
         verbose_name_plural = 'подписки'
         ordering = ('author',)
+        constraints = (
+            models.UniqueConstraint(
+                fields=('user', 'author'), name='unique_follow'),
+        )
+
+
+class FeedEntry(models.Model):
+    """Класс FeedEntry описывает запись в ленте подписок пользователя"""
+
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='feed_entries',
+        verbose_name='читатель'
+    )
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='feed_entries',
+        verbose_name='публикация'
+    )
+    pub_date = models.DateTimeField(verbose_name='дата публикации')
+
+    class Meta:
+        verbose_name = 'запись ленты'
+        verbose_name_plural = 'записи ленты'
+        constraints = (
+            models.UniqueConstraint(
+                fields=('user', 'post'), name='unique_feed_entry'),
+        )
+        indexes = (
+            models.Index(
+                fields=('user', '-pub_date', '-post'),
+                name='feed_user_pub_date_idx'),
+        )
+
+
+class Profile(models.Model):
+    """Класс Profile хранит счётчики пользователя"""
+
+    user = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='profile',
+        verbose_name='пользователь'
+    )
+    posts_count = models.PositiveIntegerField(
+        verbose_name='число публикаций', default=0)
+    followers_count = models.PositiveIntegerField(
+        verbose_name='число подписчиков', default=0)
+    following_count = models.PositiveIntegerField(
+        verbose_name='число подписок', default=0)
+
+    class Meta:
+        verbose_name = 'профиль'
+        verbose_name_plural = 'профили'
+
+    def __str__(self):
+        return f'{self.user}'
+
+
+class Digest(models.Model):
+    """Класс Digest описывает рассылку писем о новых постах подписок"""
+
+    since_post_id = models.PositiveIntegerField(
+        verbose_name='посты после id')
+    until_post_id = models.PositiveIntegerField(
+        verbose_name='посты до id включительно')
+    last_user_id = models.PositiveIntegerField(
+        verbose_name='последний получатель',
+        help_text='письма получателям с меньшим id уже отправлены',
+        default=0
+    )
+    sent = models.PositiveIntegerField(
+        verbose_name='отправлено писем', default=0)
+    created = models.DateTimeField(
+        verbose_name='дата начала', auto_now_add=True)
+    finished = models.DateTimeField(
+        verbose_name='дата окончания', null=True, blank=True)
+
+    class Meta:
+        verbose_name = 'рассылка'
+        verbose_name_plural = 'рассылки'
+        ordering = ('-pk',)
+
+    def __str__(self):
+        return f'{self.since_post_id}–{self.until_post_id}'
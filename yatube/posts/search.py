@@ -0,0 +1,201 @@
+"""Полнотекстовый поиск по постам.
+
+Бэкенд выбирается настройкой POSTS_SEARCH_BACKEND, а если она не
+задана — по типу базы: FTS5 для SQLite, tsvector для PostgreSQL и
+простой LIKE-поиск для остальных. Все бэкенды возвращают пары
+(id поста, score), где меньший score означает более релевантный пост,
+и умеют продолжать выдачу с позиции курсора.
+"""
+import re
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import F, FloatField, Q, Value
+from django.utils.module_loading import import_string
+
+from core.sqlite import run_write
+
+from .models import Post
+from .utils import decode_cursor, encode_cursor
+
+WORD = re.compile(r'\w+')
+
+
+def words(query):
+    return WORD.findall(query.lower())
+
+
+class BaseSearchBackend:
+    """Интерфейс бэкенда поиска."""
+
+    def index(self, post):
+        """Добавляет пост в индекс или обновляет его."""
+
+    def remove(self, post_id):
+        """Убирает пост из индекса."""
+
+    def rebuild(self):
+        """Строит индекс заново по всем постам."""
+
+    def index_range(self, after_id, last_id):
+        """Добавляет в индекс посты с id от after_id (не включая)
+        до last_id, созданные в обход сигналов."""
+
+    def search(self, query, after=None, limit=10):
+        """Возвращает до limit пар (id, score) после курсора after."""
+        raise NotImplementedError
+
+    @staticmethod
+    def after_filter(after, score='score'):
+        if after is None:
+            return Q()
+        last_score, last_id = after
+        return (Q(**{f'{score}__gt': last_score})
+                | Q(**{score: last_score, 'pk__gt': last_id}))
+
+
+class SQLiteSearchBackend(BaseSearchBackend):
+    """Индекс FTS5 с ранжированием bm25."""
+
+    table = 'posts_post_fts'
+
+    def index(self, post):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'DELETE FROM {self.table} WHERE rowid = %s', [post.pk])
+            cursor.execute(
+                f'INSERT INTO {self.table} (rowid, text) VALUES (%s, %s)',
+                [post.pk, post.text])
+
+    def remove(self, post_id):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'DELETE FROM {self.table} WHERE rowid = %s', [post_id])
+
+    def rebuild(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {self.table}')
+            cursor.execute(
+                f'INSERT INTO {self.table} (rowid, text) '
+                f'SELECT id, text FROM {Post._meta.db_table}')
+
+    def index_range(self, after_id, last_id):
+        with connection.cursor() as cursor:
+            # Посты, опубликованные тем временем на сайте, уже могла
+            # проиндексировать задача index_post.
+            cursor.execute(
+                f'DELETE FROM {self.table} WHERE rowid > %s AND rowid <= %s',
+                [after_id, last_id])
+            cursor.execute(
+                f'INSERT INTO {self.table} (rowid, text) '
+                f'SELECT id, text FROM {Post._meta.db_table} '
+                f'WHERE id > %s AND id <= %s', [after_id, last_id])
+
+    @staticmethod
+    def match_expression(query):
+        # Каждое слово берётся в кавычки, чтобы пользовательский ввод
+        # не разбирался как синтаксис запросов FTS5, и ищется по префиксу.
+        return ' '.join(f'"{word}"*' for word in words(query))
+
+    def search(self, query, after=None, limit=10):
+        expression = self.match_expression(query)
+        if not expression:
+            return []
+        sql = (
+            f'SELECT rowid, score FROM ('
+            f'SELECT rowid, bm25({self.table}) AS score FROM {self.table} '
+            f'WHERE {self.table} MATCH %s)'
+        )
+        params = [expression]
+        if after is not None:
+            sql += ' WHERE score > %s OR (score = %s AND rowid > %s)'
+            params += [after[0], after[0], after[1]]
+        sql += ' ORDER BY score, rowid LIMIT %s'
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params + [limit])
+            return cursor.fetchall()
+
+
+class PostgresSearchBackend(BaseSearchBackend):
+    """Поиск по tsvector с GIN-индексом, созданным миграцией."""
+
+    config = 'russian'
+
+    def search(self, query, after=None, limit=10):
+        from django.contrib.postgres.search import (SearchQuery, SearchRank,
+                                                    SearchVector)
+
+        if not words(query):
+            return []
+        vector = SearchVector('text', config=self.config)
+        search_query = SearchQuery(' '.join(words(query)), config=self.config)
+        return list(
+            Post.objects.annotate(search=vector)
+            .filter(search=search_query)
+            .annotate(score=-SearchRank(F('search'), search_query))
+            .filter(self.after_filter(after))
+            .order_by('score', 'pk')
+            .values_list('pk', 'score')[:limit]
+        )
+
+
+class SimpleSearchBackend(BaseSearchBackend):
+    """Поиск подстрокой для баз без полнотекстового индекса."""
+
+    def search(self, query, after=None, limit=10):
+        condition = Q()
+        for word in words(query):
+            condition &= Q(text__icontains=word)
+        if not condition:
+            return []
+        return list(
+            Post.objects.filter(condition)
+            .annotate(score=Value(0.0, output_field=FloatField()))
+            .filter(self.after_filter(after))
+            .order_by('score', 'pk')
+            .values_list('pk', 'score')[:limit]
+        )
+
+
+BACKENDS = {
+    'sqlite': SQLiteSearchBackend,
+    'postgresql': PostgresSearchBackend,
+}
+
+
+def get_backend():
+    if settings.POSTS_SEARCH_BACKEND:
+        return import_string(settings.POSTS_SEARCH_BACKEND)()
+    return BACKENDS.get(connection.vendor, SimpleSearchBackend)()
+
+
+def index_post(post_id):
+    """Обновляет пост в индексе или убирает его, если поста уже нет."""
+    post = Post.objects.filter(pk=post_id).first()
+    if post is None:
+        run_write(get_backend().remove, post_id)
+    else:
+        run_write(get_backend().index, post)
+
+
+def valid_after(cursor):
+    after = decode_cursor(cursor) if cursor else None
+    if (isinstance(after, list) and len(after) == 2
+            and isinstance(after[0], (int, float))
+            and isinstance(after[1], int)):
+        return after
+    return None
+
+
+def search_posts(query, cursor=None, per_page=None):
+    """Страница найденных постов и курсор следующей страницы."""
+    per_page = per_page or settings.POSTS_PER_PAGE
+    hits = get_backend().search(query, valid_after(cursor), per_page + 1)
+    next_cursor = None
+    if len(hits) > per_page:
+        hits = hits[:per_page]
+        last_id, last_score = hits[-1]
+        next_cursor = encode_cursor([last_score, last_id])
+    posts = Post.objects.select_related('author', 'group').in_bulk(
+        [pk for pk, score in hits])
+    return [posts[pk] for pk, score in hits if pk in posts], next_cursor
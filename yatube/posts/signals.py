@@ -0,0 +1,176 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from core import tasks
+
+from . import caching, counters, feeds, images, live, search
+from .models import Comment, Follow, Group, Post, Profile, User
+
+
+@receiver(post_save, sender=Post)
+def fan_out_new_post(sender, instance, created, **kwargs):
+    if created:
+        tasks.enqueue(
+            feeds.fan_out_post, instance.pk, key=f'fan_out:{instance.pk}')
+
+
+@receiver(post_save, sender=Follow)
+def fill_feed_on_follow(sender, instance, created, **kwargs):
+    if created:
+        feeds.follow_added(instance)
+
+
+@receiver(post_delete, sender=Follow)
+def clean_feed_on_unfollow(sender, instance, **kwargs):
+    feeds.follow_removed(instance)
+
+
+@receiver(pre_save, sender=Post)
+def remember_old_values(sender, instance, **kwargs):
+    instance._old_group_id, instance._old_image = None, None
+    if instance.pk:
+        instance._old_group_id, instance._old_image = (
+            Post.objects.filter(pk=instance.pk)
+            .values_list('group_id', 'image').first() or (None, None)
+        )
+
+
+@receiver(pre_save, sender=Post)
+def reset_image_copies(sender, instance, raw=False, **kwargs):
+    # Копии и хеш старой картинки не должны достаться новой,
+    # а убранная картинка — остаться на странице.
+    if raw or (instance.image.name or '') == (instance._old_image or ''):
+        return
+    instance.thumbnails = '{}'
+    # Хеш, посчитанный обработчиком загрузки, относится к новому файлу.
+    upload = (
+        instance.image and not instance.image._committed
+        and instance.image.file
+    )
+    instance.image_hash = getattr(upload, 'sha256', '')
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+def invalidate_post_feeds(sender, instance, **kwargs):
+    caching.bump_post(instance, getattr(instance, '_old_group_id', None))
+
+
+@receiver(post_save, sender=Post)
+def make_thumbnails(sender, instance, raw=False, **kwargs):
+    old_image = getattr(instance, '_old_image', None)
+    if not raw and instance.image and instance.image.name != old_image:
+        images.schedule_thumbnails(instance)
+
+
+# Поля пользователя, которые выводятся на страницах рядом с постами.
+USER_NAME_FIELDS = ('username', 'first_name', 'last_name')
+
+
+@receiver(post_save, sender=Group)
+def invalidate_group_feed(sender, instance, **kwargs):
+    # Новое сообщество появляется в списке сообществ, а название
+    # выводится у постов во всех лентах и на страницах постов. Версия
+    # ALL_GROUPS входит в ключи всех страниц.
+    caching.bump(caching.ALL_GROUPS)
+
+
+@receiver(post_delete, sender=Group)
+def invalidate_all_feeds(sender, instance, **kwargs):
+    # Посты удалённого сообщества обнуляют group без сигналов,
+    # поэтому сбрасываются фрагменты всех лент.
+    caching.bump(caching.ALL_GROUPS)
+
+
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+def invalidate_comments(sender, instance, **kwargs):
+    caching.bump(caching.post_scope(instance.post_id))
+
+
+@receiver(pre_save, sender=User)
+def remember_old_name(sender, instance, update_fields=None, **kwargs):
+    # Вход пользователя сохраняет только last_login: имя не читается.
+    instance._old_name = None
+    if instance.pk and (
+            update_fields is None
+            or set(update_fields) & set(USER_NAME_FIELDS)):
+        instance._old_name = User.objects.filter(
+            pk=instance.pk).values_list(*USER_NAME_FIELDS).first()
+
+
+@receiver(post_save, sender=User)
+def invalidate_author_pages(sender, instance, created, **kwargs):
+    old_name = getattr(instance, '_old_name', None)
+    name = tuple(getattr(instance, field) for field in USER_NAME_FIELDS)
+    if created or old_name is None or old_name == name:
+        return
+    # Имя автора выводится у его постов и комментариев во всех лентах
+    # и на страницах постов, поэтому сбрасываются все страницы.
+    caching.bump(caching.ALL_GROUPS)
+
+
+@receiver(post_save, sender=User)
+def create_profile(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        Profile.objects.get_or_create(user=instance)
+
+
+@receiver(post_save, sender=Post)
+def count_new_post(sender, instance, created, **kwargs):
+    if created:
+        counters.add(Profile, instance.author_id, 'posts_count', 1)
+
+
+@receiver(post_delete, sender=Post)
+def count_deleted_post(sender, instance, **kwargs):
+    counters.add(Profile, instance.author_id, 'posts_count', -1)
+
+
+@receiver(post_save, sender=Comment)
+def count_new_comment(sender, instance, created, **kwargs):
+    if created:
+        counters.add(Post, instance.post_id, 'comments_count', 1)
+
+
+@receiver(post_delete, sender=Comment)
+def count_deleted_comment(sender, instance, **kwargs):
+    counters.add(Post, instance.post_id, 'comments_count', -1)
+
+
+@receiver(post_save, sender=Follow)
+@receiver(post_delete, sender=Follow)
+def invalidate_profiles(sender, instance, **kwargs):
+    # На страницах профилей выводятся счётчики подписок.
+    caching.bump(
+        caching.author_scope(instance.author_id),
+        caching.author_scope(instance.user_id))
+
+
+@receiver(post_save, sender=Follow)
+def count_new_follow(sender, instance, created, **kwargs):
+    if created:
+        counters.add(Profile, instance.author_id, 'followers_count', 1)
+        counters.add(Profile, instance.user_id, 'following_count', 1)
+
+
+@receiver(post_delete, sender=Follow)
+def count_deleted_follow(sender, instance, **kwargs):
+    counters.add(Profile, instance.author_id, 'followers_count', -1)
+    counters.add(Profile, instance.user_id, 'following_count', -1)
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+def index_post(sender, instance, **kwargs):
+    # Задача сама уберёт из индекса удалённый пост.
+    tasks.enqueue(
+        search.index_post, instance.pk, key=f'search:{instance.pk}')
+
+
+@receiver(post_save, sender=Post)
+def publish_new_post(sender, instance, created, raw=False, **kwargs):
+    # Шина в памяти процесса, поэтому не через очередь задач.
+    if created and not raw:
+        transaction.on_commit(lambda: live.publish_post(instance.pk))
@@ -0,0 +1,43 @@
+from django import template
+from django.core.cache.utils import make_template_fragment_key
+
+from posts.caching import get_or_compute
+
+register = template.Library()
+
+
+class FeedCacheNode(template.Node):
+
+    def __init__(self, nodelist, timeout, fragment_name, vary_on):
+        self.nodelist = nodelist
+        self.timeout = timeout
+        self.fragment_name = fragment_name
+        self.vary_on = vary_on
+
+    def render(self, context):
+        timeout = int(self.timeout.resolve(context))
+        key = make_template_fragment_key(
+            self.fragment_name,
+            [var.resolve(context) for var in self.vary_on])
+        return get_or_compute(
+            key, lambda: self.nodelist.render(context), timeout)
+
+
+@register.tag('feed_cache')
+def do_feed_cache(parser, token):
+    """Как {% cache %}, но фрагмент пересчитывает один запрос.
+
+    {% feed_cache timeout fragment_name key ... %}...{% endfeed_cache %}
+    """
+    nodelist = parser.parse(('endfeed_cache',))
+    parser.delete_first_token()
+    bits = token.split_contents()
+    if len(bits) < 3:
+        raise template.TemplateSyntaxError(
+            f'{bits[0]} принимает как минимум два аргумента.')
+    return FeedCacheNode(
+        nodelist,
+        parser.compile_filter(bits[1]),
+        bits[2],
+        [parser.compile_filter(bit) for bit in bits[3:]],
+    )
@@ -0,0 +1,56 @@
+from django import template
+from django.template.loader import render_to_string
+from django.urls import reverse
+from django.utils.formats import date_format
+from django.utils.html import format_html, linebreaks
+from django.utils.safestring import mark_safe
+from django.utils.timezone import template_localtime
+
+from core.metrics import profile_section
+
+register = template.Library()
+
+
+def render_post_card(post, view_link=False, view_profile_link=False):
+    """Карточка поста в ленте.
+
+    Карточка выводится по разу на каждый пост страницы, поэтому
+    собирается кодом, а не шаблоном: так в несколько раз быстрее,
+    чем {% include %} с поиском переменных в контексте на каждом шаге.
+    Шаблоном рендерится только картинка, и только если она есть.
+    """
+    author = ''
+    if view_profile_link:
+        author = format_html(
+            '<li>Автор:\n      <a href="{}">\n        {}\n      </a>\n'
+            '    </li>\n    ',
+            reverse('posts:profile', args=(post.author.username,)),
+            post.author.get_full_name(),
+        )
+    image = ''
+    if post.image:
+        image = render_to_string('includes/post_image.html', {'post': post})
+    group = ''
+    if view_link and post.group_id:
+        group = format_html(
+            '\n<a href="{}">все записи группы</a>\n',
+            reverse('posts:group_list', args=(post.group.slug,)),
+        )
+    return format_html(
+        '<article>\n  <ul>\n    {}<li>\n      Дата публикации: {}\n'
+        '    </li>\n  </ul>\n  {}\n  {}\n'
+        '  <a href="{}">подробная информация </a>\n</article>{}',
+        author,
+        date_format(template_localtime(post.pub_date), 'd E Y'),
+        image,
+        mark_safe(linebreaks(post.text, autoescape=True)),
+        reverse('posts:post_detail', args=(post.pk,)),
+        group,
+    )
+
+
+@register.simple_tag
+def post_card(post, view_link=False, view_profile_link=False):
+    """{% post_card post view_link=True view_profile_link=True %}"""
+    with profile_section('tag:post_card'):
+        return render_post_card(post, view_link, view_profile_link)
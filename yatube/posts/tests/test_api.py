@@ -0,0 +1,224 @@
+import json
+
+from django.core.cache import cache
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from posts.utils import encode_cursor
+
+from posts.models import Comment, Follow, Group, Post, User
+
+
+class ApiTests(TestCase):
+    """JSON API постов, комментариев, сообществ и подписок."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='auth')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='Тестовая группа', slug='test-slug', description='')
+        cls.posts = [
+            Post.objects.create(
+                author=cls.author, group=cls.group, text=f'post {number}')
+            for number in range(5)
+        ]
+
+    def setUp(self):
+        cache.clear()
+        self.guest_client = Client()
+        self.author_client = Client()
+        self.author_client.force_login(self.author)
+        self.reader_client = Client()
+        self.reader_client.force_login(self.reader)
+
+    def post_json(self, client, url, data, method='post'):
+        return getattr(client, method)(
+            url, json.dumps(data), content_type='application/json')
+
+    def test_cursor_pagination_walks_all_posts(self):
+        """Курсор обходит все посты по одному разу, от новых к старым."""
+        url = reverse('api:posts') + '?limit=2'
+        seen = []
+        while url:
+            data = self.guest_client.get(url).json()
+            seen += [post['id'] for post in data['results']]
+            url = data['next']
+        self.assertEqual(
+            seen, [post.pk for post in reversed(self.posts)])
+
+    def test_sparse_fields(self):
+        """Параметр fields оставляет в ответе только нужные поля."""
+        response = self.guest_client.get(
+            reverse('api:posts'), {'fields': 'id,author'})
+        self.assertEqual(
+            response.json()['results'][0],
+            {'id': self.posts[-1].pk, 'author': 'auth'})
+        response = self.guest_client.get(
+            reverse('api:posts'), {'fields': 'password'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_comments_count_only_in_detail(self):
+        """Число комментариев отдаёт пост, где оно сбрасывается с кешем."""
+        response = self.guest_client.get(
+            reverse('api:posts'), {'fields': 'id,comments_count'})
+        self.assertEqual(response.status_code, 400)
+        post = self.posts[0]
+        url = reverse('api:post_detail', args=(post.pk,))
+        self.assertEqual(self.guest_client.get(url).json()['comments_count'],
+                         0)
+        Comment.objects.create(post=post, author=self.reader, text='новый')
+        self.assertEqual(self.guest_client.get(url).json()['comments_count'],
+                         1)
+
+    def test_list_reads_only_requested_columns(self):
+        """Страница списка — один запрос только за нужными столбцами."""
+        url = reverse('api:group_posts', args=('test-slug',))
+        # Группа по слагу и страница постов.
+        with self.assertNumQueries(2) as queries:
+            self.guest_client.get(url, {'fields': 'id'})
+        self.assertNotIn('"text"', queries.captured_queries[-1]['sql'])
+
+    def test_conditional_get(self):
+        """Неизменённый список отвечает 304 на If-None-Match."""
+        response = self.reader_client.get(reverse('api:posts'))
+        response = self.reader_client.get(
+            reverse('api:posts'), HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+
+    def test_group_list_changes_with_new_group(self):
+        """Новое сообщество меняет ETag и кэш списка сообществ."""
+        url = reverse('api:groups')
+        etag = self.guest_client.get(url)['ETag']
+        Group.objects.create(title='Новая', slug='new', description='')
+        response = self.guest_client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(
+            'new', [group['slug'] for group in response.json()['results']])
+
+    def test_create_post(self):
+        """Авторизованный пользователь создаёт пост, гость — нет."""
+        url = reverse('api:posts')
+        data = {'text': 'из API', 'group': 'test-slug'}
+        response = self.post_json(self.guest_client, url, data)
+        self.assertEqual(response.status_code, 401)
+        response = self.post_json(self.reader_client, url, data)
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json()['author'], 'reader')
+        self.assertTrue(Post.objects.filter(
+            text='из API', group=self.group, author=self.reader).exists())
+
+    def test_create_post_errors(self):
+        """Ошибки формы и неизвестное сообщество возвращаются в JSON."""
+        url = reverse('api:posts')
+        response = self.post_json(self.reader_client, url, {'text': ''})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('text', response.json()['errors'])
+        response = self.post_json(
+            self.reader_client, url, {'text': 'x', 'group': 'missing'})
+        self.assertIn('group', response.json()['errors'])
+
+    def test_edit_post_only_by_author(self):
+        """PATCH меняет переданные поля и доступен только автору."""
+        post = self.posts[0]
+        url = reverse('api:post_detail', args=(post.pk,))
+        response = self.post_json(
+            self.reader_client, url, {'text': 'чужой'}, method='patch')
+        self.assertEqual(response.status_code, 403)
+        response = self.post_json(
+            self.author_client, url, {'text': 'новый'}, method='patch')
+        self.assertEqual(response.json()['text'], 'новый')
+        post.refresh_from_db()
+        self.assertEqual(post.group, self.group)
+
+    def test_edit_post_with_form_body(self):
+        """PATCH принимает тело формы, а другие типы тела отклоняет."""
+        post = self.posts[0]
+        url = reverse('api:post_detail', args=(post.pk,))
+        response = self.author_client.patch(
+            url, 'text=%D0%BD%D0%BE%D0%B2%D1%8B%D0%B9',
+            content_type='application/x-www-form-urlencoded')
+        self.assertEqual(response.json()['text'], 'новый')
+        response = self.author_client.patch(
+            url, 'text', content_type='text/plain')
+        self.assertEqual(response.status_code, 415)
+        post.refresh_from_db()
+        self.assertEqual(post.text, 'новый')
+
+    def test_comments(self):
+        """Комментарии добавляются и выводятся от старых к новым."""
+        post = self.posts[0]
+        url = reverse('api:comments', args=(post.pk,))
+        for text in ('первый', 'второй'):
+            response = self.post_json(self.reader_client, url, {'text': text})
+            self.assertEqual(response.status_code, 201)
+        results = self.guest_client.get(url).json()['results']
+        self.assertEqual(
+            [comment['text'] for comment in results], ['первый', 'второй'])
+        self.assertEqual(Comment.objects.filter(post=post).count(), 2)
+
+    def test_follow_and_feed(self):
+        """Подписка через API и лента подписок."""
+        url = reverse('api:profile_follow', args=('auth',))
+        response = self.reader_client.post(url)
+        self.assertEqual(response.status_code, 201)
+        self.assertTrue(Follow.objects.filter(
+            user=self.reader, author=self.author).exists())
+        profile = self.reader_client.get(
+            reverse('api:profile', args=('auth',))).json()
+        self.assertTrue(profile['following'])
+        feed = self.reader_client.get(reverse('api:follow')).json()
+        self.assertEqual(len(feed['results']), len(self.posts))
+        response = self.reader_client.delete(url)
+        self.assertEqual(response.status_code, 204)
+        self.assertFalse(Follow.objects.filter(
+            user=self.reader, author=self.author).exists())
+
+    @override_settings(FEED_FANOUT_LIMIT=1)
+    def test_celebrity_follow_feed(self):
+        """Лента с постами «знаменитости» обходится курсором целиком."""
+        Follow.objects.create(user=self.reader, author=self.author)
+        url = reverse('api:follow') + '?limit=2&fields=id'
+        seen = []
+        while url:
+            data = self.reader_client.get(url).json()
+            seen += [post['id'] for post in data['results']]
+            url = data['next']
+        self.assertEqual(seen, [post.pk for post in reversed(self.posts)])
+        response = self.reader_client.get(
+            reverse('api:follow'), {'cursor': 'garbage'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_bad_cursor_values(self):
+        """Курсор со значениями не тех типов даёт 400, а не 500."""
+        Follow.objects.create(user=self.reader, author=self.author)
+        bad = (['abc', 1], [{'a': 1}, 1], ['2020-01-01T00:00:00', 'zz'])
+        for url in (reverse('api:posts'), reverse('api:follow')):
+            for values in bad:
+                with self.subTest(url=url, values=values):
+                    response = self.reader_client.get(
+                        url, {'cursor': encode_cursor(values)})
+                    self.assertEqual(response.status_code, 400)
+                    with override_settings(FEED_FANOUT_LIMIT=1):
+                        cache.clear()
+                        response = self.reader_client.get(
+                            url, {'cursor': encode_cursor(values)})
+                        self.assertEqual(response.status_code, 400)
+
+    def test_follow_feed_requires_login(self):
+        response = self.guest_client.get(reverse('api:follow'))
+        self.assertEqual(response.status_code, 401)
+
+    def test_errors_are_json(self):
+        """Неизвестный объект, метод и курсор дают ответы в JSON."""
+        response = self.guest_client.get(
+            reverse('api:post_detail', args=(0,)))
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(response['Content-Type'], 'application/json')
+        response = self.author_client.delete(reverse('api:groups'))
+        self.assertEqual(response.status_code, 405)
+        self.assertEqual(response['Allow'], 'GET, HEAD')
+        response = self.guest_client.get(
+            reverse('api:posts'), {'cursor': 'garbage'})
+        self.assertEqual(response.status_code, 400)
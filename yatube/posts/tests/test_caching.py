@@ -0,0 +1,88 @@
+import threading
+import time
+
+from django.core.cache import cache
+from django.test import RequestFactory, SimpleTestCase, override_settings
+
+from posts.caching import LOCK_KEY, get_or_compute, page_position
+
+KEY = 'test:value'
+
+
+@override_settings(CACHE_LOCK_TIMEOUT=2, CACHE_LOCK_POLL_INTERVAL=0.01)
+class GetOrComputeTests(SimpleTestCase):
+    """Пересчёт кэшированных значений без лавины одинаковых запросов."""
+
+    def setUp(self):
+        cache.clear()
+        self.calls = 0
+
+    def compute(self, value='fresh', pause=0):
+        self.calls += 1
+        time.sleep(pause)
+        return value
+
+    def test_value_is_computed_once(self):
+        """Повторный запрос берёт значение из кэша."""
+        for _ in range(3):
+            self.assertEqual(get_or_compute(KEY, self.compute, 60), 'fresh')
+        self.assertEqual(self.calls, 1)
+
+    def test_concurrent_misses_compute_once(self):
+        """При одновременном промахе значение считает один поток."""
+        barrier = threading.Barrier(8)
+        results = []
+
+        def worker():
+            barrier.wait()
+            results.append(get_or_compute(
+                KEY, lambda: self.compute(pause=0.2), 60))
+
+        threads = [threading.Thread(target=worker) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(results, ['fresh'] * 8)
+        self.assertEqual(self.calls, 1)
+
+    def test_stale_value_while_another_process_recomputes(self):
+        """Пока значение пересчитывается, отдаётся старое."""
+        cache.set(KEY, ('stale', 100.0, time.time() + 1), 60)
+        cache.add(LOCK_KEY.format(KEY), 1)
+        self.assertEqual(get_or_compute(KEY, self.compute, 60), 'stale')
+        self.assertEqual(self.calls, 0)
+
+    def test_early_recompute_before_expiry(self):
+        """Дорогое значение пересчитывается заранее, до истечения TTL."""
+        cache.set(KEY, ('stale', 10 ** 6, time.time() + 1), 60)
+        self.assertEqual(get_or_compute(KEY, self.compute, 60), 'fresh')
+        self.assertIsNone(cache.get(LOCK_KEY.format(KEY)))
+
+    def test_failed_computation_releases_lock(self):
+        """Ошибка при расчёте не оставляет блокировку."""
+        with self.assertRaises(ZeroDivisionError):
+            get_or_compute(KEY, lambda: 1 / 0, 60)
+        self.assertIsNone(cache.get(LOCK_KEY.format(KEY)))
+
+
+@override_settings(POSTS_PAGINATOR_MAX_PAGES=100)
+class PagePositionTests(SimpleTestCase):
+    """Позиция страницы в ключе кэша не берётся из запроса как есть."""
+
+    def position(self, **params):
+        return page_position(RequestFactory().get('/', params))
+
+    def test_page_number_is_normalized(self):
+        for page, position in (('', '1'), ('abc', '1'), (' 3', '3'),
+                               ('0', 'last'), ('1000', 'last'),
+                               ('last', 'last')):
+            with self.subTest(page=page):
+                self.assertEqual(self.position(page=page), position)
+
+    def test_cursor_is_hashed(self):
+        cursor = 'x' * 1000
+        position = self.position(cursor=cursor, page='2')
+        self.assertNotIn(cursor, position)
+        self.assertLess(len(position), 50)
+        self.assertNotEqual(position, self.position(cursor=cursor))
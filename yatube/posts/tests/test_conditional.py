@@ -0,0 +1,123 @@
+from unittest import mock
+
+from django.core.cache import cache
+from django.test import Client, TestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from posts.models import Comment, Follow, Group, Post, User
+
+
+class ConditionalGetTests(TestCase):
+    """ETag, Last-Modified и кэш страниц для анонимов."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='auth')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.post = Post.objects.create(author=cls.author, text='test_post')
+        cls.url_detail = reverse('posts:post_detail', args=(cls.post.pk,))
+        cls.url_profile = reverse('posts:profile', args=('auth',))
+
+    def setUp(self):
+        cache.clear()
+        self.guest_client = Client()
+        self.reader_client = Client()
+        self.reader_client.force_login(self.reader)
+
+    def get_later(self, url, seconds=2):
+        """Страница, запрошенная через seconds после изменения."""
+        changed = 1_500_000_000.5
+        with mock.patch('time.time', return_value=changed):
+            # Версии областей заводятся по этим часам.
+            self.reader_client.get(url)
+        with mock.patch('time.time', return_value=changed + seconds):
+            return self.reader_client.get(url)
+
+    def test_unchanged_page_returns_304(self):
+        """Повторный запрос с If-None-Match получает 304 без рендера."""
+        response = self.get_later(self.url_detail)
+        self.assertIn('Last-Modified', response)
+        response = self.reader_client.get(
+            self.url_detail, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.templates, [])
+
+    def test_if_modified_since(self):
+        """Без ETag страница сверяется по Last-Modified."""
+        response = self.get_later(self.url_detail)
+        response = self.reader_client.get(
+            self.url_detail,
+            HTTP_IF_MODIFIED_SINCE=response['Last-Modified'])
+        self.assertEqual(response.status_code, 304)
+
+    def test_no_last_modified_within_second_of_change(self):
+        """Пока идёт секунда изменения, Last-Modified не выдаётся:
+        следующее изменение в ту же секунду не дало бы ответа 200."""
+        response = self.get_later(self.url_detail, seconds=0)
+        self.assertNotIn('Last-Modified', response)
+        self.assertIn('ETag', response)
+
+    def test_etag_changes_with_content(self):
+        """Новый комментарий меняет ETag страницы поста."""
+        etag = self.reader_client.get(self.url_detail)['ETag']
+        Comment.objects.create(
+            post=self.post, author=self.reader, text='comment')
+        response = self.reader_client.get(
+            self.url_detail, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'comment')
+
+    def test_etag_depends_on_viewer_and_follow_state(self):
+        """ETag профиля свой у каждого зрителя и меняется при подписке."""
+        guest_etag = self.guest_client.get(self.url_profile)['ETag']
+        reader_etag = self.reader_client.get(self.url_profile)['ETag']
+        self.assertNotEqual(guest_etag, reader_etag)
+        Follow.objects.create(user=self.reader, author=self.author)
+        response = self.reader_client.get(
+            self.url_profile, HTTP_IF_NONE_MATCH=reader_etag)
+        self.assertEqual(response.status_code, 200)
+
+    def test_etag_changes_with_group_and_author_names(self):
+        """Переименование сообщества или автора меняет ETag страниц
+        с его постами, а вход пользователя — нет."""
+        group = Group.objects.create(
+            title='Группа', slug='group', description='')
+        Post.objects.filter(pk=self.post.pk).update(group=group)
+        author = User.objects.get(pk=self.author.pk)
+        renames = (
+            (group, 'title', 'Новое название'),
+            (author, 'first_name', 'Лев'),
+        )
+        for obj, field, value in renames:
+            with self.subTest(field=field):
+                etag = self.guest_client.get(self.url_detail)['ETag']
+                setattr(obj, field, value)
+                obj.save()
+                response = self.guest_client.get(
+                    self.url_detail, HTTP_IF_NONE_MATCH=etag)
+                self.assertContains(response, value)
+
+        etag = self.guest_client.get(self.url_detail)['ETag']
+        author.last_login = timezone.now()
+        author.save(update_fields=['last_login'])
+        author.save()
+        response = self.guest_client.get(
+            self.url_detail, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+    def test_anonymous_pages_are_cached_whole(self):
+        """Анонимам страница отдаётся из кэша без рендера шаблонов."""
+        first = self.guest_client.get(self.url_detail)
+        second = self.guest_client.get(self.url_detail)
+        self.assertEqual(second.templates, [])
+        self.assertEqual(first.content, second.content)
+        self.assertIn('public', second['Cache-Control'])
+
+    def test_authenticated_pages_are_private(self):
+        """Страницы пользователей не кэшируются целиком и помечены private."""
+        self.reader_client.get(self.url_detail)
+        response = self.reader_client.get(self.url_detail)
+        self.assertNotEqual(response.templates, [])
+        self.assertIn('private', response['Cache-Control'])
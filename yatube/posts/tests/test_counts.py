@@ -0,0 +1,105 @@
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from posts import counts
+from posts.models import Group, Post, Profile, User
+from posts.utils import KeysetPaginator
+
+LIMIT = 20
+
+
+class CountTests(TestCase):
+    """Оценка числа записей вместо подсчёта для больших лент."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='auth')
+        cls.group = Group.objects.create(
+            title='Тестовая группа', slug='test-slug', description='')
+        Post.objects.bulk_create(
+            Post(author=cls.author, group=cls.group, text=f'пост {number}')
+            for number in range(LIMIT + 5))
+
+    def setUp(self):
+        cache.clear()
+
+    def test_small_estimate_is_verified(self):
+        """Оценка ниже порога перепроверяется точным подсчётом."""
+        # Счётчик отстал: посты созданы через bulk_create.
+        self.assertEqual(
+            counts.count(self.author.posts.all(), 100, estimate=1),
+            (LIMIT + 5, True))
+
+    def test_large_counter_skips_count(self):
+        """Большой счётчик автора заменяет COUNT(*)."""
+        Profile.objects.filter(user=self.author).update(posts_count=10_000)
+        with self.assertNumQueries(1):
+            self.assertEqual(
+                counts.count(self.author.posts.all(), LIMIT), (LIMIT, False))
+
+    def test_counter_only_for_single_condition(self):
+        provider = counts.CounterCount()
+        self.assertIsNone(provider.estimate(
+            self.author.posts.filter(group=self.group)))
+        self.assertIsNone(provider.estimate(Post.objects.all()))
+
+    def test_table_stats(self):
+        """После подсчёта большой таблицы берётся статистика ANALYZE."""
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+            cursor.execute(
+                "UPDATE sqlite_stat1 SET stat = '50000 1' "
+                "WHERE tbl = 'posts_post'")
+        queryset = Post.objects.all()
+        self.assertEqual(counts.count(queryset, LIMIT), (LIMIT, False))
+        self.assertEqual(
+            counts.TableStatsCount().estimate(queryset), 50_000)
+        with self.assertNumQueries(0):
+            self.assertEqual(counts.count(queryset, LIMIT), (LIMIT, False))
+
+    def test_table_stats_require_analyze(self):
+        provider = counts.TableStatsCount()
+        provider.remember(Post.objects.all(), LIMIT + 1)
+        self.assertIsNone(provider.estimate(Post.objects.all()))
+
+    def test_large_feed_is_remembered(self):
+        """Лента длиннее предела не пересчитывается до истечения кеша."""
+        queryset = self.group.posts.all()
+        self.assertEqual(counts.count(queryset, LIMIT), (LIMIT, False))
+        with self.assertNumQueries(0):
+            self.assertEqual(counts.count(queryset, LIMIT), (LIMIT, False))
+        # Небольшая лента не запоминается.
+        self.assertEqual(
+            counts.count(queryset, 100), (LIMIT + 5, True))
+        self.assertIsNone(counts.CachedCount().estimate(
+            queryset.filter(text='пост 1')))
+
+    @override_settings(POSTS_COUNT_EXACT_THRESHOLD=100_000)
+    def test_threshold(self):
+        """Оценка ниже заданного порога не принимается."""
+        Profile.objects.filter(user=self.author).update(posts_count=10_000)
+        self.assertEqual(
+            counts.count(self.author.posts.all(), LIMIT), (LIMIT, False))
+        self.assertEqual(
+            counts.count(self.author.posts.all(), 100), (LIMIT + 5, True))
+
+    def test_paginator_uses_estimate(self):
+        paginator = KeysetPaginator(
+            self.author.posts.all(), 10, max_pages=2, estimate=10_000)
+        with self.assertNumQueries(0):
+            self.assertEqual(paginator.num_pages, 2)
+        self.assertFalse(paginator.count_is_exact)
+
+    @override_settings(POSTS_PAGINATOR_MAX_PAGES=2)
+    def test_profile_header_counter(self):
+        """Шапка профиля и пагинатор берут один и тот же счётчик."""
+        Profile.objects.filter(user=self.author).update(posts_count=10_000)
+        response = self.client.get(
+            reverse('posts:profile', args=(self.author.username,)))
+        self.assertEqual(response.context['author'].profile.posts_count,
+                         10_000)
+        self.assertFalse(
+            response.context['page_obj'].paginator.count_is_exact)
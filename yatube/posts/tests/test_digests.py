@@ -0,0 +1,87 @@
+from unittest import mock
+
+from django.core import mail
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+
+from posts.digests import send_digests
+from posts.models import Digest, Follow, Post, User
+
+
+@override_settings(EMAIL_DIGEST_BATCH_SIZE=1, EMAIL_DIGEST_MAX_POSTS=2)
+class DigestTests(TestCase):
+    """Письма о новых постах подписок."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username='author')
+        cls.other = User.objects.create_user(username='other')
+        cls.readers = [
+            User.objects.create_user(
+                username=f'reader{i}', email=f'reader{i}@example.com')
+            for i in range(2)
+        ]
+        cls.silent = User.objects.create_user(username='silent')
+        for user in cls.readers + [cls.silent]:
+            Follow.objects.create(user=user, author=cls.author)
+        Post.objects.create(author=cls.author, text='Старый пост')
+
+    def publish(self, count, author=None):
+        for number in range(count):
+            Post.objects.create(
+                author=author or self.author, text=f'Новый пост {number}')
+
+    def test_first_run_skips_history(self):
+        """Первая рассылка не присылает уже опубликованные посты."""
+        digest = send_digests()
+        self.assertEqual(digest.sent, 0)
+        self.assertEqual(mail.outbox, [])
+
+    def test_one_letter_per_recipient(self):
+        """Каждый подписчик с адресом получает одно письмо на все посты."""
+        send_digests()
+        self.publish(3)
+        self.publish(1, author=self.other)
+        call_command('send_digests', stdout=mock.Mock())
+        self.assertEqual(
+            sorted(message.to[0] for message in mail.outbox),
+            ['reader0@example.com', 'reader1@example.com'])
+        body = mail.outbox[0].body
+        self.assertIn('Новый пост 2', body)
+        self.assertIn('Новый пост 1', body)
+        self.assertNotIn('Новый пост 0', body)
+        self.assertNotIn('Старый пост', body)
+        self.assertIn('И ещё постов: 1', body)
+
+        mail.outbox.clear()
+        self.assertEqual(send_digests().sent, 0)
+        self.assertEqual(mail.outbox, [])
+
+    def test_batches_share_connection(self):
+        """Все пачки отправляются через одно соединение."""
+        send_digests()
+        self.publish(1)
+        connection = mail.get_connection()
+        with mock.patch.object(
+                connection, 'open', wraps=connection.open) as opened:
+            send_digests(connection)
+        opened.assert_called_once()
+        self.assertEqual(len(mail.outbox), 2)
+
+    def test_interrupted_digest_resumes(self):
+        """Прерванная рассылка продолжается со следующего получателя."""
+        send_digests()
+        self.publish(1)
+        connection = mail.get_connection()
+        with mock.patch.object(
+                connection, 'send_messages',
+                side_effect=[1, OSError('обрыв')]):
+            with self.assertRaises(OSError):
+                send_digests(connection)
+        digest = Digest.objects.get(finished__isnull=True)
+        self.assertEqual(digest.last_user_id, self.readers[0].pk)
+
+        send_digests()
+        self.assertEqual(
+            [message.to[0] for message in mail.outbox],
+            ['reader1@example.com'])
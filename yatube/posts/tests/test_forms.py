@@ -148,6 +148,19 @@ class PostFormTests(PostBaseTestCase):
         self.assertTrue(post.image, 'posts/small.gif')
         self.assertTrue(post.author, self.post.author)
 
+    def test_edit_keeps_concurrent_counters(self):
+        """Правка не затирает счётчик и копии, изменённые параллельно."""
+        post = Post.objects.get(pk=self.post.pk)
+        Post.objects.filter(pk=post.pk).update(
+            comments_count=5, thumbnails='{"src": "copy.jpg"}')
+        form = PostForm({'text': 'Новый текст'}, instance=post)
+        self.assertTrue(form.is_valid())
+        form.save()
+        post.refresh_from_db()
+        self.assertEqual(post.text, 'Новый текст')
+        self.assertEqual(post.comments_count, 5)
+        self.assertEqual(post.rendition, {'src': 'copy.jpg'})
+
     def test_edit_post_not_author(self):
         """Валидная форма не редактирует запись, если пользователь не автор."""
         posts_count = Post.objects.count()
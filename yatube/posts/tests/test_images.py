@@ -0,0 +1,158 @@
+import shutil
+import tempfile
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase, override_settings
+from PIL import Image
+
+from posts import images
+from posts.forms import PostForm
+from posts.models import Post, User
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+ORIENTATION = 0x0112
+
+
+def jpeg(size=(1200, 800), color='red', exif=None):
+    buffer = BytesIO()
+    image = Image.new('RGB', size, color)
+    if exif is None:
+        image.save(buffer, 'JPEG')
+    else:
+        image.save(buffer, 'JPEG', exif=exif)
+    return SimpleUploadedFile(
+        'photo.jpg', buffer.getvalue(), content_type='image/jpeg')
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class ImagePipelineTests(TestCase):
+    """Копии картинок постов для srcset."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='auth')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def create_post(self, image):
+        return Post.objects.create(
+            author=self.author, text='test_post', image=image)
+
+    def test_renditions_for_every_width(self):
+        """Копии создаются для всех ширин в WebP и JPEG."""
+        post = self.create_post(jpeg())
+        rendition = images.generate_thumbnails(post.pk)
+        post.refresh_from_db()
+        self.assertEqual(post.rendition, rendition)
+        self.assertEqual(
+            (rendition['width'], rendition['height']),
+            images.target_size(max(settings.POST_IMAGE_WIDTHS)))
+        types = [source['type'] for source in rendition['sources']]
+        self.assertIn('image/webp', types)
+        for width in settings.POST_IMAGE_WIDTHS:
+            with self.subTest(width=width):
+                self.assertIn(f' {width}w', rendition['srcset'])
+
+    def test_narrow_image_is_not_upscaled(self):
+        """Копии не шире оригинала."""
+        post = self.create_post(jpeg(size=(500, 300)))
+        rendition = images.generate_thumbnails(post.pk)
+        self.assertEqual(rendition['width'], 320)
+
+    def test_exif_is_stripped(self):
+        """Метаданные EXIF не попадают в копии."""
+        exif = Image.Exif()
+        exif[ORIENTATION] = 1
+        post = self.create_post(jpeg(exif=exif.tobytes()))
+        rendition = images.generate_thumbnails(post.pk)
+        name = rendition['src'][len(settings.MEDIA_URL):]
+        with default_storage.open(name) as file, Image.open(file) as copy:
+            self.assertEqual(len(copy.getexif()), 0)
+
+    def test_identical_uploads_share_files(self):
+        """Одинаковые загрузки используют один файл и общие копии."""
+        first = self.create_post(jpeg())
+        images.generate_thumbnails(first.pk)
+        second = self.create_post(jpeg())
+        duplicate_name = second.image.name
+        images.generate_thumbnails(second.pk)
+        first.refresh_from_db()
+        second.refresh_from_db()
+        self.assertEqual(second.image.name, first.image.name)
+        self.assertEqual(second.rendition, first.rendition)
+        self.assertFalse(default_storage.exists(duplicate_name))
+
+    def test_duplicate_of_processed_post_only(self):
+        """Файл берётся у обработанного поста, чужой файл не удаляется."""
+        first = self.create_post(jpeg(color='teal'))
+        second = self.create_post(jpeg(color='teal'))
+        first_name = first.image.name
+        # Копия первого поста ещё не создана: второй сохраняет свой файл.
+        images.generate_thumbnails(second.pk)
+        second.refresh_from_db()
+        self.assertNotEqual(second.image.name, first_name)
+        # Другая запись ссылается на тот же файл, что и первый пост.
+        third = self.create_post(None)
+        Post.objects.filter(pk=third.pk).update(image=first_name)
+        images.generate_thumbnails(first.pk)
+        first.refresh_from_db()
+        self.assertEqual(first.image.name, second.image.name)
+        self.assertTrue(default_storage.exists(first_name))
+
+    @override_settings(POST_IMAGE_MAX_PIXELS=100 * 100)
+    def test_pixel_limit(self):
+        """Картинки больше лимита пикселей не принимаются и не декодируются."""
+        form = PostForm(data={'text': 'test_post'}, files={'image': jpeg()})
+        self.assertFalse(form.is_valid())
+        self.assertIn('image', form.errors)
+        post = self.create_post(jpeg(color='blue'))
+        with self.assertRaises(images.ImageTooLarge):
+            images.generate_thumbnails(post.pk)
+
+    def test_changed_image_drops_old_copies(self):
+        """Копии старой картинки не выводятся после её замены или удаления."""
+        post = self.create_post(jpeg())
+        images.generate_thumbnails(post.pk)
+        post.refresh_from_db()
+        post.image = jpeg(color='navy')
+        post.save()
+        post.refresh_from_db()
+        self.assertEqual(post.rendition, {})
+        images.generate_thumbnails(post.pk)
+        post.refresh_from_db()
+        post.image = None
+        post.save()
+        post.refresh_from_db()
+        self.assertEqual(post.rendition, {})
+
+    def test_changed_image_drops_old_hash(self):
+        """Замена картинки без формы не оставляет хеш старого файла."""
+        first = self.create_post(jpeg())
+        images.generate_thumbnails(first.pk)
+        first.refresh_from_db()
+        post = self.create_post(jpeg(color='olive'))
+        images.generate_thumbnails(post.pk)
+        post.refresh_from_db()
+        old_name = post.image.name
+        # Чужой хеш не даёт выдать копии и файл другого поста.
+        Post.objects.filter(pk=post.pk).update(image_hash=first.image_hash)
+        post.refresh_from_db()
+        post.image = jpeg(color='navy')
+        post.save()
+        post.refresh_from_db()
+        self.assertEqual(post.image_hash, '')
+        new_name = post.image.name
+        rendition = images.generate_thumbnails(post.pk)
+        post.refresh_from_db()
+        self.assertNotEqual(rendition, first.rendition)
+        self.assertEqual(post.image.name, new_name)
+        self.assertNotEqual(new_name, old_name)
+        self.assertNotEqual(post.image_hash, first.image_hash)
@@ -0,0 +1,161 @@
+import json
+
+from django.core.cache import cache
+from django.test import (Client, TestCase, TransactionTestCase,
+                         override_settings)
+from django.urls import reverse
+
+from posts import live
+from posts.models import Follow, Group, Post, User
+
+
+def event_data(frame):
+    line = next(
+        line for line in frame.decode().splitlines()
+        if line.startswith('data: '))
+    return json.loads(line[len('data: '):])
+
+
+class BusTests(TestCase):
+    """Шина подписок в памяти процесса."""
+
+    def tearDown(self):
+        for subscription in list(live.bus.subscriptions):
+            live.bus.unsubscribe(subscription)
+
+    def test_one_event_per_subscriber(self):
+        """Подписчик нескольких каналов получает событие один раз."""
+        both = live.bus.subscribe(['a', 'b'])
+        other = live.bus.subscribe(['c'])
+        self.assertEqual(live.bus.publish(['a', 'b'], 'event'), 1)
+        self.assertEqual(both.get(0), 'event')
+        self.assertIsNone(both.get(0))
+        self.assertIsNone(other.get(0))
+
+    @override_settings(LIVE_QUEUE_SIZE=1)
+    def test_slow_subscriber_is_dropped(self):
+        """Переполненная очередь закрывает подписку."""
+        subscription = live.bus.subscribe(['a'])
+        live.bus.publish(['a'], 1)
+        live.bus.publish(['a'], 2)
+        self.assertTrue(subscription.closed)
+        self.assertEqual(len(live.bus), 0)
+        self.assertEqual(live.bus.channels, {})
+
+
+@override_settings(
+    LIVE_UPDATES=True, LIVE_KEEPALIVE=0.01, LIVE_MAX_DURATION=1)
+class LiveFeedTests(TestCase):
+    """Поток новых постов для лент сайта, сообщества и подписок."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='auth')
+        cls.other = User.objects.create_user(username='other')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='Тестовая группа', slug='test-slug', description='')
+        Follow.objects.create(user=cls.reader, author=cls.author)
+
+    def setUp(self):
+        self.client = Client()
+        self.reader_client = Client()
+        self.reader_client.force_login(self.reader)
+
+    def open_stream(self, client, query='', **extra):
+        response = client.get(reverse('posts:live') + query, **extra)
+        self.addCleanup(response.close)
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        frames = iter(response.streaming_content)
+        self.assertTrue(next(frames).startswith(b'retry:'))
+        return frames
+
+    def next_post(self, frames):
+        for frame in frames:
+            if not frame.startswith(b':'):
+                return event_data(frame)
+        return None
+
+    def test_new_post_reaches_matching_streams(self):
+        """Пост попадает в ленты сайта, своего сообщества и подписок."""
+        site = self.open_stream(self.client)
+        group = self.open_stream(self.client, '?group=test-slug')
+        follow = self.open_stream(self.reader_client, '?follow=1')
+        post = Post.objects.create(
+            author=self.author, group=self.group, text='новый пост')
+        self.assertEqual(live.publish_post(post.pk), 3)
+        for frames in (site, group, follow):
+            data = self.next_post(frames)
+            self.assertEqual(data['id'], post.pk)
+            self.assertEqual(data['author'], 'auth')
+            self.assertEqual(data['group'], 'test-slug')
+
+    def test_unrelated_stream_gets_nothing(self):
+        """Пост чужого автора без сообщества не уходит в эти ленты."""
+        self.open_stream(self.client, '?group=test-slug')
+        self.open_stream(self.reader_client, '?follow=1')
+        post = Post.objects.create(author=self.other, text='мимо')
+        self.assertEqual(live.publish_post(post.pk), 0)
+
+    def test_reconnect_sends_missed_posts(self):
+        """По Last-Event-ID приходят посты, пропущенные без соединения."""
+        first = Post.objects.create(author=self.author, text='первый')
+        missed = [
+            Post.objects.create(author=self.author, text=f'пост {number}')
+            for number in range(2)
+        ]
+        frames = self.open_stream(
+            self.client, HTTP_LAST_EVENT_ID=str(first.pk))
+        self.assertEqual(
+            [self.next_post(frames)['id'] for _ in missed],
+            [post.pk for post in missed])
+
+    def test_stream_ends_and_unsubscribes(self):
+        """Поток закрывается после LIVE_MAX_DURATION и снимает подписку."""
+        with override_settings(LIVE_MAX_DURATION=0):
+            frames = self.open_stream(self.client)
+            self.assertEqual(list(frames), [])
+        self.assertEqual(len(live.bus), 0)
+
+    def test_closed_before_start_leaves_no_subscription(self):
+        """Ответ, закрытый до первого кадра, не оставляет подписку."""
+        response = self.client.get(reverse('posts:live'))
+        response.close()
+        self.assertEqual(len(live.bus), 0)
+
+    @override_settings(LIVE_MAX_SUBSCRIBERS=1)
+    def test_subscriber_limit(self):
+        self.open_stream(self.client)
+        response = self.client.get(reverse('posts:live'))
+        self.assertEqual(response.status_code, 503)
+
+    def test_only_under_asgi(self):
+        """Без LIVE_UPDATES страницы не подключаются к потоку."""
+        self.assertContains(self.client.get(reverse('posts:index')),
+                            'EventSource')
+        with override_settings(LIVE_UPDATES=False):
+            # Настройка не меняется на ходу и в ETag страниц не входит.
+            cache.clear()
+            self.assertNotContains(self.client.get(reverse('posts:index')),
+                                   'EventSource')
+            response = self.client.get(reverse('posts:live'))
+            self.assertEqual(response.status_code, 404)
+
+    def test_unknown_group(self):
+        response = self.client.get(reverse('posts:live'), {'group': 'nope'})
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(len(live.bus), 0)
+
+
+class PublishOnCommitTests(TransactionTestCase):
+    """Пост публикуется в шину после фиксации транзакции."""
+
+    def test_post_published_after_commit(self):
+        author = User.objects.create_user(username='auth')
+        subscription = live.bus.subscribe([live.ALL])
+        self.addCleanup(live.bus.unsubscribe, subscription)
+        post = Post.objects.create(author=author, text='новый пост')
+        post_id, frame = subscription.get(1)
+        self.assertEqual(post_id, post.pk)
+        self.assertEqual(event_data(frame)['text'], 'новый пост')
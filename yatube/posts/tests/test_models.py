@@ -1,6 +1,9 @@
+from io import StringIO
+
+from django.core.management import call_command
 from django.test import TestCase
 
-from posts.models import Group, Post, User
+from posts.models import Comment, Follow, Group, Post, Profile, User
 
 
 class PostModelTest(TestCase):
@@ -55,3 +58,41 @@ class PostModelTest(TestCase):
             with self.subTest(field=field):
                 self.assertEqual(
                     self.post._meta.get_field(field).help_text, expected_value)
+
+
+class CountersTest(TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='auth')
+        cls.reader = User.objects.create_user(username='reader')
+
+    def test_counters_follow_changes(self):
+        """Счётчики меняются при создании и удалении объектов."""
+        post = Post.objects.create(author=self.author, text='test')
+        follow = Follow.objects.create(user=self.reader, author=self.author)
+        Comment.objects.create(post=post, author=self.reader, text='test')
+        self.author.profile.refresh_from_db()
+        self.reader.profile.refresh_from_db()
+        post.refresh_from_db()
+        self.assertEqual(self.author.profile.posts_count, 1)
+        self.assertEqual(self.author.profile.followers_count, 1)
+        self.assertEqual(self.reader.profile.following_count, 1)
+        self.assertEqual(post.comments_count, 1)
+
+        follow.delete()
+        post.delete()
+        self.author.profile.refresh_from_db()
+        self.assertEqual(self.author.profile.posts_count, 0)
+        self.assertEqual(self.author.profile.followers_count, 0)
+
+    def test_reconcile_fixes_drift(self):
+        """reconcile_counters выравнивает счётчики после bulk_create."""
+        Post.objects.bulk_create(
+            Post(author=self.author, text=f'text{x}') for x in range(3))
+        Profile.objects.filter(user=self.reader).delete()
+        call_command('reconcile_counters', stdout=StringIO())
+        self.assertEqual(
+            Profile.objects.get(user=self.author).posts_count, 3)
+        self.assertTrue(Profile.objects.filter(user=self.reader).exists())
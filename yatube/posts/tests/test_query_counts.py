@@ -0,0 +1,74 @@
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from posts.models import Comment, Follow, Group, Post, User
+
+# Бюджет запросов на страницу, включая сессию и пользователя.
+QUERY_BUDGETS = {
+    'posts:index': 4,
+    'posts:group_list': 5,
+    'posts:profile': 6,
+    'posts:post_detail': 5,
+    'posts:follow_index': 5,
+}
+
+
+class QueryCountTests(TestCase):
+    """Число запросов не зависит от размера страницы и комментариев."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='auth')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='test_group',
+            slug='test_slug',
+            description='test_description',
+        )
+        Follow.objects.create(user=cls.reader, author=cls.author)
+        cls.post = Post.objects.create(
+            author=cls.author, group=cls.group, text='test_post')
+        cls.urls = {
+            'posts:index': reverse('posts:index'),
+            'posts:group_list': reverse(
+                'posts:group_list', args=(cls.group.slug,)),
+            'posts:profile': reverse(
+                'posts:profile', args=(cls.author.username,)),
+            'posts:post_detail': reverse(
+                'posts:post_detail', args=(cls.post.pk,)),
+            'posts:follow_index': reverse('posts:follow_index'),
+        }
+
+    def setUp(self):
+        self.client = Client()
+        self.client.force_login(self.reader)
+
+    def count_queries(self, url):
+        cache.clear()
+        with CaptureQueriesContext(connection) as context:
+            self.client.get(url)
+        return len(context)
+
+    def add_content(self, number):
+        for index in range(number):
+            commenter = User.objects.create_user(username=f'user{index}')
+            Post.objects.create(
+                author=self.author, group=self.group, text=f'post{index}')
+            Comment.objects.create(
+                post=self.post, author=commenter, text=f'comment{index}')
+
+    def test_queries_do_not_grow_with_content(self):
+        """Запросов столько же на странице с одним и с десятью постами."""
+        before = {
+            name: self.count_queries(url) for name, url in self.urls.items()
+        }
+        self.add_content(10)
+        for name, url in self.urls.items():
+            with self.subTest(view=name):
+                queries = self.count_queries(url)
+                self.assertEqual(queries, before[name])
+                self.assertLessEqual(queries, QUERY_BUDGETS[name])
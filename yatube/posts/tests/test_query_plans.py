@@ -0,0 +1,110 @@
+import re
+from contextlib import contextmanager
+
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from posts import feeds
+from posts.models import Comment, Follow, Group, Post, User
+
+# Обход таблицы или всего индекса: у поиска по индексу в плане
+# есть условие в скобках, и строка начинается с SEARCH.
+FULL_SCAN = re.compile(
+    r'^SCAN (TABLE )?(?P<table>\w+)( AS \w+)?'
+    r'( USING (COVERING )?INDEX \w+)?$')
+# Без условий и с LIMIT обход останавливается на первых строках.
+HEAD_ONLY = re.compile(r'^(?!.*\b(WHERE|GROUP BY)\b).*\bLIMIT\b', re.S)
+TEMP_SORT = 'USE TEMP B-TREE'
+
+
+@contextmanager
+def capture_selects(queries):
+    """Собирает SQL и параметры всех SELECT, выполненных внутри блока."""
+
+    def wrapper(execute, sql, params, many, context):
+        if sql.lstrip().upper().startswith('SELECT'):
+            queries.append((sql, params))
+        return execute(sql, params, many, context)
+
+    with connection.execute_wrapper(wrapper):
+        yield
+
+
+class QueryPlanTests(TestCase):
+    """Запросы страниц с постами не должны сканировать таблицы целиком."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='auth')
+        cls.follower = User.objects.create_user(username='follower')
+        cls.group = Group.objects.create(
+            title='test_group',
+            slug='test_slug',
+            description='test_description',
+        )
+        Follow.objects.create(user=cls.follower, author=cls.author)
+        for number in range(15):
+            post = Post.objects.create(
+                author=cls.author, group=cls.group, text=f'post{number}')
+        Comment.objects.create(post=post, author=cls.follower, text='test')
+        cls.post = post
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+        self.client.force_login(self.follower)
+
+    def plan_problems(self, sql, params):
+        with connection.cursor() as cursor:
+            cursor.execute('EXPLAIN QUERY PLAN ' + sql, params)
+            details = [row[-1] for row in cursor.fetchall()]
+        problems = []
+        head_only = HEAD_ONLY.match(sql)
+        for detail in details:
+            match = FULL_SCAN.match(detail)
+            if (match and match.group('table').startswith('posts_')
+                    and not head_only):
+                problems.append(detail)
+            if detail.startswith(TEMP_SORT):
+                problems.append(detail)
+        return problems
+
+    def assert_indexed(self, url):
+        # Список «знаменитостей» — агрегат по всем подпискам, который
+        # считается раз в FEED_CELEBRITIES_CACHE_TIMEOUT, а не на запрос.
+        feeds.celebrity_ids()
+        queries = []
+        with capture_selects(queries):
+            response = self.client.get(url)
+        for sql, params in queries:
+            if 'posts_' not in sql:
+                continue
+            with self.subTest(url=url, sql=sql):
+                self.assertEqual(self.plan_problems(sql, params), [])
+        return response
+
+    def test_feed_pages_use_indexes(self):
+        """Ленты и их следующие страницы читаются по индексам."""
+        urls = [
+            reverse('posts:index'),
+            reverse('posts:group_list', args=(self.group.slug,)),
+            reverse('posts:profile', args=(self.author.username,)),
+            reverse('posts:follow_index'),
+        ]
+        for url in urls:
+            response = self.assert_indexed(url)
+            next_cursor = response.context['page_obj'].next_cursor
+            self.assert_indexed(f'{url}?cursor={next_cursor}')
+            self.assert_indexed(f'{url}?page=2')
+
+    @override_settings(FEED_FANOUT_LIMIT=1)
+    def test_celebrity_follow_feed_uses_indexes(self):
+        """Лента с подмешиванием постов при чтении тоже идёт по индексу."""
+        self.assert_indexed(reverse('posts:follow_index'))
+
+    def test_post_detail_uses_indexes(self):
+        """Пост и комментарии к нему читаются по индексам."""
+        self.assert_indexed(reverse('posts:post_detail', args=(self.post.pk,)))
@@ -0,0 +1,69 @@
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from posts.models import Post, User
+
+
+class SearchTests(TestCase):
+    """Полнотекстовый поиск по постам."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='auth')
+        cls.matching = [
+            Post.objects.create(
+                author=cls.author, text=f'Пост про котиков номер {number}')
+            for number in range(12)
+        ]
+        cls.other = Post.objects.create(
+            author=cls.author, text='Пост про собак')
+        cls.url = reverse('posts:search')
+
+    def setUp(self):
+        self.client = Client()
+
+    def search(self, query, cursor=None):
+        params = {'q': query}
+        if cursor:
+            params['cursor'] = cursor
+        return self.client.get(self.url, params).context
+
+    def test_search_finds_posts_by_word_prefix(self):
+        """Поиск находит посты по началу слова без учёта регистра."""
+        context = self.search('КОТИК')
+        self.assertNotIn(self.other, context['posts'])
+        self.assertEqual(len(context['posts']), 10)
+
+    def test_search_pages_by_cursor(self):
+        """Курсор продолжает выдачу без повторов и пропусков."""
+        first = self.search('котиков')
+        second = self.search('котиков', first['next_cursor'])
+        self.assertIsNone(second['next_cursor'])
+        self.assertCountEqual(
+            first['posts'] + second['posts'], self.matching)
+
+    def test_index_follows_edits_and_deletes(self):
+        """Изменённый и удалённый пост сразу отражаются в поиске."""
+        post = Post.objects.get(pk=self.matching[0].pk)
+        post.text = 'Пост про хомяков'
+        post.save()
+        self.assertEqual(self.search('хомяков')['posts'], [post])
+        post.delete()
+        self.assertEqual(self.search('хомяков')['posts'], [])
+
+    def test_query_syntax_is_escaped(self):
+        """Служебные символы запроса не ломают поиск."""
+        for query in ('"', 'котиков OR', 'NEAR(котиков', '*', ''):
+            with self.subTest(query=query):
+                response = self.client.get(self.url, {'q': query})
+                self.assertEqual(response.status_code, 200)
+
+    @override_settings(
+        POSTS_SEARCH_BACKEND='posts.search.SimpleSearchBackend')
+    def test_simple_backend(self):
+        """Запасной бэкенд ищет подстрокой и тоже листает по курсору."""
+        first = self.search('котиков')
+        second = self.search('котиков', first['next_cursor'])
+        self.assertCountEqual(
+            first['posts'] + second['posts'], self.matching)
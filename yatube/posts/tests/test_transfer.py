@@ -0,0 +1,163 @@
+import os
+import shutil
+import tempfile
+from datetime import datetime, timezone
+from io import StringIO
+from unittest import mock
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management import CommandError, call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from posts import feeds, images
+from posts.models import FeedEntry, Follow, Group, Post, Profile, User
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class TransferTests(TestCase):
+    """Выгрузка и загрузка постов командами export_posts/import_posts."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='Группа', slug='group', description='Описание')
+        Follow.objects.create(user=cls.reader, author=cls.author)
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+
+    def path(self, name):
+        return os.path.join(self.directory, name)
+
+    def write(self, name, content):
+        with open(self.path(name), 'w', encoding='utf-8') as file:
+            file.write(content)
+        return self.path(name)
+
+    def search(self, query):
+        response = self.client.get(reverse('posts:search'), {'q': query})
+        return response.context['posts']
+
+    def import_posts(self, *args):
+        call_command('import_posts', *args, stdout=StringIO(),
+                     stderr=StringIO())
+
+    def test_round_trip(self):
+        """Выгруженные посты загружаются обратно с прежними полями."""
+        Post.objects.create(author=self.author, text='Первый')
+        Post.objects.create(
+            author=self.author, text='Второй,\nс "кавычками"',
+            group=self.group)
+        expected = list(Post.objects.order_by('pk').values_list(
+            'text', 'pub_date', 'author', 'group'))
+        for name in ('posts.ndjson', 'posts.csv'):
+            with self.subTest(name=name):
+                call_command('export_posts', self.path(name),
+                             stderr=StringIO())
+                Post.objects.all().delete()
+                self.import_posts(self.path(name))
+                self.assertEqual(
+                    list(Post.objects.order_by('pk').values_list(
+                        'text', 'pub_date', 'author', 'group')),
+                    expected)
+
+    def test_pub_date_is_kept(self):
+        """Дата публикации берётся из файла, а не ставится текущая."""
+        path = self.write('posts.ndjson', (
+            '{"text": "Старый пост", "author": "author", '
+            '"group": "group", "pub_date": "2015-06-01T12:00:00+00:00"}\n'))
+        self.import_posts(path)
+        post = Post.objects.get()
+        self.assertEqual(
+            post.pub_date, datetime(2015, 6, 1, 12, tzinfo=timezone.utc))
+        self.assertEqual(post.group, self.group)
+
+    def test_derived_data_is_updated(self):
+        """После загрузки обновлены ленты подписчиков и счётчики."""
+        path = self.write('posts.csv', (
+            'text,pub_date,author,group,image\n'
+            'Пост,2020-01-01T00:00:00,author,,\n'))
+        self.import_posts(path)
+        post = Post.objects.get()
+        self.assertTrue(FeedEntry.objects.filter(
+            user=self.reader, post=post).exists())
+        self.assertEqual(
+            Profile.objects.get(user=self.author).posts_count, 1)
+        self.assertEqual(self.search('Пост'), [post])
+
+    def test_derived_data_only_for_imported_posts(self):
+        """Ленты, индекс и копии картинок обновляются только для
+        загруженных постов, а уже разложенные записи не мешают."""
+        old = Post.objects.create(author=self.author, text='Старый')
+        default_storage.save('posts/imported.gif', ContentFile(b'GIF89a'))
+        path = self.write('posts.ndjson', (
+            '{"text": "Новый", "author": "author", '
+            '"image": "posts/imported.gif"}\n'))
+        with mock.patch.object(images, 'schedule_thumbnails') as schedule:
+            self.import_posts(path)
+        new = Post.objects.get(text='Новый')
+        schedule.assert_called_once_with(new)
+        self.assertEqual(
+            FeedEntry.objects.filter(user=self.reader).count(), 2)
+        # Повторная раскладка тех же постов ничего не дублирует.
+        feeds.fan_out_bulk()
+        self.assertEqual(
+            FeedEntry.objects.filter(user=self.reader).count(), 2)
+        self.assertEqual(self.search('Новый'), [new])
+        self.assertEqual(self.search('Старый'), [old])
+
+    def test_unknown_author(self):
+        """Неизвестный автор — ошибка, если не разрешено его создать."""
+        path = self.write(
+            'posts.ndjson', '{"text": "Пост", "author": "stranger"}\n')
+        with self.assertRaisesMessage(CommandError, 'stranger'):
+            self.import_posts(path)
+        self.assertFalse(Post.objects.exists())
+
+        self.import_posts(path, '--create-missing')
+        stranger = User.objects.get(username='stranger')
+        self.assertFalse(stranger.has_usable_password())
+        self.assertEqual(Profile.objects.get(user=stranger).posts_count, 1)
+
+    def test_images_by_path(self):
+        """Картинки копируются в хранилище из каталога images-dir."""
+        images_dir = self.path('media')
+        os.makedirs(os.path.join(images_dir, 'posts'))
+        with open(os.path.join(images_dir, 'posts', 'a.gif'), 'wb') as file:
+            file.write(b'GIF89a')
+        path = self.write('posts.ndjson', (
+            '{"text": "С картинкой", "author": "author", '
+            '"image": "posts/a.gif"}\n'
+            '{"text": "Без файла", "author": "author", '
+            '"image": "posts/missing.gif"}\n'
+            '{"text": "Чужой путь", "author": "author", '
+            '"image": "../../etc/passwd"}\n'))
+        with self.assertRaisesMessage(CommandError, 'Запись 3'):
+            self.import_posts(path, '--images-dir', images_dir)
+        self.assertEqual(
+            dict(Post.objects.values_list('text', 'image')), {})
+
+        path = self.write('posts.ndjson', (
+            '{"text": "С картинкой", "author": "author", '
+            '"image": "posts/a.gif"}\n'
+            '{"text": "Без файла", "author": "author", '
+            '"image": "posts/missing.gif"}\n'))
+        self.import_posts(path, '--images-dir', images_dir)
+        self.assertEqual(
+            dict(Post.objects.values_list('text', 'image')),
+            {'С картинкой': 'posts/a.gif', 'Без файла': ''})
+        self.assertTrue(default_storage.exists('posts/a.gif'))
@@ -0,0 +1,88 @@
+import hashlib
+import shutil
+import tempfile
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+from PIL import Image
+
+from posts.models import Post, User
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+
+def image_bytes(fmt='PNG', size=(50, 50)):
+    buffer = BytesIO()
+    Image.new('RGB', size, 'red').save(buffer, fmt)
+    return buffer.getvalue()
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class StreamingUploadTests(TestCase):
+    """Картинки постов принимаются потоково и проверяются по заголовку."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='auth')
+        cls.url = reverse('posts:post_create')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        self.client = Client()
+        self.client.force_login(self.author)
+
+    def upload(self, content, name='image.png', client=None):
+        return (client or self.client).post(self.url, {
+            'text': 'test_post',
+            'image': SimpleUploadedFile(name, content),
+        })
+
+    def test_hash_is_computed_while_streaming(self):
+        """SHA-256 картинки считается при загрузке и сохраняется в посте."""
+        content = image_bytes()
+        self.upload(content)
+        post = Post.objects.get()
+        self.assertEqual(
+            post.image_hash, hashlib.sha256(content).hexdigest())
+
+    def test_invalid_uploads_are_rejected(self):
+        """Неподходящие файлы отклоняются с ошибкой в форме."""
+        cases = {
+            'not_image': (b'plain text' * 10, 'file.png'),
+            'unsupported_format': (image_bytes('BMP'), 'image.bmp'),
+            'empty': (b'', 'image.png'),
+        }
+        for case, (content, name) in cases.items():
+            with self.subTest(case=case):
+                response = self.upload(content, name)
+                self.assertIn('image', response.context['form'].errors)
+        self.assertFalse(Post.objects.exists())
+
+    @override_settings(POST_IMAGE_MAX_UPLOAD_SIZE=1024)
+    def test_size_limit(self):
+        """Файл больше лимита отбрасывается во время загрузки."""
+        response = self.upload(image_bytes(size=(500, 500)) + b'\0' * 2048)
+        self.assertIn('image', response.context['form'].errors)
+        self.assertFalse(Post.objects.exists())
+
+    @override_settings(POST_IMAGE_MAX_PIXELS=100 * 100)
+    def test_pixel_limit(self):
+        """Разрешение проверяется по заголовку."""
+        response = self.upload(image_bytes(size=(200, 200)))
+        self.assertIn('image', response.context['form'].errors)
+
+    def test_csrf_is_still_checked(self):
+        """Замена обработчиков загрузки не отключает проверку CSRF."""
+        client = Client(enforce_csrf_checks=True)
+        client.force_login(self.author)
+        response = self.upload(image_bytes(), client=client)
+        self.assertTemplateUsed(response, 'core/403csrf.html')
+        self.assertFalse(Post.objects.exists())
@@ -102,7 +102,7 @@ class PostsURLTests(TestCase):
     def test_cache_index_page(self):
         """Проверка работы cache на главной странице"""
         response_before_cache = self.guest_client.get(self.url_index).content
-        self.post.delete()
+        Post.objects.filter(pk=self.post.pk).update(text='changed_post')
         response_after_cache = self.guest_client.get(self.url_index).content
         self.assertEqual(response_before_cache, response_after_cache)
 
@@ -110,3 +110,19 @@ class PostsURLTests(TestCase):
         response_after_clear_cache = self.guest_client.get(
             self.url_index).content
         self.assertNotEqual(response_before_cache, response_after_clear_cache)
+
+    def test_cache_index_page_invalidated_on_delete(self):
+        """Удаление поста сразу сбрасывает кэш главной страницы"""
+        response_before_delete = self.guest_client.get(self.url_index).content
+        self.post.delete()
+        response_after_delete = self.guest_client.get(self.url_index).content
+        self.assertNotEqual(response_before_delete, response_after_delete)
+
+    def test_cache_pages_are_separate(self):
+        """Разные страницы ленты кэшируются отдельно"""
+        Post.objects.bulk_create(
+            Post(author=self.author, text=f'text{x}') for x in range(10))
+        first_page = self.guest_client.get(self.url_index).content
+        second_page = self.guest_client.get(self.url_index + '?page=2')
+        self.assertNotEqual(first_page, second_page.content)
+        self.assertContains(second_page, 'test_post')
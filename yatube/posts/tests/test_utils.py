@@ -0,0 +1,62 @@
+from datetime import datetime, timezone
+
+from django.core.paginator import Paginator
+from django.test import SimpleTestCase, TestCase
+
+from posts.models import Post, User
+from posts.utils import ELLIPSIS as _
+from posts.utils import bulk_insert, elided_page_range
+
+
+class ElidedPageRangeTests(SimpleTestCase):
+    """Окно номеров страниц вокруг текущей."""
+
+    def page_range(self, number, pages, exact=True, **kwargs):
+        paginator = Paginator(range(pages * 10), 10)
+        paginator.count_is_exact = exact
+        return elided_page_range(paginator.page(number), **kwargs)
+
+    def test_short_feed_shows_every_page(self):
+        self.assertEqual(self.page_range(2, 5), [1, 2, 3, 4, 5])
+
+    def test_window_with_ellipses(self):
+        self.assertEqual(
+            self.page_range(50, 100), [1, _, 48, 49, 50, 51, 52, _, 100])
+        self.assertEqual(
+            self.page_range(1, 100), [1, 2, 3, _, 100])
+        self.assertEqual(
+            self.page_range(100, 100, on_each_side=1, on_ends=2),
+            [1, 2, _, 99, 100])
+
+    def test_single_gap_shows_number(self):
+        """Вместо пропуска одной страницы выводится её номер."""
+        self.assertEqual(
+            self.page_range(5, 10), [1, 2, 3, 4, 5, 6, 7, _, 10])
+
+    def test_length_does_not_depend_on_feed(self):
+        lengths = {
+            len(self.page_range(500, pages)) for pages in (1000, 100_000)}
+        self.assertEqual(lengths, {9})
+
+    def test_estimated_count_hides_last_page(self):
+        """Пока число страниц неизвестно, последней в списке нет."""
+        self.assertEqual(
+            self.page_range(50, 100, exact=False),
+            [1, _, 48, 49, 50, 51, 52, _])
+
+
+class BulkInsertTests(TestCase):
+    """Вставка пачкой с заданной датой публикации."""
+
+    def test_pub_date_is_kept(self):
+        author = User.objects.create_user(username='auth')
+        pub_date = datetime(2015, 6, 1, 12, tzinfo=timezone.utc)
+        bulk_insert(Post, [
+            Post(author=author, text=f'пост {number}', pub_date=pub_date)
+            for number in range(3)])
+        self.assertEqual(
+            set(Post.objects.values_list('pub_date', flat=True)), {pub_date})
+        # Поле модели не меняется: обычное сохранение ставит текущее время.
+        post = Post.objects.create(
+            author=author, text='новый', pub_date=pub_date)
+        self.assertNotEqual(post.pub_date, pub_date)
@@ -2,12 +2,14 @@ import tempfile
 
 from django import forms
 from django.conf import settings
+from django.core.cache import cache
 from django.core.files.uploadedfile import SimpleUploadedFile
-from django.test import Client, TestCase
+from django.test import Client, TestCase, override_settings
 from django.urls import reverse
 
+from posts import images
 from posts.forms import PostForm
-from posts.models import Comment, Follow, Group, Post, User
+from posts.models import Comment, FeedEntry, Follow, Group, Post, User
 from yatube.settings import POSTS_PER_PAGE
 
 TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
@@ -69,6 +71,7 @@ class ViewsTestCase(TestCase):
             'username': f'{cls.user.username}'})
 
     def setUp(self) -> None:
+        cache.clear()
         self.guest_client = Client()
         self.authorized_client = Client()
         self.authorized_client.force_login(self.user)
@@ -102,6 +105,42 @@ class ViewsTestCase(TestCase):
                 self.assertEqual(len(page_obj_second),
                                  POSTS_COUNT_ON_SECOND_PAGE)
 
+    def test_cursor_pagination(self):
+        """Курсоры ведут на соседние страницы в обе стороны."""
+        Post.objects.bulk_create(
+            Post(text=f'text{x}', author=self.user, group=self.group)
+            for x in range(1, POSTS_COUNT))
+        first_page = self.guest_client.get(self.url_group).context['page_obj']
+        self.assertIsNone(first_page.previous_cursor)
+
+        second_page = self.guest_client.get(
+            self.url_group, {'cursor': first_page.next_cursor}
+        ).context['page_obj']
+        self.assertEqual(second_page.number, 2)
+        self.assertEqual(len(second_page), POSTS_COUNT_ON_SECOND_PAGE)
+        self.assertIsNone(second_page.next_cursor)
+
+        previous_page = self.guest_client.get(
+            self.url_group, {'cursor': second_page.previous_cursor}
+        ).context['page_obj']
+        self.assertEqual(previous_page.number, 1)
+        self.assertEqual(list(previous_page), list(first_page))
+
+    def test_page_range_is_windowed(self):
+        """Навигация выводит окно номеров, а не все страницы."""
+        Post.objects.bulk_create(
+            Post(text=f'text{x}', author=self.user)
+            for x in range(POSTS_PER_PAGE * 9))
+        response = self.guest_client.get(self.url_index, {'page': 6})
+        self.assertEqual(
+            response.context['page_range'], [1, None, 4, 5, 6, 7, 8, 9, 10])
+        self.assertNotContains(response, '?page=2"')
+
+    def test_broken_cursor_shows_first_page(self):
+        """Битый курсор не ломает страницу."""
+        response = self.guest_client.get(self.url_index, {'cursor': 'xx'})
+        self.assertEqual(response.context['page_obj'].number, 1)
+
     def test_templates(self):
         """URL-адрес использует соответствующий шаблон."""
         templates_page_names = {
@@ -243,3 +282,91 @@ class ViewsTestCase(TestCase):
             author=self.user
         )
         self.assertFalse(follow.exists())
+
+    def test_new_post_appears_in_follow_feed(self):
+        """Новый пост автора попадает в ленту подписчика."""
+        Follow.objects.create(user=self.follower, author=self.user)
+        new_post = Post.objects.create(author=self.user, text='new_post')
+        response = self.follower_client.get(self.url_follow_index)
+        self.assertEqual(response.context['page_obj'][0], new_post)
+
+    def test_unfollow_clears_follow_feed(self):
+        """После отписки посты автора пропадают из ленты."""
+        Follow.objects.create(user=self.follower, author=self.user)
+        self.follower_client.get(self.url_unfollow)
+        response = self.follower_client.get(self.url_follow_index)
+        self.assertEqual(len(response.context['page_obj']), 0)
+
+    def test_thumbnails_are_pregenerated(self):
+        """Страницы выводят заранее созданные копии картинки."""
+        rendition = images.generate_thumbnails(self.post.pk)
+        for url in (self.url_index, self.url_detail):
+            with self.subTest(url=url):
+                self.assertContains(
+                    self.guest_client.get(url), rendition['srcset'])
+
+    @override_settings(FEED_FANOUT_LIMIT=1)
+    def test_celebrity_posts_are_read_on_demand(self):
+        """Посты популярного автора подмешиваются в ленту при чтении."""
+        cache.clear()
+        Follow.objects.create(user=self.follower, author=self.user)
+        new_post = Post.objects.create(author=self.user, text='new_post')
+        self.assertFalse(
+            FeedEntry.objects.filter(post=new_post).exists())
+        response = self.follower_client.get(self.url_follow_index)
+        self.assertEqual(
+            list(response.context['page_obj']), [new_post, self.post])
+
+    @override_settings(FEED_FANOUT_LIMIT=2)
+    def test_former_celebrity_posts_are_backfilled(self):
+        """Когда у автора становится меньше подписчиков, чем порог,
+        его посты раскладываются по лентам оставшихся подписчиков."""
+        cache.clear()
+        fan = User.objects.create_user(username='fan')
+        Follow.objects.create(user=self.follower, author=self.user)
+        Follow.objects.create(user=fan, author=self.user)
+        new_post = Post.objects.create(author=self.user, text='new_post')
+        self.assertFalse(FeedEntry.objects.filter(post=new_post).exists())
+        Follow.objects.filter(user=fan).delete()
+        self.assertTrue(FeedEntry.objects.filter(
+            user=self.follower, post=new_post).exists())
+
+    @override_settings(FEED_FANOUT_LIMIT=2, POSTS_PER_PAGE=3)
+    def test_mixed_follow_feed_pages(self):
+        """Лента из раскладки и постов «знаменитости» листается без
+        пропусков и повторов — по номерам страниц и по курсору."""
+        cache.clear()
+        writer = User.objects.create_user(username='writer')
+        fan = User.objects.create_user(username='fan')
+        Follow.objects.create(user=self.follower, author=writer)
+        # Первый подписчик получает старый пост в раскладку, второй
+        # делает автора «знаменитостью».
+        Follow.objects.create(user=self.follower, author=self.user)
+        Follow.objects.create(user=fan, author=self.user)
+        for number in range(3):
+            Post.objects.create(author=writer, text=f'writer{number}')
+            Post.objects.create(author=self.user, text=f'star{number}')
+        expected = list(Post.objects.filter(
+            author__in=(writer, self.user)).order_by('-pub_date', '-id'))
+
+        by_number = []
+        for number in (1, 2, 3):
+            response = self.follower_client.get(
+                self.url_follow_index, {'page': number})
+            by_number += response.context['page_obj']
+        self.assertEqual(by_number, expected)
+        self.assertEqual(response.context['page_obj'].paginator.count, 7)
+
+        by_cursor = []
+        response = self.follower_client.get(self.url_follow_index)
+        while True:
+            page = response.context['page_obj']
+            by_cursor += page
+            if not page.next_cursor:
+                break
+            response = self.follower_client.get(
+                self.url_follow_index, {'cursor': page.next_cursor})
+        self.assertEqual(by_cursor, expected)
+        previous = self.follower_client.get(
+            self.url_follow_index, {'cursor': page.previous_cursor})
+        self.assertEqual(list(previous.context['page_obj']), expected[3:6])
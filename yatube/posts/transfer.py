@@ -0,0 +1,230 @@
+"""Потоковые выгрузка и загрузка постов в NDJSON и CSV.
+
+Записи читаются и пишутся по одной, а в базу попадают пачками через
+utils.bulk_insert, поэтому память не зависит от размера файла. Автор и
+сообщество задаются естественными ключами (username и slug), картинка —
+путём в хранилище, а pub_date сохраняется как есть.
+
+Вставка пачками не вызывает сигналы, поэтому после загрузки ленты,
+поисковый индекс, счётчики и кэш обновляются одним проходом по
+диапазону id загруженных постов, а копии картинок ставятся в очередь.
+"""
+import csv
+import json
+import os
+from collections import Counter
+from itertools import islice
+
+from django.contrib.auth.hashers import make_password
+from django.core.exceptions import SuspiciousFileOperation
+from django.core.files import File
+from django.core.files.storage import default_storage
+from django.db.models import Max
+from django.utils import timezone
+from django.utils._os import safe_join
+from django.utils.dateparse import parse_datetime
+
+from . import caching, counters, feeds, images
+from .models import Group, Post, Profile, User
+from .search import get_backend
+from .utils import bulk_insert
+
+FIELDS = ('text', 'pub_date', 'author', 'group', 'image')
+FORMATS = ('ndjson', 'csv')
+
+
+class BadRecord(ValueError):
+
+    def __init__(self, number, message):
+        super().__init__(f'Запись {number}: {message}')
+
+
+def guess_format(path):
+    extension = os.path.splitext(path)[1].lstrip('.').lower()
+    return 'csv' if extension == 'csv' else 'ndjson'
+
+
+def export_rows(queryset=None, chunk_size=2000):
+    """Записи постов по порядку создания, без загрузки всех в память."""
+    if queryset is None:
+        queryset = Post.objects.all()
+    values = queryset.order_by('pk').values_list(
+        'text', 'pub_date', 'author__username', 'group__slug', 'image')
+    for text, pub_date, author, group, image in values.iterator(chunk_size):
+        yield {
+            'text': text,
+            'pub_date': pub_date.isoformat(),
+            'author': author,
+            'group': group or '',
+            'image': image or '',
+        }
+
+
+def write_rows(rows, stream, fmt):
+    """Пишет записи в поток и возвращает их число."""
+    count = 0
+    if fmt == 'csv':
+        writer = csv.DictWriter(stream, FIELDS)
+        writer.writeheader()
+        for count, row in enumerate(rows, 1):
+            writer.writerow(row)
+        return count
+    for count, row in enumerate(rows, 1):
+        stream.write(json.dumps(row, ensure_ascii=False) + '\n')
+    return count
+
+
+def read_rows(stream, fmt):
+    """Записи из потока по одной."""
+    if fmt == 'csv':
+        yield from csv.DictReader(stream)
+        return
+    for number, line in enumerate(stream, 1):
+        if not line.strip():
+            continue
+        try:
+            yield json.loads(line)
+        except ValueError:
+            raise BadRecord(number, 'строка не разбирается как JSON.')
+
+
+class PostImporter:
+    """Загружает записи пачками по batch_size.
+
+    С create_missing неизвестные авторы и сообщества создаются, иначе
+    запись с ними считается ошибкой. Картинки ищутся в images_dir и
+    копируются в хранилище; без images_dir путь должен уже быть в нём.
+    """
+
+    def __init__(self, batch_size=5000, create_missing=False,
+                 images_dir=None):
+        self.batch_size = batch_size
+        self.create_missing = create_missing
+        self.images_dir = images_dir
+        self.authors = {}
+        self.groups = {}
+        self.posts_by_author = Counter()
+        self.created = 0
+        self.missing_images = 0
+        self.number = 0
+
+    def run(self, rows):
+        """Загружает все записи и обновляет всё, что зависит от постов."""
+        last_id = Post.objects.aggregate(last=Max('pk'))['last'] or 0
+        rows = iter(rows)
+        try:
+            while True:
+                batch = list(islice(rows, self.batch_size))
+                if not batch:
+                    break
+                self.load_batch(batch)
+        finally:
+            # Пачки до ошибочной записи уже сохранены.
+            self.finish(last_id)
+        return self.created
+
+    def load_batch(self, batch):
+        self.resolve(self.authors, User, 'username',
+                     {row.get('author') for row in batch})
+        self.resolve(self.groups, Group, 'slug',
+                     {row.get('group') for row in batch} - {'', None})
+        posts = []
+        for row in batch:
+            self.number += 1
+            posts.append(self.build(row))
+        bulk_insert(Post, posts)
+        for post in posts:
+            self.posts_by_author[post.author_id] += 1
+        self.created += len(posts)
+
+    def resolve(self, known, model, field, keys):
+        """Дополняет known id объектов model с ключами keys."""
+        keys = {key for key in keys if key} - known.keys()
+        if not keys:
+            return
+        known.update(model.objects.filter(
+            **{f'{field}__in': keys}).values_list(field, 'pk'))
+        missing = keys - known.keys()
+        if missing and self.create_missing:
+            if model is User:
+                # Войти под созданными авторами нельзя, пока
+                # им не зададут пароль.
+                password = make_password(None)
+                model.objects.bulk_create(
+                    User(username=key, password=password) for key in missing)
+            else:
+                model.objects.bulk_create(
+                    Group(title=key, slug=key, description='')
+                    for key in missing)
+            known.update(model.objects.filter(
+                **{f'{field}__in': missing}).values_list(field, 'pk'))
+
+    def build(self, row):
+        text = row.get('text')
+        if not text:
+            raise BadRecord(self.number, 'нет текста.')
+        author_id = self.authors.get(row.get('author'))
+        if author_id is None:
+            raise BadRecord(
+                self.number, f'нет автора {row.get("author")!r}.')
+        group_id = None
+        if row.get('group'):
+            group_id = self.groups.get(row['group'])
+            if group_id is None:
+                raise BadRecord(
+                    self.number, f'нет сообщества {row["group"]!r}.')
+        return Post(
+            text=text,
+            pub_date=self.parse_date(row.get('pub_date')),
+            author_id=author_id,
+            group_id=group_id,
+            image=self.store_image(row.get('image')),
+        )
+
+    def parse_date(self, value):
+        if not value:
+            return timezone.now()
+        try:
+            pub_date = parse_datetime(value)
+        except ValueError:
+            pub_date = None
+        if pub_date is None:
+            raise BadRecord(self.number, f'дата {value!r} не распознана.')
+        if timezone.is_naive(pub_date):
+            pub_date = timezone.make_aware(pub_date)
+        return pub_date
+
+    def store_image(self, path):
+        if not path:
+            return ''
+        if self.images_dir:
+            try:
+                source = safe_join(self.images_dir, path)
+            except SuspiciousFileOperation:
+                raise BadRecord(
+                    self.number, f'путь {path!r} вне каталога картинок.')
+            if os.path.isfile(source) and not default_storage.exists(path):
+                with open(source, 'rb') as file:
+                    return default_storage.save(path, File(file))
+        if default_storage.exists(path):
+            return path
+        self.missing_images += 1
+        return ''
+
+    def finish(self, last_id):
+        Profile.objects.bulk_create(
+            Profile(user_id=user_id) for user_id in
+            User.objects.filter(
+                profile__isnull=True).values_list('pk', flat=True))
+        for author_id, count in self.posts_by_author.items():
+            counters.add(Profile, author_id, 'posts_count', count)
+        imported = Post.objects.filter(pk__gt=last_id)
+        max_id = imported.aggregate(last=Max('pk'))['last']
+        if max_id is not None:
+            feeds.fan_out_bulk(last_id, max_id)
+            get_backend().index_range(last_id, max_id)
+            imported = imported.filter(pk__lte=max_id).exclude(image='')
+            for post in imported.only('pk').iterator():
+                images.schedule_thumbnails(post)
+        # Версия ALL_GROUPS входит в ключи всех страниц.
+        caching.bump(caching.ALL_POSTS, caching.ALL_GROUPS)
@@ -0,0 +1,105 @@
+"""Потоковый приём картинок постов.
+
+Обработчик пишет загрузку на диск частями, по ходу считает SHA-256
+и разбирает заголовок картинки, как только он пришёл. Слишком большие
+файлы, картинки неподдерживаемого формата и с чрезмерным числом
+пикселей отбрасываются, не дожидаясь конца загрузки и без полного
+декодирования, поэтому память процесса не зависит от размера файла.
+"""
+import hashlib
+from functools import wraps
+
+from django.conf import settings
+from django.core.files.uploadhandler import (SkipFile,
+                                             TemporaryFileUploadHandler)
+from django.template.defaultfilters import filesizeformat
+from django.views.decorators.csrf import csrf_exempt, csrf_protect
+from PIL import Image, ImageFile
+
+from .images import ImageTooLarge, check_pixels
+
+# Заголовок почти любой картинки, включая JPEG с длинным EXIF,
+# умещается в эти байты.
+HEADER_LIMIT = 256 * 1024
+
+
+class ImageUploadHandler(TemporaryFileUploadHandler):
+    """Пишет картинку на диск, хэширует и проверяет её заголовок."""
+
+    def new_file(self, field_name, file_name, *args, **kwargs):
+        super().new_file(field_name, file_name, *args, **kwargs)
+        if not hasattr(self.request, 'upload_errors'):
+            self.request.upload_errors = {}
+        self.digest = hashlib.sha256()
+        self.parser = ImageFile.Parser()
+        self.header_size = 0
+        self.header_checked = False
+        if self.content_length:
+            self.check_size(self.content_length)
+
+    def reject(self, message):
+        self.request.upload_errors[self.field_name] = message
+        raise SkipFile(message)
+
+    def check_size(self, size):
+        limit = settings.POST_IMAGE_MAX_UPLOAD_SIZE
+        if size > limit:
+            self.reject(
+                f'Файл больше {filesizeformat(limit)}.')
+
+    def check_header(self, chunk):
+        # Parser начинает декодировать данные, как только распознал
+        # заголовок, поэтому дальше данные ему не передаются.
+        try:
+            self.parser.feed(chunk)
+        except (OSError, SyntaxError, ValueError,
+                Image.DecompressionBombError):
+            self.reject('Файл не похож на картинку.')
+        self.header_size += len(chunk)
+        image = self.parser.image
+        if image is None:
+            if self.header_size > HEADER_LIMIT:
+                self.reject('Файл не похож на картинку.')
+            return
+        self.header_checked = True
+        if image.format not in settings.POST_IMAGE_FORMATS:
+            self.reject(f'Формат {image.format} не поддерживается.')
+        try:
+            check_pixels(image)
+        except ImageTooLarge:
+            self.reject('Слишком большое разрешение картинки.')
+
+    def receive_data_chunk(self, raw_data, start):
+        self.check_size(start + len(raw_data))
+        if not self.header_checked:
+            self.check_header(raw_data)
+        self.digest.update(raw_data)
+        return super().receive_data_chunk(raw_data, start)
+
+    def file_complete(self, file_size):
+        if not self.header_checked:
+            # SkipFile здесь уже не перехватывается парсером.
+            self.request.upload_errors[self.field_name] = (
+                'Файл не похож на картинку.')
+            self.file.close()
+            return None
+        file = super().file_complete(file_size)
+        file.sha256 = self.digest.hexdigest()
+        return file
+
+
+def streaming_image_uploads(view):
+    """Принимает файлы запроса через ImageUploadHandler.
+
+    Обработчики нужно заменить до того, как CSRF-middleware прочитает
+    request.POST, поэтому CSRF проверяется уже внутри обёртки.
+    """
+    protected = csrf_protect(view)
+
+    @csrf_exempt
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        request.upload_handlers = [ImageUploadHandler(request)]
+        return protected(request, *args, **kwargs)
+
+    return wrapper
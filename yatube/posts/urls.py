@@ -13,7 +13,9 @@ urlpatterns = [
     path('posts/<int:post_id>/edit/', views.post_edit, name='post_edit'),
     path('posts/<int:post_id>/comment/', views.add_comment,
          name='add_comment'),
+    path('search/', views.search, name='search'),
     path('follow/', views.follow_index, name='follow_index'),
+    path('live/', views.live_feed, name='live'),
     path(
         'profile/<str:username>/follow/',
         views.profile_follow,
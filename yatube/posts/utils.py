@@ -1,11 +1,269 @@
+import base64
+import binascii
+import json
+
 from django.conf import settings
-from django.core.paginator import Paginator
+from django.core.paginator import Page, Paginator
+from django.db import connections, router, transaction
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from django.utils.functional import cached_property
+
+from . import counts
+from .caching import get_or_compute
+
+NEXT = 'n'
+PREVIOUS = 'p'
+# Пропуск в списке номеров страниц.
+ELLIPSIS = None
+
+
+def encode_cursor(payload):
+    """Упаковывает данные курсора в непрозрачную строку для URL."""
+    raw = json.dumps(payload, separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(token):
+    """Распаковывает курсор, при любой ошибке возвращает None."""
+    try:
+        raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+        return json.loads(raw.decode())
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        return None
+
+
+class KeysetPaginator(Paginator):
+    """Пагинатор по ключу (pub_date, id).
+
+    Если лента строится по другой таблице с теми же значениями ключа,
+    в наследнике достаточно переопределить keys.
+
+    Переход по курсору выполняется диапазонным запросом по индексу
+    вместо OFFSET, а общее число записей считается не дальше
+    max_pages страниц, чтобы не сканировать всю таблицу. Для заведомо
+    больших лент подсчёт заменяет оценка из posts.counts.
+    """
+
+    keys = ('pub_date', 'id')
+
+    def __init__(self, object_list, per_page, max_pages=None,
+                 estimate=None, **kwargs):
+        super().__init__(self.order(object_list), per_page, **kwargs)
+        self.max_pages = max_pages
+        self.estimate = estimate
+
+    @property
+    def ordering(self):
+        return tuple(f'-{key}' for key in self.keys)
+
+    def order(self, object_list):
+        return object_list.order_by(*self.ordering)
+
+    @cached_property
+    def counted(self):
+        """Число записей не дальше max_pages страниц и его точность."""
+        return counts.count(
+            self.object_list, self.max_pages * self.per_page, self.estimate)
+
+    @cached_property
+    def count(self):
+        if self.max_pages is None:
+            return super().count
+        return self.counted[0]
+
+    @cached_property
+    def count_is_exact(self):
+        if self.max_pages is None:
+            return True
+        return self.counted[1]
+
+    def page(self, number):
+        page = super().page(number)
+        return self.with_cursors(page, page.has_next(), page.has_previous())
+
+    def with_cursors(self, page, has_next, has_previous):
+        """Добавляет странице курсоры соседних страниц."""
+        page.object_list = list(page.object_list)
+        page.next_cursor = page.previous_cursor = None
+        if page.object_list and has_next:
+            page.next_cursor = self.make_cursor(
+                page.object_list[-1], NEXT, page.number + 1)
+        if page.object_list and has_previous:
+            page.previous_cursor = self.make_cursor(
+                page.object_list[0], PREVIOUS, page.number - 1)
+        return page
+
+    def make_cursor(self, obj, direction, number):
+        return encode_cursor(
+            [direction, obj.pub_date.isoformat(), obj.pk, number])
+
+    def get_cursor_page(self, token):
+        """Возвращает страницу по курсору или None для битого курсора."""
+        payload = decode_cursor(token)
+        try:
+            direction, pub_date, pk, number = payload
+            pub_date = parse_datetime(pub_date)
+            pk, number = int(pk), max(int(number), 1)
+        except (TypeError, ValueError):
+            return None
+        if direction not in (NEXT, PREVIOUS) or pub_date is None:
+            return None
 
+        object_list = self.rows_after(
+            direction, (pub_date, pk), self.per_page + 1)
+        has_more = len(object_list) > self.per_page
+        object_list = object_list[:self.per_page]
 
-def get_page_context(queryset, request):
-    paginator = Paginator(queryset, settings.POSTS_PER_PAGE)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+        if direction == NEXT:
+            return self.with_cursors(
+                Page(object_list, number, self), has_more, number > 1)
+        object_list.reverse()
+        return self.with_cursors(
+            Page(object_list, number if has_more else 1, self),
+            True, has_more)
+
+    def rows_after(self, direction, after, limit):
+        """До limit записей после ключа after в порядке обхода."""
+        return list(keyset_filter(
+            self.object_list, self.keys, direction, after)[:limit])
+
+
+def keyset_filter(queryset, keys, direction, after=None):
+    """Записи queryset строго после ключа after = (pub_date, pk).
+
+    NEXT — к более старым записям, PREVIOUS — к более новым, и тогда
+    записи идут по возрастанию ключа. Без after — с начала ленты.
+    """
+    date_key, pk_key = keys
+    if direction == NEXT:
+        ordering = tuple(f'-{key}' for key in keys)
+    else:
+        ordering = keys
+    if after is None:
+        return queryset.order_by(*ordering)
+    pub_date, pk = after
+    # Диапазон по pub_date позволяет SQLite начать обход индекса
+    # сразу с нужного места, а не отбрасывать предыдущие строки.
+    if direction == NEXT:
+        queryset = queryset.filter(
+            Q(**{f'{date_key}__lte': pub_date}),
+            ~Q(**{date_key: pub_date, f'{pk_key}__gte': pk}))
+    else:
+        queryset = queryset.filter(
+            Q(**{f'{date_key}__gte': pub_date}),
+            ~Q(**{date_key: pub_date, f'{pk_key}__lte': pk}))
+    return queryset.order_by(*ordering)
+
+
+def elided_page_range(page, on_each_side=2, on_ends=1):
+    """Номера страниц для навигации: края, окно вокруг текущей и пропуски.
+
+    Длина списка не зависит от длины ленты. Пока число записей
+    известно только снизу (count_is_exact ложно), последние страницы
+    не выводятся, а хвост списка обозначается пропуском.
+    """
+    paginator = page.paginator
+    last = paginator.num_pages
+    exact = getattr(paginator, 'count_is_exact', True)
+    numbers = {page.number}
+    numbers.update(range(1, min(on_ends, last) + 1))
+    numbers.update(range(
+        max(page.number - on_each_side, 1),
+        min(page.number + on_each_side, last) + 1))
+    if exact:
+        numbers.update(range(max(last - on_ends + 1, 1), last + 1))
+    page_range = []
+    previous = 0
+    for number in sorted(numbers):
+        if number - previous == 2:
+            # Пропуск длиной в одну страницу не короче её номера.
+            page_range.append(previous + 1)
+        elif number - previous > 2:
+            page_range.append(ELLIPSIS)
+        page_range.append(number)
+        previous = number
+    if not exact:
+        page_range.append(ELLIPSIS)
+    return page_range
+
+
+def get_page_context(queryset, request, paginator_class=KeysetPaginator,
+                     cache_key=None, estimate=None):
+    """Страница ленты по ?cursor= или ?page=.
+
+    С cache_key записи страницы берутся из кэша, и после его сброса
+    запросы к базе выполняет один процесс, а не все воркеры сразу.
+    estimate — известная вызывающему оценка длины ленты (posts.counts).
+    """
+    paginator = paginator_class(
+        queryset,
+        settings.POSTS_PER_PAGE,
+        max_pages=settings.POSTS_PAGINATOR_MAX_PAGES,
+        estimate=estimate,
+    )
+
+    def load_page():
+        page_obj = None
+        cursor = request.GET.get('cursor')
+        if cursor:
+            page_obj = paginator.get_cursor_page(cursor)
+        if page_obj is None:
+            page_obj = paginator.get_page(request.GET.get('page'))
+        return page_obj
+
+    if cache_key is None:
+        page_obj = load_page()
+    else:
+        state = get_or_compute(
+            cache_key, lambda: dump_page(load_page()),
+            settings.FEED_CACHE_TIMEOUT)
+        page_obj = restore_page(paginator, state)
     return {
         'page_obj': page_obj,
+        'page_range': elided_page_range(page_obj),
+    }
+
+
+def dump_page(page):
+    paginator = page.paginator
+    return {
+        'object_list': list(page.object_list),
+        'number': page.number,
+        'next_cursor': page.next_cursor,
+        'previous_cursor': page.previous_cursor,
+        'count': paginator.count,
+        'count_is_exact': paginator.count_is_exact,
     }
+
+
+def restore_page(paginator, state):
+    # count и count_is_exact — cached_property, их значения
+    # подставляются в __dict__, чтобы не считать записи заново.
+    paginator.__dict__.update(
+        count=state['count'], count_is_exact=state['count_is_exact'])
+    page = Page(state['object_list'], state['number'], paginator)
+    page.next_cursor = state['next_cursor']
+    page.previous_cursor = state['previous_cursor']
+    return page
+
+
+def bulk_insert(model, objs):
+    """Как bulk_create, но сохраняет значения полей как есть.
+
+    bulk_create вызывает pre_save полей, и поле с auto_now_add
+    (pub_date) получает текущее время. Здесь строки вставляются так же,
+    как при загрузке фикстур (raw), поэтому заданный pub_date не
+    теряется, а само поле модели не меняется.
+    """
+    objs = list(objs)
+    fields = [
+        field for field in model._meta.concrete_fields
+        if field is not model._meta.auto_field
+    ]
+    connection = connections[router.db_for_write(model)]
+    batch_size = max(connection.ops.bulk_batch_size(fields, objs), 1)
+    with transaction.atomic(using=connection.alias, savepoint=False):
+        for start in range(0, len(objs), batch_size):
+            model._base_manager.using(connection.alias)._insert(
+                objs[start:start + batch_size], fields=fields, raw=True)
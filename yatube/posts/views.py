@@ -1,64 +1,127 @@
+from django.conf import settings
 from django.contrib.auth.decorators import login_required
+from django.db import transaction
+from django.http import Http404, HttpResponse, StreamingHttpResponse
 from django.shortcuts import get_object_or_404, redirect, render
 
+from core.sqlite import serialize_writes
+
+from .caching import (ALL_POSTS, author_scope, feed_cache_context,
+                      group_scope, post_scope)
+from .conditional import conditional_page
+from . import live
+from .feeds import follow_feed
 from .forms import CommentForm, PostForm
 from .models import Follow, Group, Post, User
+from .search import search_posts
+from .uploads import streaming_image_uploads
 from .utils import get_page_context
 
 
+def load_group(slug):
+    return get_object_or_404(Group, slug=slug)
+
+
+def load_author(username):
+    return get_object_or_404(
+        User.objects.select_related('profile'), username=username)
+
+
+def load_post(post_id):
+    return get_object_or_404(
+        Post.objects.select_related('author__profile', 'group'),
+        id=post_id)
+
+
+@conditional_page(lambda: (ALL_POSTS,))
 def index(request):
     post_list = Post.objects.select_related('author', 'group').all()
-    context = get_page_context(post_list, request)
+    cache_context = feed_cache_context(request, ALL_POSTS)
+    context = get_page_context(
+        post_list, request,
+        cache_key=f'index_page:{cache_context["feed_cache_key"]}')
+    context.update(cache_context)
 
     return render(request, 'posts/index.html', context)
 
 
-def group_posts(request, slug):
-    group = get_object_or_404(Group, slug=slug)
+@conditional_page(lambda group: (group_scope(group.pk),), load_group)
+def group_posts(request, group):
     post_list = group.posts.select_related('author').all()
+    cache_context = feed_cache_context(request, group_scope(group.pk))
     context = {
         'group': group,
     }
-    context.update(get_page_context(post_list, request))
+    context.update(get_page_context(
+        post_list, request,
+        cache_key=f'group_page:{cache_context["feed_cache_key"]}'))
+    context.update(cache_context)
 
     return render(request, 'posts/group_list.html', context)
 
 
-def profile(request, username):
-    author = get_object_or_404(
-        User.objects.select_related(), username=username)
-    posts_of_author = author.posts.all()
+@conditional_page(lambda author: (author_scope(author.pk),), load_author)
+def profile(request, author):
+    posts_of_author = author.posts.select_related('group')
     following = (
         request.user.is_authenticated
         and author.following.filter(user=request.user).exists()
     )
+    cache_context = feed_cache_context(request, author_scope(author.pk))
     context = {
         'author': author,
         'following': following,
     }
-    context.update(get_page_context(posts_of_author, request))
+    # Счётчик из шапки профиля заменяет подсчёт постов в пагинаторе.
+    context.update(get_page_context(
+        posts_of_author, request,
+        cache_key=f'profile_page:{cache_context["feed_cache_key"]}',
+        estimate=author.profile.posts_count))
+    context.update(cache_context)
 
     return render(request, 'posts/profile.html', context)
 
 
-def post_detail(request, post_id):
-    post = get_object_or_404(
-        Post.objects.select_related('author', 'group'), id=post_id)
+# На странице поста выводится и счётчик постов автора.
+@conditional_page(
+    lambda post: (post_scope(post.pk), author_scope(post.author_id)),
+    load_post)
+def post_detail(request, post):
     form = CommentForm(request.POST or None)
     if request.method == 'POST':
         return redirect('posts: add_comment')
-    comments = post.comments.all()
+    comments = post.comments.select_related('author')
     context = {
         'post': post,
         'form': form,
         'comments': comments,
     }
+    context.update(feed_cache_context(request, post_scope(post.pk)))
     return render(request, 'posts/post_detail.html', context)
 
 
+def search(request):
+    query = request.GET.get('q', '').strip()
+    posts, next_cursor = search_posts(query, request.GET.get('cursor'))
+    context = {
+        'query': query,
+        'posts': posts,
+        'next_cursor': next_cursor,
+    }
+
+    return render(request, 'posts/search.html', context)
+
+
 @login_required
+@streaming_image_uploads
+@serialize_writes
+@transaction.atomic
 def post_create(request):
-    form = PostForm(request.POST or None, files=request.FILES or None)
+    form = PostForm(
+        request.POST or None,
+        files=request.FILES or None,
+        upload_errors=getattr(request, 'upload_errors', None),
+    )
     if form.is_valid():
         post = form.save(commit=False)
         post.author = request.user
@@ -69,6 +132,8 @@ def post_create(request):
 
 
 @login_required
+@streaming_image_uploads
+@serialize_writes
 def post_edit(request, post_id):
     post = get_object_or_404(Post, pk=post_id)
     if request.user != post.author:
@@ -76,7 +141,8 @@ def post_edit(request, post_id):
     form = PostForm(
         request.POST or None,
         files=request.FILES or None,
-        instance=post
+        instance=post,
+        upload_errors=getattr(request, 'upload_errors', None),
     )
     if form.is_valid():
         form.save()
@@ -87,6 +153,8 @@ def post_edit(request, post_id):
 
 
 @login_required
+@serialize_writes
+@transaction.atomic
 def add_comment(request, post_id):
     post = get_object_or_404(Post, pk=post_id)
     form = CommentForm(request.POST or None)
@@ -101,13 +169,34 @@ def add_comment(request, post_id):
 
 @login_required
 def follow_index(request):
-    post_list = Post.objects.filter(author__following__user=request.user)
-    context = get_page_context(post_list, request)
+    post_list, paginator_class = follow_feed(request.user)
+    context = get_page_context(post_list, request, paginator_class)
 
     return render(request, 'posts/follow.html', context)
 
 
+def live_feed(request):
+    """Новые посты ленты сайта, сообщества или подписок в виде SSE."""
+    if not settings.LIVE_UPDATES:
+        raise Http404('Живые обновления включаются только под ASGI.')
+    if len(live.bus) >= settings.LIVE_MAX_SUBSCRIBERS:
+        response = HttpResponse(status=503)
+        response['Retry-After'] = settings.LIVE_RETRY_MS // 1000
+        return response
+    channels, condition = live.feed_channels(request)
+    frames = live.stream(
+        channels, condition, request.META.get('HTTP_LAST_EVENT_ID'))
+    response = StreamingHttpResponse(
+        frames, content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    # Иначе nginx копит кадры в буфере.
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
 @login_required
+@serialize_writes(all_methods=True)
+@transaction.atomic
 def profile_follow(request, username):
     if request.user.username == username:
         return redirect('posts:profile', username=username)
@@ -118,6 +207,8 @@ def profile_follow(request, username):
 
 
 @login_required
+@serialize_writes(all_methods=True)
+@transaction.atomic
 def profile_unfollow(request, username):
     following = get_object_or_404(User, username=username)
     follow = get_object_or_404(Follow, author=following, user=request.user)
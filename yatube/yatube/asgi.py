@@ -0,0 +1,21 @@
+"""
+ASGI config for yatube project.
+
+It exposes the ASGI callable as a module-level variable named
+``application``. Django 2.2 has no native ASGI support, so views run
+in a thread pool behind ``core.asgi.ASGIHandler``.
+"""
+
+import os
+
+import django
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'yatube.settings')
+# Потоки SSE держат здесь только сокет, а не поток сервера.
+os.environ.setdefault('YATUBE_LIVE_UPDATES', '1')
+
+django.setup(set_prefix=False)
+
+from core.asgi import ASGIHandler  # noqa: E402
+
+application = ASGIHandler()
@@ -23,7 +23,7 @@ BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 SECRET_KEY = 'plz2n739o0&(hm_s(e75%x13$dn#8v*cfmuknnmcy@78$1siw*'
 
 # SECURITY WARNING: don't run with debug turned on in production!
-DEBUG = True
+DEBUG = os.environ.get('YATUBE_DEBUG', '1') == '1'
 
 ALLOWED_HOSTS = [
     'localhost',
@@ -50,11 +50,13 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'core.metrics.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'core.db.ReplicaRoutingMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -62,36 +64,83 @@ MIDDLEWARE = [
 ROOT_URLCONF = 'yatube.urls'
 
 TEMPLATES_DIR = os.path.join(BASE_DIR, 'templates')
+TEMPLATE_LOADERS = [
+    'django.template.loaders.filesystem.Loader',
+    'django.template.loaders.app_directories.Loader',
+]
+# Без отладки шаблоны разбираются один раз на процесс.
+if not DEBUG:
+    TEMPLATE_LOADERS = [
+        ('django.template.loaders.cached.Loader', TEMPLATE_LOADERS),
+    ]
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        'BACKEND': 'core.metrics.TimedDjangoTemplates',
         'DIRS': [TEMPLATES_DIR],
-        'APP_DIRS': True,
         'OPTIONS': {
+            'loaders': TEMPLATE_LOADERS,
             'context_processors': [
                 'django.template.context_processors.debug',
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
                 'core.context_processors.year.year',
+                'core.context_processors.live.live_updates',
             ],
         },
     },
 ]
 
+# Время рендера по шаблонам для метрик запросов (core.metrics).
+# Замер каждого шаблона не бесплатен, поэтому без отладки он включается
+# переменной окружения.
+TEMPLATE_PROFILING = os.environ.get(
+    'YATUBE_TEMPLATE_PROFILING', '1' if DEBUG else '0') == '1'
+
 WSGI_APPLICATION = 'yatube.wsgi.application'
 
 
 # Database
 # https://docs.djangoproject.com/en/2.2/ref/settings/#databases
 
+# Соединения переиспользуются между запросами столько секунд.
+CONN_MAX_AGE = int(os.environ.get('YATUBE_CONN_MAX_AGE', 60))
+
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
+        'CONN_MAX_AGE': CONN_MAX_AGE,
     }
 }
 
+# Реплики для чтения: YATUBE_DB_REPLICAS — пути к копиям базы
+# через запятую. В тестах реплики смотрят в тестовую основную базу.
+DATABASE_REPLICAS = []
+
+for number, name in enumerate(
+        filter(None, os.environ.get('YATUBE_DB_REPLICAS', '').split(',')),
+        start=1):
+    DATABASES[f'replica{number}'] = dict(
+        DATABASES['default'], NAME=name, TEST={'MIRROR': 'default'})
+    DATABASE_REPLICAS.append(f'replica{number}')
+
+DATABASE_ROUTERS = ['core.db.PrimaryReplicaRouter']
+
+# PRAGMA для каждого нового соединения с SQLite: читатели не ждут
+# писателя, а писатели ждут блокировку до 5 секунд вместо ошибки.
+SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'busy_timeout': 5000,
+    'mmap_size': 256 * 1024 * 1024,
+    'cache_size': -64 * 1024,
+    'temp_store': 'MEMORY',
+}
+
+# После записи пользователь столько секунд читает из основной базы.
+DATABASE_STICKY_SECONDS = 5
+
 
 # Password validation
 # https://docs.djangoproject.com/en/2.2/ref/settings/#auth-password-validators
@@ -141,15 +190,181 @@ EMAIL_BACKEND = 'django.core.mail.backends.filebased.EmailBackend'
 
 EMAIL_FILE_PATH = os.path.join(BASE_DIR, 'sent_emails')
 
+# Письма о новых постах подписок собирает по расписанию команда
+# send_digests: одно письмо получателю, отправка пачками по
+# EMAIL_DIGEST_BATCH_SIZE писем через одно соединение.
+EMAIL_DIGEST_BATCH_SIZE = 100
+
+EMAIL_DIGEST_MAX_POSTS = 10
+
+# Адрес сайта для ссылок в письмах.
+SITE_URL = os.environ.get('YATUBE_SITE_URL', 'http://localhost:8000')
+
 POSTS_PER_PAGE = 10
 
+# Наибольшее число записей на странице JSON API.
+API_MAX_LIMIT = 100
+
+POSTS_PAGINATOR_MAX_PAGES = 100
+
+# Поставщики оценок числа записей (posts.counts). Оценке не меньше
+# порога пагинатор верит без COUNT(*); None — предел пагинатора.
+POSTS_COUNT_PROVIDERS = (
+    'posts.counts.CounterCount',
+    'posts.counts.TableStatsCount',
+    'posts.counts.CachedCount',
+)
+
+POSTS_COUNT_EXACT_THRESHOLD = None
+
+POSTS_COUNT_CACHE_TIMEOUT = 60
+
+POSTS_COUNT_STATS_TIMEOUT = 60 * 5
+
+# Посты авторов, у которых подписчиков больше порога, не раскладываются
+# по лентам при публикации, а подмешиваются в ленту при чтении.
+FEED_FANOUT_LIMIT = 1000
+
+FEED_CELEBRITIES_CACHE_TIMEOUT = 60 * 5
+
+# Фрагменты лент сбрасываются сигналами при изменении данных,
+# поэтому их можно хранить долго.
+FEED_CACHE_TIMEOUT = 60 * 60
+
+# Живые обновления лент (server-sent events). Каждый поток занимает
+# поток сервера, поэтому их число и длительность ограничены. Под WSGI
+# поток держал бы целый поток или воркер сервера, поэтому обновления
+# включаются, только когда сайт обслуживает yatube/asgi.py: он задаёт
+# YATUBE_LIVE_UPDATES=1.
+LIVE_UPDATES = os.environ.get('YATUBE_LIVE_UPDATES') == '1'
+
+LIVE_MAX_SUBSCRIBERS = 100
+
+LIVE_MAX_DURATION = 5 * 60
+
+LIVE_KEEPALIVE = 15
+
+LIVE_RETRY_MS = 3000
+
+LIVE_QUEUE_SIZE = 100
+
+LIVE_BACKLOG = 50
+
+LIVE_TEXT_LENGTH = 200
+
+# Потоки, в которых yatube/asgi.py выполняет Django, и отдельные
+# потоки для потоковых ответов (SSE).
+ASGI_THREADS = int(os.environ.get('YATUBE_ASGI_THREADS', 8))
+
+# Проверка предела подписчиков и подписка идут в ASGI_THREADS потоках
+# одновременно, поэтому запас не даёт потокам SSE занять весь пул.
+ASGI_STREAM_THREADS = LIVE_MAX_SUBSCRIBERS + ASGI_THREADS
+
+# Путь к классу бэкенда поиска; по умолчанию выбирается по типу базы.
+POSTS_SEARCH_BACKEND = None
+
+# Картинки постов кадрируются под пропорцию карточки и сохраняются
+# в нескольких ширинах для srcset.
+POST_IMAGE_WIDTHS = (320, 640, 960)
+
+POST_IMAGE_RATIO = (960, 339)
+
+# Картинки с большим числом пикселей не декодируются.
+POST_IMAGE_MAX_PIXELS = 40_000_000
+
+# Загрузка прерывается, как только файл превысил размер
+# или его заголовок показал неподходящий формат.
+POST_IMAGE_MAX_UPLOAD_SIZE = 10 * 1024 * 1024
+
+POST_IMAGE_FORMATS = ('JPEG', 'PNG', 'GIF', 'WEBP')
+
+# Тело запроса больше этого yatube/asgi.py не дочитывает и отвечает 413:
+# картинка поста и запас на остальные поля формы.
+FILE_UPLOAD_MAX_SIZE = POST_IMAGE_MAX_UPLOAD_SIZE + 1024 * 1024
+
+
 CSRF_FAILURE_VIEW = 'core.views.csrf_failure'
 
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# Кэш, общий для всех воркеров, выбирается переменными окружения:
+# YATUBE_CACHE=file|memcached|redis и YATUBE_CACHE_LOCATION (каталог
+# или адрес сервера). По умолчанию кэш свой у каждого процесса.
+CACHE_BACKENDS = {
+    'locmem': ('django.core.cache.backends.locmem.LocMemCache', ''),
+    'file': (
+        'django.core.cache.backends.filebased.FileBasedCache',
+        os.path.join(BASE_DIR, 'cache'),
+    ),
+    'memcached': (
+        'django.core.cache.backends.memcached.MemcachedCache',
+        '127.0.0.1:11211',
+    ),
+    'redis': ('django_redis.cache.RedisCache', 'redis://127.0.0.1:6379/1'),
+}
+
+CACHE_BACKEND, CACHE_LOCATION = CACHE_BACKENDS[
+    os.environ.get('YATUBE_CACHE', 'locmem')]
+
 CACHES = {
     'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'BACKEND': CACHE_BACKEND,
+        'LOCATION': os.environ.get('YATUBE_CACHE_LOCATION', CACHE_LOCATION),
     }
 }
+
+# Пока один запрос пересчитывает значение, остальные ждут
+# его результата не дольше CACHE_LOCK_TIMEOUT секунд.
+CACHE_LOCK_TIMEOUT = 10
+
+CACHE_LOCK_POLL_INTERVAL = 0.05
+
+# Чем больше коэффициент, тем раньше до истечения TTL значения
+# начинают пересчитываться заранее.
+CACHE_EARLY_RECOMPUTE_BETA = 1.0
+
+# Страница /metrics/ для Prometheus открыта только с этих адресов.
+METRICS_ALLOWED_IPS = ('127.0.0.1',)
+
+# Запросы, превысившие бюджет, пишутся в лог core.metrics.
+# Ключ '*' задаёт бюджет для всех представлений, остальные ключи —
+# поправки для отдельных представлений. Пределы: queries, sql_ms,
+# template_ms и total_ms.
+REQUEST_BUDGETS = {
+    '*': {'queries': 20, 'sql_ms': 100, 'total_ms': 500},
+    'posts:post_create': {'total_ms': 2000},
+    'posts:post_edit': {'total_ms': 2000},
+}
+
+# Фоновые задачи (core.tasks): YATUBE_TASKS=sync|thread|database.
+# В режиме sync задачи выполняются в потоке запроса, в режиме
+# database их выполняет команда run_tasks. Тесты запускаются с
+# yatube.settings_test, где задачи выполняются сразу.
+TASKS_MODE = os.environ.get('YATUBE_TASKS', 'thread')
+
+# Изменяющие запросы выполняются по одному в отдельном потоке.
+# Без очереди потоки задач и запросов соревнуются за блокировку
+# SQLite и получают «database is locked», поэтому в режиме thread
+# на SQLite она включена по умолчанию.
+SQLITE_WRITE_QUEUE = os.environ.get(
+    'YATUBE_SQLITE_WRITE_QUEUE',
+    '1' if TASKS_MODE == 'thread'
+    and DATABASES['default']['ENGINE'].endswith('sqlite3') else '0',
+) == '1'
+
+TASKS_WORKERS = 2
+
+TASKS_MAX_ATTEMPTS = 3
+
+# Пауза перед повтором в секундах, удваивается с каждой попыткой.
+TASKS_RETRY_DELAY = 1
+
+# Ключ задачи в режиме thread занят не дольше этого времени.
+TASKS_KEY_TIMEOUT = 600
+
+# Задачу, исполнитель которой не отчитался за TASKS_LEASE секунд,
+# забирает другой исполнитель.
+TASKS_LEASE = 300
+
+TASKS_POLL_INTERVAL = 1
@@ -0,0 +1,11 @@
+"""Настройки для тестов: manage.py test --settings=yatube.settings_test.
+
+Тесты идут в транзакции, которая не фиксируется, поэтому задачи
+выполняются сразу, а записи — в потоке теста. Фоновые режимы
+проверяются в тестах core через override_settings.
+"""
+from .settings import *  # noqa: F401,F403
+
+TASKS_MODE = 'sync'
+
+SQLITE_WRITE_QUEUE = False